@@ -0,0 +1,3 @@
+from .storefront import Storefront
+
+__all__ = ["Storefront"]
@@ -0,0 +1,242 @@
+"""
+Contain the offline scraping benchmark, run against the local storefront and a local MongoDB.
+
+Usage: python -m benchmarks.run [--parse-only] [--update-baseline]
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+from pymongo import MongoClient, monitoring
+
+from scraping.document import HtmlDocument
+from scraping.fetch import HttpFetcher
+from scraping.product_page.functions import parse_product_page
+from scraping.product_page.spider import ProductPageSpiderWorker
+from scraping.review_page.functions import parse_review_page
+from scraping.review_page.spider import ReviewPageSpiderWorker
+from scraping.search_page.functions import parse_search_page
+from scraping.search_page.spider import SearchPageSpiderWorker
+from scraping.throttle import CircuitBreaker, RateController, Throttle
+
+from .storefront import Storefront
+
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+DEFAULT_KEYWORDS = ["tampon", "serviette hygienique", "coupe menstruelle"]
+
+PARSERS = {
+    "search": ("s", parse_search_page),
+    "product": ("dp/B0TEST0001", parse_product_page),
+    "review": ("product-reviews/B0TEST0001", parse_review_page),
+}
+
+# metrics for which a higher value is better, the others are durations
+HIGHER_IS_BETTER = ("pages_per_sec",)
+
+# the benchmark database is dropped, so its name must tell it apart
+DATABASE_SUFFIX = "_benchmark"
+
+
+class CommandTimer(monitoring.CommandListener):
+    """A listener summing the time spent in MongoDB commands, from all clients."""
+
+    def __init__(self) -> None:
+        self.total_sec = 0.0
+        self._lock = threading.Lock()
+
+    def started(self, event) -> None:
+        pass
+
+    def succeeded(self, event) -> None:
+        with self._lock:
+            self.total_sec += event.duration_micros / 1e6
+
+    def failed(self, event) -> None:
+        self.succeeded(event)
+
+
+def fast_throttle() -> Throttle:
+    """Return a throttle that lets the storefront be hit at full speed."""
+
+    return Throttle(
+        RateController(rate=1000.0, max_rate=1000.0, burst=32),
+        CircuitBreaker(threshold=3, cooldown=1.0, max_cooldown=5.0),
+    )
+
+
+def bench_parse(storefront: Storefront, repeat: int) -> dict[str, float]:
+    """Measure the time to parse each kind of recorded page, in ms per page."""
+
+    results = {}
+    for name, (path, parse) in PARSERS.items():
+        page_source = storefront.pages[path]
+        start = time.perf_counter()
+        for _ in range(repeat):
+            parse(HtmlDocument(page_source))
+        results[name] = 1000 * (time.perf_counter() - start) / repeat
+    return results
+
+
+def bench_spider(
+    worker_cls, storefront: Storefront, timer: CommandTimer, num_workers: int, **kwargs
+) -> dict:
+    """Run a spider end to end against the storefront, and measure its throughput."""
+
+    fetcher = HttpFetcher(base_url=storefront.url, timeout=10.0)
+    with worker_cls(
+        None,
+        fetcher=fetcher,
+        num_workers=num_workers,
+        throttle=fast_throttle(),
+        **kwargs,
+    ) as worker:
+        counts = dict(storefront.counts)
+        db_sec = timer.total_sec
+        start = time.perf_counter()
+        worker.run()
+        elapsed = time.perf_counter() - start
+        db_sec = timer.total_sec - db_sec
+        items = len(worker._data)
+    served = {kind: storefront.counts[kind] - counts[kind] for kind in counts}
+    return {
+        **served,
+        "items": items,
+        "elapsed_sec": elapsed,
+        "pages_per_sec": served["pages"] / elapsed if elapsed else None,
+        "db_ms_per_item": 1000 * db_sec / items if items else None,
+    }
+
+
+def bench_spiders(
+    storefront: Storefront, uri: str, database: str, keywords: list[str], workers: int
+) -> dict[str, dict]:
+    """Run the search, product and review spiders one after another on a fresh database."""
+
+    if not database.endswith(DATABASE_SUFFIX):
+        raise ValueError(
+            f"Refusing to drop {database!r}: its name must end with {DATABASE_SUFFIX!r}."
+        )
+    os.environ["MONGODB_URI"] = uri
+    client = MongoClient(uri)
+    client.drop_database(database)
+    client.close()
+
+    timer = CommandTimer()
+    monitoring.register(timer)
+    return {
+        "search": bench_spider(
+            SearchPageSpiderWorker,
+            storefront,
+            timer,
+            workers,
+            queue=keywords,
+            db_name=database,
+        ),
+        "product": bench_spider(
+            ProductPageSpiderWorker, storefront, timer, workers, db_name=database
+        ),
+        "review": bench_spider(
+            ReviewPageSpiderWorker, storefront, timer, workers, db_name=database
+        ),
+    }
+
+
+def flatten(results: dict, prefix: str = "") -> dict[str, float]:
+    """Flatten nested results into dotted metric names."""
+
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Return the metrics that are worse than the baseline beyond the tolerance."""
+
+    regressions = []
+    current = flatten(results["metrics"])
+    for name, reference in flatten(baseline["metrics"]).items():
+        value = current.get(name)
+        if value is None or not reference:
+            continue
+        if name.endswith(HIGHER_IS_BETTER):
+            worse = value < reference * (1 - tolerance)
+        elif name.startswith("parse_ms.") or name.endswith("_ms_per_item"):
+            worse = value > reference * (1 + tolerance)
+        else:
+            continue
+        if worse:
+            regressions.append(f"{name}: {value:.3f} (baseline {reference:.3f})")
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run the benchmark, and return 1 if a metric regressed against the baseline."""
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--keywords", nargs="+", default=DEFAULT_KEYWORDS)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--block-rate", type=float, default=0.0)
+    parser.add_argument("--captcha-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--mongodb-uri", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default="amazon_benchmark")
+    parser.add_argument("--parse-only", action="store_true")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+    if not args.parse_only and not args.database.endswith(DATABASE_SUFFIX):
+        parser.error(f"--database must end with {DATABASE_SUFFIX}, as it is dropped")
+
+    config = {
+        "keywords": args.keywords,
+        "latency": args.latency,
+        "block_rate": args.block_rate,
+        "captcha_rate": args.captcha_rate,
+        "workers": args.workers,
+        "parse_only": args.parse_only,
+    }
+    with Storefront(args.latency, args.block_rate, args.captcha_rate) as storefront:
+        metrics = {"parse_ms": bench_parse(storefront, args.repeat)}
+        if not args.parse_only:
+            metrics.update(
+                bench_spiders(
+                    storefront,
+                    args.mongodb_uri,
+                    args.database,
+                    args.keywords,
+                    args.workers,
+                )
+            )
+    results = {"config": config, "metrics": metrics}
+    print(json.dumps(results, indent=2))
+
+    if args.update_baseline or not args.baseline.exists():
+        args.baseline.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+        print(f"Baseline written to {args.baseline}.")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    if baseline["config"] != config:
+        print("Baseline was measured with another configuration, not compared.")
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    if not regressions:
+        print(f"No regression beyond {args.tolerance:.0%} of the baseline.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+Contain a local mock of the amazon.fr storefront, serving recorded pages.
+"""
+
+import hashlib
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+FIXTURE_PAGES_DIR = Path(__file__).parent.parent / "tests" / "fixtures" / "pages"
+TEMPLATE_ASIN = "B0TEST0001"
+TEMPLATE_FAMILY = "B0TESTFAM1"
+
+
+def keyword_tag(keyword: str) -> str:
+    """Get a 4-character tag of a keyword, making the ASINs of its results unique."""
+
+    digest = int(hashlib.sha1(keyword.encode("utf-8")).hexdigest(), 16)
+    tag = ""
+    for _ in range(4):
+        digest, digit = divmod(digest, 36)
+        tag += "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"[digit]
+    return tag
+
+
+class Storefront:
+    """
+    A local HTTP server standing in for amazon.fr, with many products.
+
+    The recorded pages are templates: the search results of a keyword get
+    ASINs of their own, and every product and review page is served from the
+    recorded one with the requested ASIN. Each request waits `latency`
+    seconds, and is served the anti-robot page with probability `block_rate`,
+    or the captcha page with probability `captcha_rate`.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        block_rate: float = 0.0,
+        captcha_rate: float = 0.0,
+        pages_dir: Path = FIXTURE_PAGES_DIR,
+        seed: int = 0,
+    ) -> None:
+        self.latency = latency
+        self.block_rate = block_rate
+        self.captcha_rate = captcha_rate
+        self.pages = {
+            path.relative_to(pages_dir)
+            .with_suffix("")
+            .as_posix(): path.read_text(encoding="utf-8")
+            for path in pages_dir.rglob("*.html")
+        }
+        self.counts = {"pages": 0, "blocks": 0, "captchas": 0, "missing": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """Return the base url of the running storefront."""
+
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def render(self, path: str) -> str | None:
+        """Return the page served for a path, or None if there is none."""
+
+        parts = urlsplit(path)
+        name = re.sub(r"/ref=.*$", "", parts.path.strip("/"))
+        query = parse_qs(parts.query)
+        page = (query.get("page") or query.get("pageNumber") or ["1"])[0]
+        suffix = "" if page == "1" else f"-{page}"
+
+        if name == "s":
+            template = self.pages.get(f"s{suffix}")
+            keyword = (query.get("k") or [""])[0]
+            if template is None:
+                return None
+            template = template.replace("k=tampon+femme", urlencode({"k": keyword}))
+            return template.replace("B0TEST", f"B0{keyword_tag(keyword)}")
+        kind, _, asin = name.partition("/")
+        if kind not in ("dp", "product-reviews") or not asin:
+            return None
+        template = self.pages.get(f"{kind}/{TEMPLATE_ASIN}{suffix}")
+        if template is None:
+            return None
+        return template.replace(TEMPLATE_FAMILY, asin).replace(TEMPLATE_ASIN, asin)
+
+    def serve(self, path: str) -> str | None:
+        """Return the page served for a request, blocked or not, and count it."""
+
+        time.sleep(self.latency)
+        with self._lock:
+            draw = self._random.random()
+        if draw < self.block_rate:
+            kind, content = "blocks", self.pages["errors/antirobot"]
+        elif draw < self.block_rate + self.captcha_rate:
+            kind, content = "captchas", self.pages["errors/captcha"]
+        else:
+            content = self.render(path)
+            kind = "pages" if content is not None else "missing"
+        with self._lock:
+            self.counts[kind] += 1
+        return content
+
+    def start(self) -> "Storefront":
+        """Start serving in a background thread."""
+
+        storefront = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):  # pylint: disable=invalid-name
+                content = storefront.serve(self.path)
+                if content is None:
+                    self.send_error(404)
+                    return
+                body = content.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving."""
+
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
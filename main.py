@@ -2,34 +2,242 @@
 Contains the main function to run the scraping.
 """
 
+from datetime import date
+from functools import wraps
+from pathlib import Path
+
+from mongodb import DatabaseClient, WorkQueue
+from mongodb.interfaces import SessionLogInfo
 from scraping import (
+    DriverManager,
+    HttpFetcher,
+    Orchestrator,
+    PageArchive,
     ProductPageSpiderWorker,
+    RefreshScheduler,
+    RelevanceClassifier,
+    ReplayFetcher,
     ReviewPageSpiderWorker,
     SearchPageSpiderWorker,
-    get_driver,
+    SeleniumFetcher,
+    Throttle,
+)
+from scraping.base import BaseItemScraper
+from scraping.pipelines import (
+    REPLAY_PRODUCT_PAGE_PIPELINE,
+    REPLAY_REVIEW_PAGE_PIPELINE,
 )
+from scraping.profiling import DEFAULT_PROFILE_DIR, Profiler
+from scraping.throttle import RateController
+
+NUM_WORKERS = 4
+PAGE_BUDGET = 2000
+PROFILE = False  # sample-profile every entry point into data/profiles/
+
+drivers = DriverManager("Chrome", warmup_url="https://www.amazon.fr", profile="Scrape")
+archive = PageArchive()
+# a batch of pages is fetched concurrently as long as it fits in the burst
+throttle = Throttle(RateController(burst=BaseItemScraper.page_batch_size))
+
+
+def profiled(entry_point):
+    """
+    Sample-profile an entry point with a single Profiler, if PROFILE is set.
+
+    The profiles are written to `data/profiles/session_<id>`, where `id` is
+    the session reserved for the run, and logged with action type "Profile"
+    along with the ids of the spider sessions profiled, which link back to it.
+    """
+
+    @wraps(entry_point)
+    def wrapper(*args, **kwargs):
+        if not PROFILE:
+            return entry_point(*args, **kwargs)
+        with DatabaseClient(action_type="Profile") as db:
+            output_dir = Path(DEFAULT_PROFILE_DIR) / f"session_{db.session_id}"
+            with Profiler(output_dir, session_id=db.session_id) as profiler:
+                result = entry_point(*args, **kwargs)
+            db.log(SessionLogInfo(update_count=0, profile=profiler.summary))
+            print(f"Profiles written to {output_dir}")
+        return result
+
+    return wrapper
+
+
+def get_fetcher() -> HttpFetcher:
+    """Fetch raw HTML over HTTP, and only fall back to a browser on captchas."""
 
-driver = get_driver("Chrome")
+    return HttpFetcher(fallback=SeleniumFetcher(manager=drivers))
 
 
+def get_relevance() -> RelevanceClassifier | None:
+    """Train the classifier skipping off-topic products on the product pages visited."""
+
+    try:
+        return RelevanceClassifier.from_csv()
+    except ValueError as e:
+        print(f"No relevance filter: {e}")
+        return None
+
+
+@profiled
 def scrape_search_page():
     """Scrape the search pages."""
 
-    with SearchPageSpiderWorker(driver=driver) as worker:
+    with SearchPageSpiderWorker(
+        driver=None,
+        fetcher=get_fetcher(),
+        drivers=drivers,
+        archive=archive,
+        throttle=throttle,
+    ) as worker:
         worker.run()
 
 
+@profiled
 def scrape_product_page():
     """Scrape the product pages."""
 
-    with ProductPageSpiderWorker(driver=driver) as worker:
+    with ProductPageSpiderWorker(
+        driver=None,
+        fetcher=get_fetcher(),
+        num_workers=NUM_WORKERS,
+        drivers=drivers,
+        archive=archive,
+        throttle=throttle,
+        relevance=get_relevance(),
+    ) as worker:
         worker.run()
 
 
+@profiled
 def scrape_review_page():
     """Scrape the review pages."""
 
-    with ReviewPageSpiderWorker(driver=driver) as worker:
+    with ReviewPageSpiderWorker(
+        driver=None,
+        fetcher=get_fetcher(),
+        num_workers=NUM_WORKERS,
+        drivers=drivers,
+        archive=archive,
+        throttle=throttle,
+    ) as worker:
+        worker.run()
+
+
+@profiled
+def refresh_product_page():
+    """Refresh the stalest and most valuable product pages, within the page budget."""
+
+    with ProductPageSpiderWorker(
+        driver=None,
+        fetcher=get_fetcher(),
+        num_workers=NUM_WORKERS,
+        drivers=drivers,
+        archive=archive,
+        throttle=throttle,
+        scheduler=RefreshScheduler(budget=PAGE_BUDGET),
+    ) as worker:
+        worker.run()
+
+
+@profiled
+def refresh_review_page():
+    """Scrape only the reviews newer than the stored ones, within the page budget."""
+
+    with ReviewPageSpiderWorker(
+        driver=None,
+        fetcher=get_fetcher(),
+        num_workers=NUM_WORKERS,
+        drivers=drivers,
+        archive=archive,
+        throttle=throttle,
+        incremental=True,
+        scheduler=RefreshScheduler(budget=PAGE_BUDGET),
+    ) as worker:
+        worker.run()
+
+
+@profiled
+def scrape_continuous():
+    """Scrape search, product and review pages at once, handing new items over."""
+
+    Orchestrator(
+        get_fetcher,
+        num_workers=NUM_WORKERS,
+        drivers=drivers,
+        archive=archive,
+        throttle=throttle,
+        relevance=get_relevance(),
+    ).run()
+
+
+@profiled
+def scrape_product_page_shared(queue_name: str | None = None):
+    """Scrape the product pages from a work queue shared with other nodes."""
+
+    queue_name = queue_name or f"product_page_{date.today():%Y%m%d}"
+    with ProductPageSpiderWorker(
+        driver=None,
+        fetcher=get_fetcher(),
+        num_workers=NUM_WORKERS,
+        drivers=drivers,
+        archive=archive,
+        throttle=throttle,
+        relevance=get_relevance(),
+    ) as worker:
+        worker.run_work_queue(WorkQueue(worker.db, queue_name))
+
+
+@profiled
+def scrape_review_page_shared(queue_name: str | None = None):
+    """Scrape the review pages from a work queue shared with other nodes."""
+
+    queue_name = queue_name or f"review_page_{date.today():%Y%m%d}"
+    with ReviewPageSpiderWorker(
+        driver=None,
+        fetcher=get_fetcher(),
+        num_workers=NUM_WORKERS,
+        drivers=drivers,
+        archive=archive,
+        throttle=throttle,
+    ) as worker:
+        worker.run_work_queue(WorkQueue(worker.db, queue_name))
+
+
+@profiled
+def replay_product_page(session_id: int | None = None):
+    """
+    Parse the archived product pages again, without network or browser.
+
+    `session_id` is the id of a session in `session_logs`; without it, each
+    page is read from the newest session that archived it.
+    """
+
+    with ProductPageSpiderWorker(
+        driver=None,
+        action_type="Product Page Replay",
+        pipeline=REPLAY_PRODUCT_PAGE_PIPELINE,
+        fetcher=ReplayFetcher(archive, session_id),
+    ) as worker:
+        worker.run()
+
+
+@profiled
+def replay_review_page(session_id: int | None = None):
+    """
+    Parse the archived review pages again, without network or browser.
+
+    `session_id` is the id of a session in `session_logs`; without it, each
+    page is read from the newest session that archived it.
+    """
+
+    with ReviewPageSpiderWorker(
+        driver=None,
+        action_type="Review Page Replay",
+        pipeline=REPLAY_REVIEW_PAGE_PIPELINE,
+        fetcher=ReplayFetcher(archive, session_id),
+    ) as worker:
         worker.run()
 
 
@@ -37,4 +245,5 @@ if __name__ == "__main__":
     # scrape_search_page()
     # scrape_product_page()
     # scrape_review_page()
+    # scrape_continuous()
     pass
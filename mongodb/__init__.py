@@ -1,3 +1,4 @@
 from .client import DatabaseClient
+from .queue import WorkQueue
 
-__all__ = ["DatabaseClient"]
+__all__ = ["DatabaseClient", "WorkQueue"]
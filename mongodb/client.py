@@ -1,10 +1,14 @@
 """A client for MongoDB access."""
 
 
-from datetime import datetime
+import hashlib
+import os
+from datetime import datetime, timedelta
 
 import pandas as pd
 from bson import json_util
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from pymongo.cursor import Cursor
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
 
@@ -13,17 +17,19 @@ from .interfaces import DatabaseCounter, SessionLog, SessionLogInfo
 
 def load_env_uri() -> str:
     """
-    Retrieves the default MongoDB URI from the .env file.
+    Retrieves the default MongoDB URI from the environment, or else from the .env file.
 
     Returns:
         str: The default MongoDB URI.
 
     Raises:
-        KeyError: If the MONGODB_URI is not set in the .env file.
+        KeyError: If the MONGODB_URI is not set in the environment nor in the .env file.
     """
 
     from dotenv import dotenv_values
 
+    if "MONGODB_URI" in os.environ:
+        return os.environ["MONGODB_URI"]
     try:
         config = dotenv_values(".env")
         return config["MONGODB_URI"]
@@ -32,22 +38,63 @@ def load_env_uri() -> str:
         raise KeyError(ERROR_MESSAGE)
 
 
+def content_hash(document: dict) -> str:
+    """
+    Computes a fingerprint of the content of a document, regardless of its metadata.
+
+    Args:
+        document (dict): The document, e.g. a product.
+
+    Returns:
+        str: The fingerprint of the fields not starting with an underscore, e.g. `_metadata`.
+    """
+
+    content = {key: value for key, value in document.items() if key[0] != "_"}
+    dump = json_util.dumps(content, sort_keys=True)
+    return hashlib.sha1(dump.encode("utf-8")).hexdigest()[:16]
+
+
+def scraped_at(fields: dict) -> dict:
+    """
+    Computes the time a spider scraped a product, from the metadata of the fields to set.
+
+    The `_metadata` of a product is overwritten by every spider, so each spider
+    also sets the time of its own scrap in `_scraped_at`, by scrap status.
+
+    Args:
+        fields (dict): The fields of the product to set, with its `_metadata`.
+
+    Returns:
+        dict: The `_scraped_at` field of the scrap status, or an empty dict without metadata.
+    """
+
+    metadata = fields.get("_metadata") or {}
+    if "scrap_status" not in metadata or "last_session_time" not in metadata:
+        return {}
+    return {f"_scraped_at.{metadata['scrap_status']}": metadata["last_session_time"]}
+
+
 class DatabaseClient:
     DB_NAME = "amazon"
     ITEM_COLLECTION_NAME = "items"
     LOG_COLLECTION_NAME = "session_logs"
     COUNTER_COLLECTION_NAME = "log_counters"
+    CHECKPOINT_COLLECTION_NAME = "review_checkpoints"
+    HISTORY_SIZE = 50
 
     def __init__(
         self,
         uri: str | None = None,
         action_type: str | None = "DatabaseClient: Default Action",
+        db_name: str | None = None,
     ) -> None:
         """
         Initialize a MongoDB client.
 
         Args:
             uri (str | None): The MongoDB connection URI. If None, the default URI will be used.
+            action_type (str | None): The action logged with the session.
+            db_name (str | None): The name of the database. If None, DB_NAME will be used.
 
         Returns:
             None
@@ -59,11 +106,12 @@ class DatabaseClient:
             uri,
             server_api=ServerApi(version="1"),
         )
-        self.db = self.client[self.DB_NAME]
+        self.db = self.client[db_name or self.DB_NAME]
         self.collection = self.db[self.ITEM_COLLECTION_NAME]
         self.log_collection = self.db[self.LOG_COLLECTION_NAME]
         self.counter_collection = self.db[self.COUNTER_COLLECTION_NAME]
-        self.session_id = self.get_counter()
+        self.checkpoint_collection = self.db[self.CHECKPOINT_COLLECTION_NAME]
+        self.session_id = self.reserve_session_id()
         self._logged = False
         self.action_type = action_type
 
@@ -113,6 +161,25 @@ class DatabaseClient:
         else:
             return doc["count"]
 
+    def reserve_session_id(self) -> int:
+        """
+        Reserves the id of a new session by incrementing the counter atomically.
+
+        Clients created at the same time, e.g. the spiders run by an Orchestrator,
+        get distinct ids, and the session is logged under the id it reserved.
+
+        Returns:
+            int: The id of the session.
+        """
+        document = DatabaseCounter()
+        counter = self.counter_collection.find_one_and_update(
+            document.get_id(),
+            document.increment_count(),
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return counter["count"]
+
     def increment_counter(self) -> None:
         """
         Increments the counter value by 1.
@@ -126,7 +193,7 @@ class DatabaseClient:
 
     def log(self, info: SessionLogInfo) -> SessionLog:
         """
-        Logs the session information.
+        Logs the session information, under the id reserved for the session.
 
         Args:
             info (SessionLogInfo | dict): The session log information.
@@ -135,10 +202,8 @@ class DatabaseClient:
             SessionLog: The logged session information.
         """
 
-        self.increment_counter()
-        id = self.get_counter()
         content = SessionLog(
-            id=id,
+            id=self.session_id,
             time=datetime.now(),
             action_type=self.action_type,
             info=info,
@@ -181,24 +246,130 @@ class DatabaseClient:
 
         return list(self.collection.distinct("asin"))
 
-    def update_product(self, product: dict) -> bool:
+    def iter_asins(self, after_id=None, batch_size: int = 10000) -> Cursor:
+        """
+        Iterates over the ASINs of the collection, in insertion order.
+
+        Args:
+            after_id (ObjectId | None): Optional. The id of the last document already read.
+            batch_size (int): The number of documents fetched per round trip.
+
+        Returns:
+            Cursor: A cursor over documents holding the `_id` and `asin` only.
+        """
+        query = {"asin": {"$exists": True}}
+        if after_id is not None:
+            query["_id"] = {"$gt": after_id}
+        cursor = self.collection.find(query, {"asin": 1})
+        return cursor.sort("_id", 1).batch_size(batch_size)
+
+    def update_product(self, product: dict, history: dict | None = None) -> bool:
         """
         Updates a product in the collection.
 
         Args:
             product: The product to be updated.
+            history (dict | None): Entries to append to history arrays of the product, by field.
 
         Returns:
             bool: True if the update was successful, False otherwise.
         """
+        update = {"$set": {**product, **scraped_at(product)}}
+        if history:
+            update["$push"] = self._history_push(history)
         result = self.collection.update_one(
             {"asin": product["asin"]},
-            {"$set": product},
+            update,
             upsert=True,
         )
 
         return result.acknowledged
 
+    def _history_push(self, history: dict) -> dict:
+        return {
+            field: {"$each": [entry], "$slice": -self.HISTORY_SIZE}
+            for field, entry in history.items()
+        }
+
+    def save_product(self, product: dict, history: dict | None = None) -> bool:
+        """
+        Writes a product only if its content changed since the last write.
+
+        The hash of the content is stored in `_content_hash`, by scrap status of
+        the `_metadata`, so that the spiders writing different fields of a product
+        do not invalidate each other's hash. If the content is unchanged, only
+        the metadata and the history of the product are updated. The other
+        writes of the content of a product drop its hashes.
+
+        Args:
+            product (dict): The product to be written, with its `_metadata`.
+            history (dict | None): Entries to append to history arrays of the product, by field.
+
+        Returns:
+            bool: True if the content was written, False if it was unchanged.
+        """
+        metadata = product.get("_metadata") or {}
+        field = f"_content_hash.{metadata.get('scrap_status', 'Default')}"
+        digest = content_hash(product)
+
+        touch = {"$set": {"_metadata": metadata, **scraped_at(product)}}
+        if history:
+            touch["$push"] = self._history_push(history)
+        result = self.collection.update_one(
+            {"asin": product["asin"], field: digest}, touch
+        )
+        if result.matched_count:
+            return False
+
+        self.update_product({**product, field: digest}, history)
+        return True
+
+    def save_products(
+        self, products: list[dict], histories: list[dict | None] | None = None
+    ) -> list[bool]:
+        """
+        Writes products in a single bulk operation, rewriting only the ones whose content changed.
+
+        The stored hashes of the batch are read with a single query, as in `save_product`.
+
+        Args:
+            products (list[dict]): The products to be written, with their `_metadata`.
+            histories (list[dict | None] | None): Entries to append to history arrays, by product.
+
+        Returns:
+            list[bool]: Whether the content of each product was written.
+        """
+        if not products:
+            return []
+        histories = histories or [None] * len(products)
+        stored = {
+            doc["asin"]: doc.get("_content_hash") or {}
+            for doc in self.collection.find(
+                {"asin": {"$in": [product["asin"] for product in products]}},
+                {"_id": 0, "asin": 1, "_content_hash": 1},
+            )
+        }
+
+        requests = []
+        changed = []
+        for product, history in zip(products, histories):
+            metadata = product.get("_metadata") or {}
+            status = metadata.get("scrap_status", "Default")
+            digest = content_hash(product)
+            if stored.get(product["asin"], {}).get(status) == digest:
+                update = {"$set": {"_metadata": metadata}}
+                changed.append(False)
+            else:
+                update = {"$set": {**product, f"_content_hash.{status}": digest}}
+                changed.append(True)
+            update["$set"].update(scraped_at(product))
+            if history:
+                update["$push"] = self._history_push(history)
+            requests.append(UpdateOne({"asin": product["asin"]}, update, upsert=True))
+        self.collection.bulk_write(requests, ordered=False)
+
+        return changed
+
     def snapshot(self, download_path: str | None = None) -> list[dict]:
         """
         Takes a snapshot of the collection and returns a list of documents.
@@ -233,13 +404,17 @@ class DatabaseClient:
         return products
 
     def export_reviews(self) -> pd.DataFrame:
-        project = {"_id": 0, "reviews": 1, "asin": 1}
+        project = {"_id": 0, "reviews": 1, "asin": 1, "reviews_asin": 1}
         items = list(self.collection.find({}, project))
+        shared = {item["asin"]: item.get("reviews") or [] for item in items}
 
         def rowify_reviews(item):
-            reviews = item["reviews"]
+            reviews = item.get("reviews")
+            if reviews is None and "reviews_asin" in item:
+                # variants are linked to the reviews of their family
+                reviews = [dict(r) for r in shared.get(item["reviews_asin"], [])]
             asin = item["asin"]
-            for review in reviews:
+            for review in reviews or []:
                 review["asin"] = asin
                 yield review
 
@@ -249,3 +424,154 @@ class DatabaseClient:
         print(f"Queried {len(reviews)} reviews.")
 
         return reviews
+
+    def add_reviews(
+        self, asin: str, reviews: list[dict], fields: dict | None = None
+    ) -> bool:
+        """
+        Adds new reviews in front of the reviews of a product, without rewriting the stored ones.
+
+        Args:
+            asin (str): The ASIN of the product.
+            reviews (list[dict]): The new reviews, newest first.
+            fields (dict | None): Other fields of the product to set.
+
+        Returns:
+            bool: True if the update was successful, False otherwise.
+        """
+        update = {
+            "$push": {"reviews": {"$each": reviews, "$position": 0}},
+            "$unset": {"_content_hash": ""},
+        }
+        if fields:
+            update["$set"] = {**fields, **scraped_at(fields)}
+        result = self.collection.update_one({"asin": asin}, update, upsert=True)
+
+        return result.acknowledged
+
+    def link_reviews(
+        self, asin: str, reviews_asin: str, fields: dict | None = None
+    ) -> bool:
+        """
+        Links a product to the reviews stored on another product of its variant family.
+
+        Args:
+            asin (str): The ASIN of the product.
+            reviews_asin (str): The ASIN of the product storing the shared reviews.
+            fields (dict | None): Other fields of the product to set.
+
+        Returns:
+            bool: True if the update was successful, False otherwise.
+        """
+        update = {
+            "$set": {
+                **(fields or {}),
+                **scraped_at(fields or {}),
+                "reviews_asin": reviews_asin,
+            },
+            "$unset": {"reviews": "", "_content_hash": ""},
+        }
+        result = self.collection.update_one({"asin": asin}, update, upsert=True)
+
+        return result.acknowledged
+
+    def save_checkpoint(self, asin: str, page: int, items: list[dict]) -> bool:
+        """
+        Saves the position of a review crawl, with the reviews collected since the last checkpoint.
+
+        The reviews of each page are stored in their own document of the
+        checkpoint collection, so that the product keeps its stored reviews
+        until the crawl is committed, without growing towards the size limit
+        of a document.
+
+        Args:
+            asin (str): The ASIN of the product.
+            page (int): The number of the last page collected.
+            items (list[dict]): The reviews collected since the last checkpoint.
+
+        Returns:
+            bool: True if the update was successful, False otherwise.
+        """
+        result = self.checkpoint_collection.update_one(
+            {"asin": asin, "page": page},
+            {"$set": {"time": datetime.now(), "items": items}},
+            upsert=True,
+        )
+
+        return result.acknowledged
+
+    def load_checkpoint(
+        self,
+        asin: str,
+        max_age: timedelta | None = None,
+        fields: tuple[str, ...] = ("fingerprint",),
+    ) -> dict | None:
+        """
+        Loads the checkpoint of an interrupted review crawl.
+
+        Only the given fields of the reviews collected are loaded.
+
+        Args:
+            asin (str): The ASIN of the product.
+            max_age (timedelta | None): Optional. The age over which a checkpoint is ignored.
+            fields (tuple[str, ...]): The fields of the reviews to load.
+
+        Returns:
+            dict | None: The last page and the reviews collected, or None if there is no checkpoint.
+        """
+        project = {"_id": 0, "page": 1, "time": 1}
+        project.update({f"items.{field}": 1 for field in fields})
+        pages = list(
+            self.checkpoint_collection.find({"asin": asin}, project).sort(
+                "page", ASCENDING
+            )
+        )
+        if not pages:
+            return None
+        if max_age is not None and pages[-1]["time"] < datetime.now() - max_age:
+            return None
+        items = [item for page in pages for item in page.get("items") or []]
+        return {"page": pages[-1]["page"], "items": items}
+
+    def clear_checkpoint(self, asin: str) -> bool:
+        """
+        Deletes the checkpoint of a review crawl.
+
+        Args:
+            asin (str): The ASIN of the product.
+
+        Returns:
+            bool: True if the deletion was successful, False otherwise.
+        """
+        result = self.checkpoint_collection.delete_many({"asin": asin})
+
+        return result.acknowledged
+
+    def commit_checkpoint(self, asin: str, fields: dict | None = None) -> bool:
+        """
+        Replaces the reviews of a product by the ones streamed to its checkpoint.
+
+        The reviews are moved page by page, so that they are never all loaded,
+        and the checkpoint is deleted once they are all moved. If the commit is
+        interrupted, the checkpoint is kept and committed again from the start.
+
+        Args:
+            asin (str): The ASIN of the product.
+            fields (dict | None): Other fields of the product to set.
+
+        Returns:
+            bool: True if the update was successful, False otherwise.
+        """
+        fields = {**(fields or {}), **scraped_at(fields or {})}
+        update = {"$set": {**fields, "reviews": []}, "$unset": {"_content_hash": ""}}
+        self.collection.update_one({"asin": asin}, update, upsert=True)
+        pages = self.checkpoint_collection.find(
+            {"asin": asin}, {"_id": 0, "items": 1}
+        ).sort("page", ASCENDING)
+        for page in pages:
+            if page.get("items"):
+                self.collection.update_one(
+                    {"asin": asin}, {"$push": {"reviews": {"$each": page["items"]}}}
+                )
+
+        return self.clear_checkpoint(asin)
@@ -0,0 +1,216 @@
+"""
+A work queue in MongoDB, shared by scraping workers on several nodes.
+"""
+
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Callable, Iterator
+
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+
+from .client import DatabaseClient
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+DEAD = "dead"
+
+
+class WorkQueue:
+    """
+    A queue of work items stored in a MongoDB collection.
+
+    Items are claimed atomically with a find-and-modify, which leases them to
+    a single owner for `lease_sec` seconds. The owner extends its leases with
+    heartbeats while it works, and marks the items done or failed. The lease
+    of a crashed owner simply expires, and the item is claimed again. An item
+    failing `max_attempts` times is moved to the dead-letter state.
+    """
+
+    COLLECTION_PREFIX = "queue_"
+
+    def __init__(
+        self,
+        db_client: DatabaseClient,
+        name: str,
+        lease_sec: float = 300.0,
+        max_attempts: int = 3,
+        owner: str | None = None,
+    ) -> None:
+        """
+        Initialize a work queue.
+
+        Args:
+            db_client (DatabaseClient): The client of the database holding the queue.
+            name (str): The name of the queue, e.g. an action and a run date.
+            lease_sec (float): The duration of a lease without heartbeat.
+            max_attempts (int): The number of claims before an item is dead.
+            owner (str | None): The id of this worker. If None, a unique id is generated.
+        """
+        self.collection = db_client.db[self.COLLECTION_PREFIX + name]
+        self.lease = timedelta(seconds=lease_sec)
+        self.max_attempts = max_attempts
+        self.owner = owner or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self.collection.create_index("key", unique=True)
+        self.collection.create_index([("state", ASCENDING), ("lease_until", ASCENDING)])
+
+    def put_many(self, payloads: list, key: Callable[[Any], str]) -> int:
+        """
+        Adds items to the queue, ignoring the ones already in it.
+
+        Args:
+            payloads (list): The payloads of the items.
+            key (Callable): A function returning the unique key of a payload.
+
+        Returns:
+            int: The number of items added.
+        """
+        if not payloads:
+            return 0
+        now = datetime.now()
+        requests = [
+            UpdateOne(
+                {"key": key(payload)},
+                {
+                    "$setOnInsert": {
+                        "key": key(payload),
+                        "payload": payload,
+                        "state": PENDING,
+                        "attempts": 0,
+                        "created": now,
+                    }
+                },
+                upsert=True,
+            )
+            for payload in payloads
+        ]
+        result = self.collection.bulk_write(requests, ordered=False)
+        return result.upserted_count
+
+    def _bury_expired(self) -> None:
+        """Moves the expired leases of items out of attempts to the dead-letter state."""
+
+        self.collection.update_many(
+            {
+                "state": LEASED,
+                "lease_until": {"$lt": datetime.now()},
+                "attempts": {"$gte": self.max_attempts},
+            },
+            {"$set": {"state": DEAD, "error": "Lease expired"}},
+        )
+
+    def claim(self) -> dict | None:
+        """
+        Claims an item, pending or with an expired lease.
+
+        Returns:
+            dict | None: The claimed item, or None if the queue is drained.
+        """
+        self._bury_expired()
+        now = datetime.now()
+        return self.collection.find_one_and_update(
+            {
+                "$or": [
+                    {"state": PENDING},
+                    {"state": LEASED, "lease_until": {"$lt": now}},
+                ],
+                "attempts": {"$lt": self.max_attempts},
+            },
+            {
+                "$set": {
+                    "state": LEASED,
+                    "owner": self.owner,
+                    "lease_until": now + self.lease,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def drain(self, poll_sec: float = 5.0) -> Iterator:
+        """
+        Yields the payloads of the items claimed, until the queue is drained.
+
+        When no item can be claimed but some are still leased, e.g. by another
+        node, the queue is polled every `poll_sec` seconds until they are done,
+        or until their lease expires and they are claimed again.
+
+        Args:
+            poll_sec (float): The time between two polls of the leased items.
+        """
+        while True:
+            item = self.claim()
+            if item is not None:
+                yield item["payload"]
+                continue
+            counts = self.counts()
+            if counts[PENDING] + counts[LEASED] == 0:
+                return
+            time.sleep(poll_sec)
+
+    def _update(self, key: str, update: dict) -> bool:
+        result = self.collection.update_one(
+            {"key": key, "owner": self.owner, "state": LEASED}, update
+        )
+        return result.modified_count > 0
+
+    def heartbeat(self) -> int:
+        """
+        Extends the leases of all the items held by this worker.
+
+        Returns:
+            int: The number of leases extended.
+        """
+        result = self.collection.update_many(
+            {"owner": self.owner, "state": LEASED},
+            {"$set": {"lease_until": datetime.now() + self.lease}},
+        )
+        return result.modified_count
+
+    @contextmanager
+    def heartbeats(self, interval_sec: float | None = None):
+        """Sends heartbeats in a background thread while the context is open."""
+
+        interval = interval_sec or self.lease.total_seconds() / 3
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(interval):
+                self.heartbeat()
+
+        thread = threading.Thread(target=beat, daemon=True)
+        thread.start()
+        try:
+            yield self
+        finally:
+            stop.set()
+            thread.join()
+
+    def complete(self, key: str) -> bool:
+        """Marks an item held by this worker as done."""
+
+        return self._update(key, {"$set": {"state": DONE, "finished": datetime.now()}})
+
+    def fail(self, key: str, error: str) -> bool:
+        """Gives a failed item back to the queue, or to the dead letters when out of attempts."""
+
+        item = self.collection.find_one({"key": key, "owner": self.owner})
+        if item is None:
+            return False
+        state = DEAD if item["attempts"] >= self.max_attempts else PENDING
+        return self._update(key, {"$set": {"state": state, "error": error}})
+
+    def counts(self) -> dict[str, int]:
+        """Returns the number of items in each state."""
+
+        groups = self.collection.aggregate(
+            [{"$group": {"_id": "$state", "count": {"$sum": 1}}}]
+        )
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, DEAD: 0}
+        counts.update({group["_id"]: group["count"] for group in groups})
+        return counts
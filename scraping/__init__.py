@@ -1,7 +1,15 @@
+from .archive import PageArchive, ReplayFetcher
+from .asinset import AsinSet
 from .common import SeleniumDriver, get_driver
+from .drivers import DriverManager
+from .fetch import HttpFetcher, SeleniumFetcher
+from .orchestrator import Orchestrator
 from .product_page.spider import ProductPageSpiderWorker
+from .relevance import RelevanceClassifier
+from .scheduler import RefreshScheduler
 from .review_page.spider import ReviewPageSpiderWorker
 from .search_page.spider import SearchPageSpiderWorker
+from .throttle import Throttle
 
 __all__ = [
     "SearchPageSpiderWorker",
@@ -9,4 +17,14 @@ __all__ = [
     "ReviewPageSpiderWorker",
     "SeleniumDriver",
     "get_driver",
+    "HttpFetcher",
+    "SeleniumFetcher",
+    "DriverManager",
+    "PageArchive",
+    "ReplayFetcher",
+    "Throttle",
+    "Orchestrator",
+    "RelevanceClassifier",
+    "RefreshScheduler",
+    "AsinSet",
 ]
@@ -0,0 +1,158 @@
+"""
+Contain a compressed archive of fetched pages, and the fetchers that record
+pages into it or replay pages from it.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from .common import is_antirobot, is_captcha
+from .document import HtmlDocument
+from .fetch import BaseFetcher, PageUnavailable
+
+DEFAULT_ARCHIVE_PATH = "data/archive"
+
+
+class PageArchive:
+    """
+    A content-addressed, compressed archive of raw HTML pages.
+
+    Each page is stored once as a gzip object named after the SHA-256 of its
+    content, under `objects/`. Each scraping session has an index under
+    `index/<session_id>.jsonl`, mapping the urls fetched during the session
+    to their objects.
+    """
+
+    def __init__(self, path: str | Path = DEFAULT_ARCHIVE_PATH) -> None:
+        self.path = Path(path)
+        self._objects = self.path / "objects"
+        self._index = self.path / "index"
+        self._objects.mkdir(parents=True, exist_ok=True)
+        self._index.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._cache = {}
+
+    def _object_path(self, digest: str) -> Path:
+        return self._objects / digest[:2] / f"{digest[2:]}.html.gz"
+
+    def put(self, url: str, page_source: str, session_id: int) -> str:
+        """Store a page fetched during a session, return the digest of its content."""
+
+        content = page_source.encode("utf-8")
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._object_path(digest)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(gzip.compress(content))
+            os.replace(tmp_path, path)
+
+        entry = {"url": url, "digest": digest, "time": datetime.now().isoformat()}
+        with self._lock:
+            with open(self._index / f"{session_id}.jsonl", "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+            if session_id in self._cache:
+                self._cache[session_id][url] = digest
+        return digest
+
+    def sessions(self) -> list[int]:
+        """List the ids of the archived sessions, from the oldest to the newest."""
+
+        return sorted(int(path.stem) for path in self._index.glob("*.jsonl"))
+
+    def index(self, session_id: int) -> dict[str, str]:
+        """Map the urls archived during a session to their digests."""
+
+        with self._lock:
+            if session_id not in self._cache:
+                index = {}
+                path = self._index / f"{session_id}.jsonl"
+                if path.exists():
+                    with open(path, encoding="utf-8") as f:
+                        for line in f:
+                            entry = json.loads(line)
+                            index[entry["url"]] = entry["digest"]
+                self._cache[session_id] = index
+            return self._cache[session_id]
+
+    def read(self, digest: str) -> str:
+        """Read the content of an archived page by its digest."""
+
+        return gzip.decompress(self._object_path(digest).read_bytes()).decode("utf-8")
+
+    def get(self, url: str, session_id: int | None = None) -> str | None:
+        """
+        Get an archived page by its url.
+
+        Without a session id, the page from the newest session that fetched
+        the url is returned.
+        """
+
+        sessions = [session_id] if session_id is not None else self.sessions()[::-1]
+        for session in sessions:
+            digest = self.index(session).get(url)
+            if digest is not None:
+                return self.read(digest)
+        return None
+
+
+class ArchivingFetcher(BaseFetcher):
+    """
+    A fetcher that stores the pages fetched by another fetcher in an archive.
+
+    Anti-robot and captcha pages are not archived, so that a replay never
+    parses a block page in place of the page it stands for.
+    """
+
+    def __init__(
+        self, fetcher: BaseFetcher, archive: PageArchive, session_id: int
+    ) -> None:
+        self.fetcher = fetcher
+        self.archive = archive
+        self.session_id = session_id
+
+    def fetch(self, url: str) -> HtmlDocument:
+        """Fetch a page and archive it."""
+
+        return self.fetch_many([url])[0]
+
+    def fetch_many(self, urls: list[str]) -> list[HtmlDocument]:
+        """Fetch several pages and archive them."""
+
+        pages = self.fetcher.fetch_many(urls)
+        for url, page in zip(urls, pages):
+            if is_antirobot(page) or is_captcha(page):
+                continue
+            self.archive.put(url, page.page_source, self.session_id)
+        return pages
+
+    def close(self) -> None:
+        """Close the wrapped fetcher."""
+
+        self.fetcher.close()
+
+
+class ReplayFetcher(BaseFetcher):
+    """
+    A fetcher that serves pages from an archive, with no network or browser.
+
+    Pages come from the given session, or from the newest session that
+    fetched them. A page missing from the archive raises PageUnavailable.
+    """
+
+    def __init__(self, archive: PageArchive, session_id: int | None = None) -> None:
+        self.archive = archive
+        self.session_id = session_id
+
+    def fetch(self, url: str) -> HtmlDocument:
+        """Read a page from the archive."""
+
+        page_source = self.archive.get(url, self.session_id)
+        if page_source is None:
+            raise PageUnavailable(f"{url} is not archived")
+        return HtmlDocument(page_source, url)
@@ -0,0 +1,241 @@
+"""
+Contain a compact set of ASINs, packed as integers, for deduplication.
+"""
+
+import hashlib
+import heapq
+import math
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Iterator
+
+from mongodb.client import DatabaseClient
+
+ASIN_LENGTH = 10
+ASIN_PATTERN = re.compile(f"[0-9A-Z]{{{ASIN_LENGTH}}}")
+
+
+def encode_asin(asin: str) -> int:
+    """
+    Pack a 10-character base-36 ASIN into an integer of 52 bits.
+
+    Only digits and uppercase letters are accepted, as base 36 does not tell
+    a lowercase letter from an uppercase one.
+    """
+
+    if not ASIN_PATTERN.fullmatch(asin):
+        raise ValueError(f"Invalid ASIN: {asin!r}")
+    return int(asin, 36)
+
+
+def decode_asin(value: int) -> str:
+    """Unpack an ASIN packed by `encode_asin`."""
+
+    digits = []
+    for _ in range(ASIN_LENGTH):
+        value, digit = divmod(value, 36)
+        digits.append("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"[digit])
+    return "".join(reversed(digits))
+
+
+def merge_unique(*sorted_values: Iterable[int]) -> Iterator[int]:
+    """Merge sorted sequences of integers, without duplicates."""
+
+    last = None
+    for value in heapq.merge(*sorted_values):
+        if value != last:
+            yield value
+            last = value
+
+
+class BloomFilter:
+    """
+    A Bloom filter of integers, sized for a `capacity` and an `error_rate`.
+
+    Its bits are a plain bytearray, so that it can be saved with `to_bytes`
+    and shared with other processes.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01) -> None:
+        capacity = max(1, capacity)
+        self.num_bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray(-(-self.num_bits // 8))
+
+    def _positions(self, value: int) -> Iterator[int]:
+        digest = hashlib.blake2b(value.to_bytes(8, "little"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, value: int) -> None:
+        """Add an integer to the filter."""
+
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value: int) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(value)
+        )
+
+    def to_bytes(self) -> bytes:
+        """Serialize the filter."""
+
+        header = self.num_bits.to_bytes(8, "little") + bytes([self.num_hashes])
+        return header + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "BloomFilter":
+        """Load a filter serialized by `to_bytes`."""
+
+        bloom = cls.__new__(cls)
+        bloom.num_bits = int.from_bytes(data[:8], "little")
+        bloom.num_hashes = data[8]
+        bloom.bits = bytearray(data[9:])
+        return bloom
+
+
+class AsinSet:
+    """
+    A thread-safe set of ASINs, packed as 64-bit integers in a sorted array.
+
+    An ASIN takes 8 bytes instead of a Python string of about 60, and is
+    looked up by bisection. The ASINs added one by one since the last merge
+    are kept in a small set, merged into the array once it holds `merge_size`
+    of them; the ASINs added in bulk are sorted and merged at once.
+    Strings that are not ASINs, lowercase ones included, are kept as they are
+    in a set of their own.
+    With a `bloom_capacity`, a Bloom filter answers most lookups of unknown
+    ASINs without touching the array.
+    The set can be loaded from the database, and refreshed with the products
+    inserted since the last load only.
+    """
+
+    merge_size = 4096
+
+    def __init__(
+        self,
+        asins: Iterable[str] = (),
+        bloom_capacity: int | None = None,
+        error_rate: float = 0.01,
+    ) -> None:
+        self._sorted = array("q")
+        self._recent = set()
+        self._others = set()
+        self._lock = threading.Lock()
+        self._last_id = None
+        self.bloom = None
+        if bloom_capacity is not None:
+            self.bloom = BloomFilter(bloom_capacity, error_rate)
+        self.update(asins)
+
+    @classmethod
+    def from_database(
+        cls, db: DatabaseClient, bloom_capacity: int | None = None
+    ) -> "AsinSet":
+        """Load the ASINs of all products in the database."""
+
+        asins = cls(bloom_capacity=bloom_capacity)
+        asins.load(db)
+        return asins
+
+    def load(self, db: DatabaseClient) -> int:
+        """Add the ASINs of the products inserted since the last load, and count them."""
+
+        count = 0
+
+        def asins():
+            nonlocal count
+            for doc in db.iter_asins(self._last_id):
+                self._last_id = doc["_id"]
+                count += 1
+                yield doc["asin"]
+
+        self.update(asins())
+        return count
+
+    def _merge(self, values: Iterable[int] = ()) -> None:
+        """Merge the recent values, and other sorted values, into the array."""
+
+        with self._lock:
+            recent = sorted(self._recent)
+            self._recent.clear()
+            self._sorted = array("q", merge_unique(self._sorted, recent, values))
+
+    def _find(self, value: int) -> bool:
+        index = bisect_left(self._sorted, value)
+        return index < len(self._sorted) and self._sorted[index] == value
+
+    def add(self, asin: str | None) -> None:
+        """Add an ASIN to the set."""
+
+        if not asin:
+            return
+        try:
+            value = encode_asin(asin)
+        except ValueError:
+            with self._lock:
+                self._others.add(asin)
+            return
+        with self._lock:
+            if self.bloom is not None:
+                self.bloom.add(value)
+            if not self._find(value):
+                self._recent.add(value)
+            should_merge = len(self._recent) >= self.merge_size
+        if should_merge:
+            self._merge()
+
+    def update(self, asins: Iterable[str]) -> None:
+        """Add many ASINs to the set, sorting them at once."""
+
+        values = []
+        others = []
+        for asin in asins:
+            if not asin:
+                continue
+            try:
+                values.append(encode_asin(asin))
+            except ValueError:
+                others.append(asin)
+        values.sort()
+        with self._lock:
+            self._others.update(others)
+            if self.bloom is not None:
+                for value in values:
+                    self.bloom.add(value)
+        self._merge(values)
+
+    def __contains__(self, asin: str) -> bool:
+        try:
+            value = encode_asin(asin)
+        except ValueError:
+            return asin in self._others
+        if self.bloom is not None and value not in self.bloom:
+            return False
+        with self._lock:
+            return value in self._recent or self._find(value)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sorted) + len(self._recent) + len(self._others)
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            values = merge_unique(self._sorted, sorted(self._recent))
+            others = list(self._others)
+        yield from (decode_asin(value) for value in values)
+        yield from others
+
+    def nbytes(self) -> int:
+        """Return the memory taken by the packed ASINs and the Bloom filter."""
+
+        size = self._sorted.itemsize * len(self._sorted)
+        if self.bloom is not None:
+            size += len(self.bloom.bits)
+        return size
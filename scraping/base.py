@@ -2,12 +2,32 @@
 Contain a base class for all spiders
 """
 
+import threading
 from abc import ABC, abstractmethod
 from datetime import datetime
+from functools import partial
+from pathlib import Path
+from typing import Iterable
 
 from mongodb.client import DatabaseClient
+from mongodb.queue import WorkQueue
 
-from .common import SeleniumDriver
+from .archive import ArchivingFetcher, PageArchive, ReplayFetcher
+from .captcha import get_captcha_solver
+from .common import (
+    DEFAULT_BROWSER_TYPE,
+    BrowserType,
+    SeleniumDriver,
+    set_query_params,
+)
+from .document import HtmlDocument
+from .drivers import DriverManager
+from .fetch import BaseFetcher, MeteredFetcher, PageUnavailable, SeleniumFetcher
+from .metrics import Metrics
+from .profiling import get_profiler
+from .relevance import RelevanceClassifier
+from .stages import Stage, StagedPipeline
+from .throttle import Throttle, ThrottledFetcher
 
 
 class BaseItemScraper(ABC):
@@ -16,18 +36,109 @@ class BaseItemScraper(ABC):
 
     A ItemScraper is a worker for processing a single item-object.
     It can be search page of a keyword, a product page, or review pages of a product.
+    Pages are loaded through a fetch backend, which defaults to the Selenium driver.
+    Parse and validation times are recorded in `metrics`, shared with the worker.
     """
 
-    def __init__(self, driver: SeleniumDriver, starting_url: str) -> None:
+    page_batch_size = 10
+
+    def __init__(
+        self,
+        driver: SeleniumDriver,
+        starting_url: str,
+        fetcher: BaseFetcher | None = None,
+        metrics: Metrics | None = None,
+    ) -> None:
         self.driver = driver
+        self.fetcher = fetcher or SeleniumFetcher(driver)
+        self.metrics = metrics or Metrics()
         self._starting_url = starting_url
         self._data = []
 
+    def load(self, url: str) -> HtmlDocument:
+        """Load a page through the fetch backend."""
+
+        return self.fetcher.fetch(url)
+
     @abstractmethod
     def parse(self, url: str) -> dict:
         """Parse a page and return the data."""
         raise NotImplementedError
 
+    def parse_page(self, page: HtmlDocument) -> dict:
+        """Parse a page already loaded and return the data."""
+        raise NotImplementedError
+
+    def collect(self, output: dict) -> None:
+        """Collect the data parsed from a page."""
+        raise NotImplementedError
+
+    def done(self) -> bool:
+        """Whether the crawl can stop before the last page."""
+
+        return False
+
+    def checkpoint(self, page: int) -> None:
+        """Commit the crawl position once a page is collected."""
+
+    def crawl(self, page_param: str, max_page: int = -1, start_page: int = 1) -> None:
+        """
+        Parse the starting page and the pages following it, in page order.
+
+        If the first page tells the number of pages, the urls of the other pages
+        are built with the `page_param` query parameter and fetched concurrently,
+        in batches of `page_batch_size`. Otherwise, the next page links are
+        followed one at a time. The crawl stops at the first anti-robot page,
+        or as soon as `done()` is true. A crawl resumed from `start_page` begins
+        with the url of that page. `checkpoint()` is called after every page.
+        """
+
+        url = self._starting_url
+        if start_page > 1:
+            url = set_query_params(url, **{page_param: start_page})
+        output = self.parse(url)
+        if output.get("is_antirobot"):
+            return
+        self.collect(output)
+        page_count = start_page
+        print(f"Scraped Page {page_count}")
+        self.checkpoint(page_count)
+
+        if self.done():
+            return
+        num_pages = output.get("num_pages")
+        if num_pages is not None:
+            if max_page != -1:
+                num_pages = min(num_pages, max_page)
+            urls = [
+                set_query_params(self._starting_url, **{page_param: number})
+                for number in range(start_page + 1, num_pages + 1)
+            ]
+            for start in range(0, len(urls), self.page_batch_size):
+                batch = urls[start : start + self.page_batch_size]
+                for page in self.fetcher.fetch_many(batch):
+                    output = self.parse_page(page)
+                    if output.get("is_antirobot"):
+                        return
+                    self.collect(output)
+                    page_count += 1
+                    print(f"Scraped Page {page_count}")
+                    self.checkpoint(page_count)
+                    if self.done():
+                        return
+            return
+
+        url = output.get("next_page")
+        while url and (max_page == -1 or page_count < max_page) and not self.done():
+            output = self.parse(url)
+            if output.get("is_antirobot"):
+                return
+            self.collect(output)
+            url = output.get("next_page")
+            page_count += 1
+            print(f"Scraped Page {page_count}")
+            self.checkpoint(page_count)
+
     @abstractmethod
     def run(self) -> None:
         """Run the scraper that can iterate over multiple pages."""
@@ -50,36 +161,105 @@ class BaseSpiderWorker(ABC):
 
     A SpiderWorker is a worker for processing a group of item-objects
     according to a specific action.
-    It takes upon a queue of items, and process them one by one.
-    It also takes care of the database connection.
+    It takes upon a queue of items, and runs them through the scrape, build
+    and persist stages of `run_queue`.
+    It also takes care of the database connection, of its Selenium drivers
+    through a DriverManager, and of the session log.
     """
 
+    max_requeues = 3
+    persist_workers = 2
+    persist_batch_size = 1
+    stage_queue_size = 16
+    metrics_dir: Path | None = None
+
     def __init__(
         self,
-        driver: SeleniumDriver,
+        driver: SeleniumDriver | None,
         action_type: str,
+        fetcher: BaseFetcher | None = None,
+        num_workers: int = 1,
+        driver_type: BrowserType = DEFAULT_BROWSER_TYPE,
+        drivers: DriverManager | None = None,
+        archive: PageArchive | None = None,
+        throttle: Throttle | None = None,
+        relevance: RelevanceClassifier | None = None,
+        db_name: str | None = None,
     ) -> None:
         self.driver = driver
-        self.db = DatabaseClient(action_type=action_type)
+        self.drivers = drivers or DriverManager(driver_type)
+        if driver is not None:
+            self.drivers.adopt(driver)
+        self.db = DatabaseClient(action_type=action_type, db_name=db_name)
+        self.num_workers = max(1, num_workers)
+        self.archive = archive
+        self.throttle = throttle or Throttle()
+        self.relevance = relevance
+        self._skipped = 0
+        self._writes = {"changed": 0, "unchanged": 0}
         self._data = []
         self._meta = {}
         self._logged = False
         self._init_time = datetime.now()
+        self._lock = threading.Lock()
+        self._total = 0
+        self._stages = None
+        self.downstream = None
+        self.work_queue = None
+        self._captcha_stats = get_captcha_solver().stats()
+        self.metrics = Metrics()
 
         self.session_id = self.db.session_id
+        self._fetcher = fetcher or SeleniumFetcher(driver, manager=self.drivers)
+        self.fetcher = self._wrapped(self._fetcher)
         if not self.db.check_connection():
             raise ConnectionError("Database connection failed.")
         print("DatabaseClient initialized with successful connection to MongoDB.")
+        profiler = get_profiler()
+        if profiler is not None:
+            profiler.sessions.append(self.session_id)
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Log the session, and release the database, fetchers and drivers.
+
+        The session log records the activity of the drivers, throttle, captcha
+        solver, stages and work queue, the fetches skipped as off-topic, the
+        changed and unchanged writes, and the `metrics`, which are also written
+        in the Prometheus text format to `metrics_dir`, if set. When the process
+        is sample-profiled by a Profiler, its directory and the id of the session
+        it is logged under are linked under `profile`.
+        """
+
         if not self._logged:
+            self._meta["drivers"] = self.drivers.stats()
+            self._meta["throttle"] = self.throttle.stats()
+            self._meta["captcha"] = get_captcha_solver().stats(self._captcha_stats)
+            if self._stages is not None:
+                self._meta["stages"] = self._stages.stats()
+            if self.relevance is not None:
+                self._meta["skipped_fetches"] = self._skipped
+            if self.work_queue is not None:
+                self._meta["work_queue"] = self.work_queue.counts()
+            if any(self._writes.values()):
+                self._meta["writes"] = dict(self._writes)
+            self._meta["metrics"] = self.metrics.stats()
+            profiler = get_profiler()
+            if profiler is not None:
+                self._meta["profile"] = {
+                    "dir": str(profiler.output_dir),
+                    "session_id": profiler.session_id,
+                }
             self.log()
+            if self.metrics_dir is not None:
+                self.write_metrics(self.metrics_dir)
         self.db.close()
         print("DatabaseClient closed.")
-        self.driver.quit()
+        self.fetcher.close()
+        self.drivers.quit()
         print("SeleniumDriver closed.")
 
     @abstractmethod
@@ -100,3 +280,258 @@ class BaseSpiderWorker(ABC):
     def log(self) -> None:
         """Log the data."""
         raise NotImplementedError
+
+    def scrape(self, fetcher: BaseFetcher, elem):
+        """
+        Scrape a single element of the queue with the given fetcher.
+
+        Return None if an anti-robot page is met and the element should be
+        processed again later.
+        """
+        raise NotImplementedError
+
+    def build(self, result):
+        """Validate the scraped data and add its metadata."""
+
+        return result
+
+    def persist(self, item) -> None:
+        """Write an item to the database."""
+        raise NotImplementedError
+
+    def persist_many(self, items: list) -> list:
+        """
+        Write a batch of items to the database, and return the persisted ones.
+
+        The items dropped from the batch, e.g. invalid ones, are returned as None.
+        """
+
+        for item in items:
+            self.persist(item)
+        return items
+
+    def handoff(self, item) -> list:
+        """
+        Return the elements to hand over to the next spider for a persisted item.
+
+        They are put in the `downstream` queue, if set, as soon as the item is
+        persisted.
+        """
+
+        return []
+
+    def is_relevant(self, asin: str, title: str | None) -> bool:
+        """Whether a product is worth a product-page visit, counting the skipped ones."""
+
+        if self.relevance is None or self.relevance.is_relevant(title):
+            return True
+        print(f"Skipping {asin}, off-topic title: {title}")
+        with self._lock:
+            self._skipped += 1
+        return False
+
+    def save_product(self, product: dict, history: dict | None = None) -> bool:
+        """Write a product if its content changed, and count the write."""
+
+        return self.save_products([product], [history])[0]
+
+    def save_products(
+        self, products: list[dict], histories: list[dict | None] | None = None
+    ) -> list[bool]:
+        """Write products in bulk if their content changed, and count the writes."""
+
+        with self.metrics.timer("db_write"):
+            if len(products) == 1:
+                history = (histories or [None])[0]
+                changed = [self.db.save_product(products[0], history)]
+            else:
+                changed = self.db.save_products(products, histories)
+        with self._lock:
+            self._writes["changed"] += sum(changed)
+            self._writes["unchanged"] += len(changed) - sum(changed)
+        return changed
+
+    def queue_key(self, elem) -> str:
+        """Return the unique key of an element of the queue."""
+
+        return elem if isinstance(elem, str) else elem["asin"]
+
+    def record(self, asin: str) -> None:
+        """Record the ASIN of a processed item and print the progress."""
+
+        with self._lock:
+            self._data.append(asin)
+            progress = f"Progress {len(self._data)}/{self._total}"
+        depths = self._stages.depths() if self._stages else {}
+        queues = ", ".join(f"{name} {depth}" for name, depth in depths.items())
+        print(f"Updated {asin} -- {progress} -- Queues: {queues}")
+
+    def write_metrics(self, metrics_dir: str | Path) -> Path:
+        """Write the metrics of the session in the Prometheus text format."""
+
+        path = Path(metrics_dir) / f"{type(self).__name__}.prom"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        labels = {"action_type": self.db.action_type, "session_id": self.session_id}
+        path.write_text(self.metrics.to_prometheus(labels))
+        return path
+
+    def _wrapped(self, fetcher: BaseFetcher) -> BaseFetcher:
+        """
+        Wrap a fetcher to meter and throttle it, and archive its pages if needed.
+
+        Navigation time, pages, blocks and bytes fetched are recorded in
+        `metrics`, and fetches are paced by the Throttle. With an archive, every
+        fetched page is stored in it; a ReplayFetcher is neither throttled nor
+        archived, as its pages are read from the archive.
+        """
+
+        fetcher = MeteredFetcher(fetcher, self.metrics)
+        if isinstance(fetcher.fetcher, ReplayFetcher):
+            return fetcher
+        fetcher = ThrottledFetcher(fetcher, self.throttle)
+        if self.archive is None:
+            return fetcher
+        return ArchivingFetcher(fetcher, self.archive, self.session_id)
+
+    def _shard_fetchers(self) -> tuple[list[BaseFetcher], list[BaseFetcher]]:
+        """Return a fetcher for each worker, and the extra fetchers opened for them."""
+
+        if not isinstance(self._fetcher, SeleniumFetcher):
+            # other fetchers are thread-safe and pool their own connections
+            return [self.fetcher] * self.num_workers, []
+
+        self.drivers.prewarm(self.num_workers - 1)
+        extra = [
+            self._wrapped(SeleniumFetcher(manager=self.drivers))
+            for _ in range(self.num_workers - 1)
+        ]
+        return [self.fetcher] + extra, extra
+
+    def stream(self, source: Iterable) -> None:
+        """Process the elements handed over by an upstream spider, as they come."""
+
+        self._queue = []
+
+        def consume():
+            for elem in source:
+                with self._lock:
+                    self._queue.append(self.queue_key(elem))
+                    self._total += 1
+                yield elem
+
+        self.run_queue(consume())
+
+    def run_work_queue(self, work_queue: WorkQueue) -> None:
+        """
+        Add the queried elements to a shared work queue, and drain it.
+
+        Every process running the same spider on the same queue adds the same
+        elements, which are only inserted once, and then claims them one by
+        one until none is left, so that the processes share the work.
+        """
+
+        self.query()
+        added = work_queue.put_many(self._queue, self.queue_key)
+        print(f"Added {added}/{len(self._queue)} items to the work queue.")
+        self.work_queue = work_queue
+        with work_queue.heartbeats():
+            self.stream(work_queue.drain())
+
+    def run_queue(self, queue: Iterable) -> None:
+        """
+        Run the queue through the scrape, build and persist stages.
+
+        With a SeleniumFetcher, each scrape worker drives its own browser
+        instance, taken from the prewarmed DriverManager pool.
+        Built items are persisted once `persist_batch_size` of them are ready,
+        and the last ones when the queue is done. With a downstream queue or a
+        work queue, they are persisted as soon as they are built instead, so
+        that neither the handoff nor the completion of an item waits for the
+        rest of its batch.
+        The elements met with an anti-robot page are processed again once the
+        queue is done, after the throttle cooled down, up to `max_requeues`
+        times. With a work queue, they are given back to it instead, and the
+        elements persisted are marked as done in it.
+        All stages stop as soon as one of them raises.
+        """
+
+        self._total = len(queue) if isinstance(queue, list) else 0
+        blocked = []
+        fetchers, extra = self._shard_fetchers()
+
+        def scrape(fetcher: BaseFetcher, elem):
+            key = self.queue_key(elem)
+            try:
+                result = self.scrape(fetcher, elem)
+            except PageUnavailable as e:
+                print(f"{e}, skipping.")
+                if self.work_queue is not None:
+                    self.work_queue.fail(key, str(e))
+                return None
+            if result is None:
+                print("Anti-robot detected, requeueing...")
+                self.metrics.inc("retries")
+                if self.work_queue is not None:
+                    self.work_queue.fail(key, "Anti-robot page")
+                    return None
+                with self._lock:
+                    blocked.append(elem)
+                return None
+            return key, result
+
+        def build(pair):
+            key, result = pair
+            return key, self.build(result)
+
+        pending = []
+        batch_size = self.persist_batch_size
+        if self.downstream is not None or self.work_queue is not None:
+            batch_size = 1
+
+        def settle(batch: list) -> None:
+            persisted = self.persist_many([item for _, item in batch])
+            for (key, _), item in zip(batch, persisted):
+                if item is None:
+                    if self.work_queue is not None:
+                        self.work_queue.fail(key, "Invalid item")
+                    continue
+                if self.work_queue is not None:
+                    self.work_queue.complete(key)
+                if self.downstream is not None:
+                    for elem in self.handoff(item):
+                        self.downstream.put(elem)
+
+        def persist(pair) -> None:
+            with self._lock:
+                pending.append(pair)
+                if len(pending) < batch_size:
+                    return
+                batch = pending[:]
+                pending.clear()
+            settle(batch)
+
+        self._stages = StagedPipeline(
+            [
+                Stage("scrape", [partial(scrape, fetcher) for fetcher in fetchers]),
+                Stage("build", build),
+                Stage("persist", persist, self.persist_workers),
+            ],
+            maxsize=self.stage_queue_size,
+        )
+        try:
+            for attempt in range(self.max_requeues + 1):
+                if attempt > 0:
+                    print(f"Requeueing {len(blocked)} blocked items.")
+                    queue = list(blocked)
+                    blocked.clear()
+                self._stages.run(queue)
+                if pending:
+                    settle(pending[:])
+                    pending.clear()
+                if not blocked:
+                    break
+            else:
+                print(f"Gave up on {len(blocked)} blocked items.")
+        finally:
+            for fetcher in extra:
+                fetcher.close()
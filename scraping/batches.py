@@ -0,0 +1,39 @@
+"""
+Contain the validation of scraped items in batches, with a single pass per batch.
+"""
+
+from typing import TypeVar
+
+from pydantic import TypeAdapter, ValidationError
+
+from .interfaces import BaseItem, ProductItem, ReviewItem
+
+T = TypeVar("T")
+
+SEARCH_ITEMS = TypeAdapter(list[BaseItem])
+PRODUCT_ITEMS = TypeAdapter(list[ProductItem])
+REVIEW_ITEMS = TypeAdapter(list[ReviewItem])
+
+
+def validate_batch(
+    adapter: TypeAdapter[list[T]], rows: list[dict]
+) -> tuple[list[T], set[int]]:
+    """
+    Validate a batch of rows in a single pass, dropping the invalid ones.
+
+    Return the valid items, in order, and the indices of the invalid rows.
+    """
+
+    try:
+        return adapter.validate_python(rows), set()
+    except ValidationError as e:
+        invalid = {error["loc"][0] for error in e.errors()}
+    print(f"Dropped {len(invalid)}/{len(rows)} invalid items.")
+    valid = [row for index, row in enumerate(rows) if index not in invalid]
+    return adapter.validate_python(valid), invalid
+
+
+def dump_batch(adapter: TypeAdapter[list[T]], items: list[T]) -> list[dict]:
+    """Dump a batch of items into documents in a single pass, without the unset fields."""
+
+    return adapter.dump_python(items, by_alias=True, exclude_unset=True)
@@ -0,0 +1,166 @@
+"""
+Contain a captcha solver running in a process pool, with a cache of known captchas.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import threading
+import time
+import urllib.request
+from concurrent.futures import Future, ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+from amazoncaptcha import AmazonCaptcha
+
+DEFAULT_CAPTCHA_CACHE_PATH = "data/captcha_cache.json"
+
+
+def image_hash(image_bytes: bytes) -> str:
+    """Get the SHA-1 hash of an image, as a hex string."""
+
+    return hashlib.sha1(image_bytes).hexdigest()
+
+
+def ocr_captcha(image_bytes: bytes) -> str:
+    """Read the characters of a captcha image with AmazonCaptcha."""
+
+    return AmazonCaptcha(BytesIO(image_bytes)).solve()
+
+
+def download_image(url: str, timeout: float = 10.0) -> bytes:
+    """Download a captcha image."""
+
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.read()
+
+
+class CaptchaSolver:
+    """
+    A captcha solver that runs the OCR in a process pool.
+
+    `submit()` hands an image over to the pool and returns a Future, so the
+    OCR does not hold the GIL and the other scraping threads keep running.
+    `solve()` waits for the Future: the thread whose browser shows the captcha
+    is blocked until it is solved. Solutions are cached by the SHA-1 hash of
+    the image bytes, and a solution is only kept once `confirm()` reports
+    that Amazon accepted it.
+    """
+
+    def __init__(
+        self,
+        cache_path: str | Path | None = DEFAULT_CAPTCHA_CACHE_PATH,
+        max_workers: int = 2,
+    ) -> None:
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._cache = {}
+        if self.cache_path and self.cache_path.exists():
+            self._cache = json.loads(self.cache_path.read_text())
+        self._counts = {
+            "attempts": 0,
+            "cache_hits": 0,
+            "successes": 0,
+            "failures": 0,
+            "latency_sec": 0.0,
+        }
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn, as forking a process running scraping threads is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def submit(self, image_bytes: bytes) -> tuple[str, Future]:
+        """Hand an image over to the pool, and return its hash and future solution."""
+
+        key = image_hash(image_bytes)
+        with self._lock:
+            self._counts["attempts"] += 1
+            solution = self._cache.get(key)
+            if solution is not None:
+                self._counts["cache_hits"] += 1
+        if solution is not None:
+            future = Future()
+            future.set_result(solution)
+            return key, future
+        return key, self._pool().submit(ocr_captcha, image_bytes)
+
+    def solve(self, image_bytes: bytes) -> tuple[str, str]:
+        """Solve a captcha image, and wait for its hash and solution."""
+
+        start = time.perf_counter()
+        key, future = self.submit(image_bytes)
+        solution = future.result()
+        latency = time.perf_counter() - start
+        with self._lock:
+            self._counts["latency_sec"] += latency
+            self._pending[key] = solution
+        return key, solution
+
+    def confirm(self, key: str, accepted: bool) -> None:
+        """Record whether a solution was accepted, and update the cache."""
+
+        with self._lock:
+            solution = self._pending.pop(key, None)
+            if accepted:
+                self._counts["successes"] += 1
+                changed = solution is not None and self._cache.get(key) != solution
+                if changed:
+                    self._cache[key] = solution
+            else:
+                self._counts["failures"] += 1
+                changed = self._cache.pop(key, None) is not None
+            cache = dict(self._cache)
+        if changed and self.cache_path:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            self.cache_path.write_text(json.dumps(cache))
+
+    def stats(self, since: dict | None = None) -> dict:
+        """Return the solve counters, since an earlier snapshot if given."""
+
+        with self._lock:
+            stats = dict(self._counts)
+        if since:
+            stats = {key: value - since[key] for key, value in stats.items()}
+        solved = stats["successes"] + stats["failures"]
+        stats["success_rate"] = (
+            round(stats["successes"] / solved, 3) if solved else None
+        )
+        stats["mean_latency_sec"] = (
+            round(stats["latency_sec"] / stats["attempts"], 3)
+            if stats["attempts"]
+            else None
+        )
+        stats["latency_sec"] = round(stats["latency_sec"], 3)
+        return stats
+
+    def close(self) -> None:
+        """Shut the process pool down."""
+
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+
+_solver = None
+_solver_lock = threading.Lock()
+
+
+def get_captcha_solver() -> CaptchaSolver:
+    """Get the captcha solver shared by the whole process."""
+
+    global _solver
+    with _solver_lock:
+        if _solver is None:
+            _solver = CaptchaSolver()
+        return _solver
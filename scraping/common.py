@@ -2,24 +2,66 @@
 Contain some common functions and constants for scraping.
 """
 
+import json
 import random
 import time
 from typing import Literal
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 import undetected_chromedriver as uc
-from amazoncaptcha import AmazonCaptcha
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 
+from .captcha import CaptchaSolver, download_image, get_captcha_solver
+
 SeleniumDriver = (
     webdriver.Chrome | webdriver.Firefox | webdriver.Edge | webdriver.Safari
 )
 BrowserType = Literal["Chrome", "Firefox", "Edge", "Safari", "Undetected"]
+DriverProfile = Literal["Default", "Scrape"]
 
 
 DEFAULT_BROWSER_TYPE = "Undetected"
 
+# resources blocked by the scrape profile, as Chrome DevTools url patterns
+BLOCKED_URL_PATTERNS = [
+    # images, videos and fonts
+    "*.jpg",
+    "*.jpeg",
+    "*.png",
+    "*.gif",
+    "*.webp",
+    "*.svg",
+    "*.ico",
+    "*.mp4",
+    "*.webm",
+    "*.m3u8",
+    "*.woff",
+    "*.woff2",
+    "*.ttf",
+    "*.otf",
+    # ads, tracking and metrics
+    "*amazon-adsystem.com*",
+    "*doubleclick.net*",
+    "*googlesyndication.com*",
+    "*google-analytics.com*",
+    "*fls-eu.amazon.*",
+    "*unagi*.amazon.*",
+    "*/uedata*",
+    "*/1/batch/*",
+    "*/rd/uedata*",
+]
+
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "fr-FR,fr;q=0.9",
+}
+
 QUERY_KEYWORDS = {
     "serviette hygiénique",
     "tampon femme",
@@ -70,15 +112,20 @@ def is_captcha(driver: SeleniumDriver) -> bool:
     return False
 
 
-def solve_captcha(driver: SeleniumDriver) -> bool:
-    """Solve the captcha using AmazonCaptcha."""
+def solve_captcha(driver: SeleniumDriver, solver: CaptchaSolver | None = None) -> bool:
+    """
+    Solve the captcha with the shared CaptchaSolver.
+
+    The OCR runs in the process pool of the solver, but the calling thread
+    waits for the solution, as its browser cannot move on before submitting it.
+    """
 
     form_element = driver.find_element(
         By.XPATH, "//form[@action='/errors/validateCaptcha']"
     )
     captcha_url = form_element.find_element(By.XPATH, "//img").get_attribute("src")
-    captcha = AmazonCaptcha.fromlink(captcha_url)
-    solution = captcha.solve()
+    solver = solver or get_captcha_solver()
+    key, solution = solver.solve(download_image(captcha_url))
 
     input_field = form_element.find_element(By.ID, "captchacharacters")
     input_field.send_keys(solution)
@@ -86,9 +133,9 @@ def solve_captcha(driver: SeleniumDriver) -> bool:
     submit_button = form_element.find_element(By.XPATH, "//button[@type='submit']")
     submit_button.click()
 
-    if is_captcha(driver):
-        return False
-    return True
+    accepted = not is_captcha(driver)
+    solver.confirm(key, accepted)
+    return accepted
 
 
 def is_filtered(title: str, filter_set: set[str]) -> bool:
@@ -97,16 +144,82 @@ def is_filtered(title: str, filter_set: set[str]) -> bool:
     return any(word.lower() in title.lower() for word in filter_set)
 
 
-def get_driver(driver_type: BrowserType = DEFAULT_BROWSER_TYPE) -> SeleniumDriver:
-    """Get a Selenium driver."""
+def set_scrape_options(options: Options) -> Options:
+    """Set the options of the scrape profile on Chrome options."""
+
+    options.page_load_strategy = "eager"
+    options.add_argument("--blink-settings=imagesEnabled=false")
+    options.add_argument("--disable-remote-fonts")
+    options.add_argument("--mute-audio")
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    return options
+
+
+def block_resources(driver: SeleniumDriver) -> None:
+    """Block the requests matching BLOCKED_URL_PATTERNS with the DevTools protocol."""
+
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+
+
+def get_page_stats(driver: SeleniumDriver) -> dict[str, int]:
+    """
+    Summarize the network activity since the last call, from the performance log.
+
+    Return the number of requests sent, the bytes loaded, and the number of
+    requests that were blocked by the scrape profile.
+    """
+
+    stats = {"requests": 0, "bytes": 0, "blocked_requests": 0}
+    for entry in driver.get_log("performance"):
+        message = json.loads(entry["message"])["message"]
+        params = message.get("params", {})
+        match message["method"]:
+            case "Network.requestWillBeSent":
+                stats["requests"] += 1
+            case "Network.loadingFinished":
+                stats["bytes"] += int(params.get("encodedDataLength", 0))
+            case "Network.loadingFailed" if params.get("blockedReason"):
+                stats["blocked_requests"] += 1
+    return stats
+
+
+def set_query_params(url: str, **params) -> str:
+    """Set some query parameters of an url, e.g. the page number."""
+
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    query.update({key: str(value) for key, value in params.items()})
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def get_driver(
+    driver_type: BrowserType = DEFAULT_BROWSER_TYPE,
+    profile: DriverProfile = "Default",
+) -> SeleniumDriver:
+    """
+    Get a Selenium driver.
+
+    With the `Scrape` profile, only available on Chrome-based drivers, the driver
+    does not wait for the full load event, and does not download images, fonts,
+    videos, ads and tracking scripts.
+    """
+
+    if profile == "Scrape" and driver_type not in ("Undetected", "Chrome"):
+        raise ValueError("The Scrape profile requires a Chrome-based driver.")
 
     match driver_type:
         case "Undetected":
-            driver = uc.Chrome()
+            options = uc.ChromeOptions()
+            if profile == "Scrape":
+                set_scrape_options(options)
+            driver = uc.Chrome(options=options)
         case "Chrome":
             options = Options()
             options.add_argument("--headless")
             options.add_argument("--lang=fr")
+            if profile == "Scrape":
+                set_scrape_options(options)
             driver = webdriver.Chrome(options=options)
         case "Firefox":
             options = Options()
@@ -125,6 +238,9 @@ def get_driver(driver_type: BrowserType = DEFAULT_BROWSER_TYPE) -> SeleniumDrive
             driver = webdriver.Safari(options=options)
         case _:
             raise ValueError("Invalid driver type.")
+
+    if profile == "Scrape":
+        block_resources(driver)
     return driver
 
 
@@ -0,0 +1,84 @@
+"""
+Contain a static HTML document that mimics the subset of the Selenium WebDriver
+API used by the parsing functions, so that they can run over fetched HTML.
+"""
+
+from lxml import html
+from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.common.by import By
+
+
+def to_xpath(by: str, value: str) -> str:
+    """Translate a Selenium locator into an XPath expression."""
+
+    match by:
+        case By.XPATH:
+            return value
+        case By.ID:
+            return f".//*[@id='{value}']"
+        case By.CLASS_NAME:
+            return (
+                ".//*[contains(concat(' ', normalize-space(@class), ' '), "
+                f"' {value} ')]"
+            )
+        case By.TAG_NAME:
+            return f".//{value}"
+        case _:
+            raise ValueError(f"Unsupported locator strategy: {by}")
+
+
+class HtmlElement:
+    """An element of a HtmlDocument, behaving like a Selenium WebElement."""
+
+    def __init__(self, element: html.HtmlElement) -> None:
+        self._element = element
+
+    @property
+    def text(self) -> str:
+        """Return the text content of the element."""
+
+        return self._element.text_content().strip()
+
+    def get_attribute(self, name: str) -> str | None:
+        """Return an attribute of the element, or its text content."""
+
+        if name in ("textContent", "innerText"):
+            return self._element.text_content()
+        return self._element.get(name)
+
+    def find_elements(self, by: str, value: str) -> list["HtmlElement"]:
+        """Find all elements matching the locator, relative to this element."""
+
+        return [HtmlElement(elem) for elem in self._element.xpath(to_xpath(by, value))]
+
+    def find_element(self, by: str, value: str) -> "HtmlElement":
+        """Find the first element matching the locator, relative to this element."""
+
+        elems = self.find_elements(by, value)
+        if not elems:
+            raise NoSuchElementException(f"No element found for {by}={value}")
+        return elems[0]
+
+
+class HtmlDocument(HtmlElement):
+    """
+    A parsed HTML page, behaving like a Selenium WebDriver after `get(url)`.
+
+    `fallback_reason` tells why the page was fetched again by a fallback
+    fetcher: "antirobot", "captcha" or "unavailable", or None if it was not.
+    `captcha_sec` is the time spent solving a captcha to load it, if any.
+    """
+
+    def __init__(self, page_source: str, url: str = "") -> None:
+        super().__init__(html.document_fromstring(page_source or "<html></html>"))
+        self.page_source = page_source
+        self.current_url = url
+        self.fallback_reason = None
+        self.captcha_sec = None
+
+    @property
+    def title(self) -> str:
+        """Return the title of the page."""
+
+        title = self._element.findtext(".//title")
+        return title.strip() if title else ""
@@ -0,0 +1,228 @@
+"""
+Contain a manager for the lifecycle of Selenium drivers.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import psutil
+from selenium.common.exceptions import WebDriverException
+
+from .common import (
+    DEFAULT_BROWSER_TYPE,
+    BrowserType,
+    DriverProfile,
+    SeleniumDriver,
+    get_driver,
+    get_page_stats,
+)
+
+
+@dataclass
+class DriverStats:
+    """The usage of a single driver since it was started."""
+
+    started: datetime = field(default_factory=datetime.now)
+    pages: int = 0
+
+
+def get_driver_rss(driver: SeleniumDriver) -> int:
+    """Get the resident memory in bytes of a driver and all its browser processes."""
+
+    pid = getattr(driver, "browser_pid", None)  # undetected_chromedriver
+    if pid is None:
+        service = getattr(driver, "service", None)
+        process = getattr(service, "process", None)
+        pid = getattr(process, "pid", None)
+    if pid is None:
+        return 0
+
+    try:
+        root = psutil.Process(pid)
+        processes = [root] + root.children(recursive=True)
+    except psutil.Error:
+        return 0
+
+    rss = 0
+    for process in processes:
+        try:
+            rss += process.memory_info().rss
+        except psutil.Error:
+            continue
+    return rss
+
+
+class DriverManager:
+    """
+    A pool of Selenium drivers with prewarming, recycling and crash recovery.
+
+    Drivers are handed out by `acquire()` and given back by `release()`. Each
+    driver counts the pages it served, and is transparently replaced by a fresh
+    one once it served `max_pages` pages or its browser processes use more than
+    `max_rss_mb` of resident memory. A crashed driver is replaced by `restart()`.
+
+    With the `Scrape` profile, the network activity of each page served is
+    read from the performance log and added up in the stats.
+    """
+
+    def __init__(
+        self,
+        driver_type: BrowserType = DEFAULT_BROWSER_TYPE,
+        max_pages: int = 300,
+        max_rss_mb: int = 1500,
+        warmup_url: str | None = None,
+        profile: DriverProfile = "Default",
+    ) -> None:
+        self.driver_type = driver_type
+        self.profile = profile
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.warmup_url = warmup_url
+        self._idle = []
+        self._live = {}
+        self._lock = threading.Lock()
+        self._counts = {"started": 0, "recycled": 0, "restarted": 0}
+        self._page_stats = {
+            "pages": 0,
+            "requests": 0,
+            "bytes": 0,
+            "blocked_requests": 0,
+        }
+
+    def _start(self) -> SeleniumDriver:
+        """Start a new driver and load the warm-up page, if any."""
+
+        driver = get_driver(self.driver_type, self.profile)
+        if self.warmup_url:
+            driver.get(self.warmup_url)
+            if self.profile == "Scrape":
+                get_page_stats(driver)  # discard the warm-up activity
+        with self._lock:
+            self._live[driver] = DriverStats()
+            self._counts["started"] += 1
+        return driver
+
+    def _stop(self, driver: SeleniumDriver) -> None:
+        """Quit a driver, ignoring the errors of an already dead session."""
+
+        with self._lock:
+            self._live.pop(driver, None)
+        try:
+            driver.quit()
+        except (WebDriverException, OSError):
+            pass
+
+    def adopt(self, driver: SeleniumDriver) -> SeleniumDriver:
+        """Take over a driver started elsewhere."""
+
+        with self._lock:
+            self._live.setdefault(driver, DriverStats())
+        return driver
+
+    def prewarm(self, size: int) -> None:
+        """Start drivers concurrently until `size` of them are idle."""
+
+        with self._lock:
+            missing = size - len(self._idle)
+        if missing <= 0:
+            return
+        with ThreadPoolExecutor(max_workers=missing) as executor:
+            drivers = list(executor.map(lambda _: self._start(), range(missing)))
+        with self._lock:
+            self._idle.extend(drivers)
+        print(f"Prewarmed {missing} SeleniumDriver(s).")
+
+    def acquire(self) -> SeleniumDriver:
+        """Get an idle driver, or start a new one."""
+
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._start()
+
+    def release(self, driver: SeleniumDriver) -> None:
+        """Give a driver back to the pool."""
+
+        with self._lock:
+            if driver in self._live:
+                self._idle.append(driver)
+
+    def rss(self, driver: SeleniumDriver) -> int:
+        """Get the resident memory in bytes used by a driver."""
+
+        return get_driver_rss(driver)
+
+    def served(self, driver: SeleniumDriver) -> SeleniumDriver:
+        """
+        Count a page served by the driver, and return the driver to use next.
+
+        The driver is recycled if it went past the page or memory threshold.
+        """
+
+        if self.profile == "Scrape":
+            self._count_page_stats(driver)
+
+        with self._lock:
+            stats = self._live.setdefault(driver, DriverStats())
+            stats.pages += 1
+            pages = stats.pages
+        rss_mb = self.rss(driver) / 1024**2
+        if pages >= self.max_pages or rss_mb >= self.max_rss_mb:
+            print(
+                f"Recycling SeleniumDriver after {pages} pages ({rss_mb:.0f} MB RSS)."
+            )
+            with self._lock:
+                self._counts["recycled"] += 1
+            self._stop(driver)
+            return self._start()
+        return driver
+
+    def _count_page_stats(self, driver: SeleniumDriver) -> None:
+        """Add up the network activity of the page the driver just served."""
+
+        try:
+            stats = get_page_stats(driver)
+        except WebDriverException:
+            return
+        print(
+            f"Page loaded with {stats['requests']} requests "
+            f"({stats['bytes'] / 1024:.0f} kB), "
+            f"{stats['blocked_requests']} requests blocked."
+        )
+        with self._lock:
+            self._page_stats["pages"] += 1
+            for key, value in stats.items():
+                self._page_stats[key] += value
+
+    def restart(self, driver: SeleniumDriver) -> SeleniumDriver:
+        """Replace a crashed driver by a fresh one."""
+
+        with self._lock:
+            self._counts["restarted"] += 1
+        self._stop(driver)
+        return self._start()
+
+    def stats(self) -> dict:
+        """Return the lifecycle counters and the usage of the live drivers."""
+
+        with self._lock:
+            drivers = list(self._live.items())
+            counts = dict(self._counts)
+            if self.profile == "Scrape":
+                counts["page_stats"] = dict(self._page_stats)
+        counts["live"] = [
+            {"pages": stats.pages, "rss_mb": round(self.rss(driver) / 1024**2, 1)}
+            for driver, stats in drivers
+        ]
+        return counts
+
+    def quit(self) -> None:
+        """Quit all the drivers of the pool."""
+
+        with self._lock:
+            drivers = list(self._live)
+            self._idle.clear()
+        for driver in drivers:
+            self._stop(driver)
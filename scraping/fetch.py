@@ -0,0 +1,315 @@
+"""
+Contain the fetch backends used by ItemScrapers to load pages.
+"""
+
+import asyncio
+import threading
+import time
+from abc import ABC, abstractmethod
+from urllib.parse import urlsplit, urlunsplit
+
+import aiohttp
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
+
+from .common import (
+    DEFAULT_HEADERS,
+    SeleniumDriver,
+    is_antirobot,
+    is_captcha,
+    solve_captcha,
+)
+from .document import HtmlDocument
+from .drivers import DriverManager
+from .metrics import Metrics
+
+
+class PageUnavailable(ConnectionError):
+    """Raised by a fetcher when a page cannot be served."""
+
+
+class BaseFetcher(ABC):
+    """
+    Base class for a fetch backend.
+
+    A fetcher loads a page by its url and returns a HtmlDocument, a static
+    snapshot of the page that the parsing functions query with lxml.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @abstractmethod
+    def fetch(self, url: str) -> HtmlDocument:
+        """Fetch a single page."""
+        raise NotImplementedError
+
+    def fetch_many(self, urls: list[str]) -> list[HtmlDocument]:
+        """Fetch several pages, in the same order as the urls."""
+
+        return [self.fetch(url) for url in urls]
+
+    def close(self) -> None:
+        """Release the resources held by the fetcher."""
+
+
+class SeleniumFetcher(BaseFetcher):
+    """
+    A fetcher that loads pages in a Selenium driver and solves captchas.
+
+    With a DriverManager, the driver is only acquired on the first fetch, so
+    that no browser is started unless a page needs one. It is recycled once it
+    goes past the manager's thresholds, and a crashed driver is restarted
+    before the page is retried.
+    """
+
+    def __init__(
+        self,
+        driver: SeleniumDriver | None = None,
+        manager: DriverManager | None = None,
+        max_retries: int = 1,
+    ) -> None:
+        if driver is None and manager is None:
+            raise ValueError("Either a driver or a DriverManager is required.")
+        self.manager = manager
+        self.max_retries = max_retries
+        if manager is None or driver is None:
+            self.driver = driver
+        else:
+            self.driver = manager.adopt(driver)
+
+    def snapshot(self) -> HtmlDocument:
+        """Take a snapshot of the page loaded in the driver."""
+
+        return HtmlDocument(self.driver.page_source, self.driver.current_url)
+
+    def _load(self, url: str) -> HtmlDocument:
+        """
+        Load the page in the driver and return a snapshot of it.
+
+        The page source is retrieved once, so that parsing does not cost one
+        WebDriver round trip per field.
+        """
+
+        self.driver.get(url)
+        page = self.snapshot()
+        if is_captcha(page):
+            start = time.perf_counter()
+            solve_captcha(self.driver)
+            page = self.snapshot()
+            page.captcha_sec = time.perf_counter() - start
+        return page
+
+    def fetch(self, url: str) -> HtmlDocument:
+        """Load the page, restarting the driver and retrying if it crashed."""
+
+        if self.driver is None:
+            self.driver = self.manager.acquire()
+        attempt = 0
+        while True:
+            try:
+                page = self._load(url)
+                break
+            except NoSuchElementException:
+                raise
+            except WebDriverException as e:
+                if self.manager is None or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                print(f"SeleniumDriver crashed on {url}: {e.msg}. Restarting...")
+                self.driver = self.manager.restart(self.driver)
+
+        if self.manager is not None:
+            self.driver = self.manager.served(self.driver)
+        return page
+
+    def close(self) -> None:
+        """Give the driver back to its manager, if one was acquired."""
+
+        if self.manager is not None and self.driver is not None:
+            self.manager.release(self.driver)
+            self.driver = None
+
+
+class HttpFetcher(BaseFetcher):
+    """
+    A browserless fetcher that downloads raw HTML with a pooled asyncio client.
+
+    Connections are kept alive and shared by all requests, and the number of
+    requests in flight is bounded by `max_concurrency`. The event loop runs in
+    a background thread, so the fetcher can be used from synchronous code and
+    shared between threads.
+
+    When a captcha or the anti-robot page is served and a `fallback` fetcher is
+    given, the page is loaded again through the fallback (e.g. a SeleniumFetcher).
+    The fallback drives a single browser, so its fetches are serialized: a
+    thread whose page falls back waits for the fallbacks of the other threads,
+    and for the captcha to be solved.
+    `fallbacks` counts the pages handed over to the fallback, and each page it
+    returns tells what was served instead in its `fallback_reason`.
+    `base_url` rewrites the origin of every url, e.g. to a local fixture server.
+    """
+
+    def __init__(
+        self,
+        fallback: BaseFetcher | None = None,
+        max_concurrency: int = 8,
+        timeout: float = 30.0,
+        base_url: str | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> None:
+        self.fallback = fallback
+        self._fallback_lock = threading.Lock()
+        self.fallbacks = 0
+        self._max_concurrency = max_concurrency
+        self._timeout = timeout
+        self._base_url = base_url
+        self._headers = headers or DEFAULT_HEADERS
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self._session = None
+        self._semaphore = None
+        self._submit(self._open())
+
+    def _submit(self, coro):
+        """Run a coroutine on the background loop and wait for its result."""
+
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _open(self) -> None:
+        connector = aiohttp.TCPConnector(
+            limit=self._max_concurrency, keepalive_timeout=60
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            headers=self._headers,
+            timeout=aiohttp.ClientTimeout(total=self._timeout),
+        )
+        self._semaphore = asyncio.Semaphore(self._max_concurrency)
+
+    def _rewrite(self, url: str) -> str:
+        """Rewrite the origin of the url to the base url, if any."""
+
+        if self._base_url is None:
+            return url
+        base = urlsplit(self._base_url)
+        parts = urlsplit(url)
+        return urlunsplit((base.scheme, base.netloc, parts.path, parts.query, ""))
+
+    async def _get(self, url: str) -> HtmlDocument | None:
+        async with self._semaphore:
+            try:
+                async with self._session.get(self._rewrite(url)) as response:
+                    page_source = await response.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"Failed to fetch {url}: {e!r}")
+                return None
+        return HtmlDocument(page_source, url)
+
+    async def _gather(self, urls: list[str]) -> list[HtmlDocument | None]:
+        return await asyncio.gather(*(self._get(url) for url in urls))
+
+    def _checked(self, url: str, page: HtmlDocument | None) -> HtmlDocument:
+        """Hand the url over to the fallback if the page is missing or blocked."""
+
+        if page is None:
+            reason = "unavailable"
+        elif is_antirobot(page):
+            reason = "antirobot"
+        elif is_captcha(page):
+            reason = "captcha"
+        else:
+            return page
+        if self.fallback is not None:
+            print(f"Falling back to {type(self.fallback).__name__} for {url}")
+            with self._fallback_lock:
+                self.fallbacks += 1
+                page = self.fallback.fetch(url)
+            page.fallback_reason = reason
+            return page
+        if page is None:
+            raise PageUnavailable(f"Failed to fetch {url}")
+        return page
+
+    def fetch(self, url: str) -> HtmlDocument:
+        """Fetch a single page."""
+
+        return self.fetch_many([url])[0]
+
+    def fetch_many(self, urls: list[str]) -> list[HtmlDocument]:
+        """Fetch several pages concurrently, in the same order as the urls."""
+
+        pages = self._submit(self._gather(urls))
+        return [self._checked(url, page) for url, page in zip(urls, pages)]
+
+    def close(self) -> None:
+        """Close the client session, the fallback, and stop the event loop."""
+
+        if self._loop.is_closed():
+            return
+        if self.fallback is not None:
+            self.fallback.close()
+        self._submit(self._session.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+class MeteredFetcher(BaseFetcher):
+    """
+    A fetcher that records the navigation time and the pages of another fetcher.
+
+    Each page of a batch fetched concurrently is counted with its share of the
+    time the whole batch took. Anti-robot pages, captchas, unavailable pages,
+    pages handed over to a fallback fetcher and the bytes downloaded are
+    counted, and the time spent solving the captchas of the pages is recorded.
+    """
+
+    def __init__(self, fetcher: BaseFetcher, metrics: Metrics) -> None:
+        self.fetcher = fetcher
+        self.metrics = metrics
+
+    @property
+    def fallbacks(self) -> int:
+        """Return the number of pages handed over to a fallback by the wrapped fetcher."""
+
+        return getattr(self.fetcher, "fallbacks", 0)
+
+    def fetch(self, url: str) -> HtmlDocument:
+        """Fetch a page, and record it."""
+
+        return self.fetch_many([url])[0]
+
+    def fetch_many(self, urls: list[str]) -> list[HtmlDocument]:
+        """Fetch several pages, and record them."""
+
+        fallbacks = self.fallbacks
+        start = time.perf_counter()
+        try:
+            pages = self.fetcher.fetch_many(urls)
+        except PageUnavailable:
+            self.metrics.inc("unavailable")
+            raise
+        finally:
+            if self.fallbacks > fallbacks:
+                self.metrics.inc("fallbacks", self.fallbacks - fallbacks)
+        elapsed = time.perf_counter() - start
+        for page in pages:
+            self.metrics.observe("navigation", elapsed / len(pages))
+            if page.captcha_sec is not None:
+                self.metrics.observe("captcha", page.captcha_sec)
+            self.metrics.inc("pages")
+            self.metrics.inc("bytes_fetched", len((page.page_source or "").encode()))
+            if is_antirobot(page):
+                self.metrics.inc("blocks")
+            elif is_captcha(page):
+                self.metrics.inc("captchas")
+        return pages
+
+    def close(self) -> None:
+        """Close the wrapped fetcher."""
+
+        self.fetcher.close()
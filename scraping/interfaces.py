@@ -3,7 +3,7 @@ Contain interfaces for data validation in the pipeline.
 """
 
 from datetime import datetime
-from typing import Literal, Optional
+from typing import Literal, Optional, TypedDict
 
 from matplotlib.image import thumbnail
 from pydantic import (
@@ -50,22 +50,23 @@ class BaseItem(BaseModel):
         return val
 
 
-class ReviewItem(BaseModel):
-    """A review on Amazon."""
+class ReviewItem(TypedDict):
+    """A review on Amazon, validated as a plain dict to keep batches light."""
 
     body: str | None
     rating: int | None
     title: str | None
-    location: str | None
-    date: str | None
+    country: str | None
+    date: datetime | None
+    fingerprint: str
 
 
 class ProductItem(BaseModel):
     """A complete product document, extended by SpiderWorkers."""
 
     asin: Optional[str] = None  # Will be added later
-    title: str | None
-    thumbnail: HttpUrl | None
+    title: str | None = None  # from the search page
+    thumbnail: HttpUrl | None = None  # from the search page
     price: float | None
     brand: str | None
     avg_rating: float | None
@@ -74,6 +75,8 @@ class ProductItem(BaseModel):
     unities: float | None
     review_url: HttpUrl | None
     category: str | None
+    is_target: bool | None = None  # from the breadcrumbs of the product page
+    family_id: str | None = None
     metadata: Optional[ItemMetadata] = Field(None, serialization_alias="_metadata")
 
     @field_serializer("review_url")
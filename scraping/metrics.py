@@ -0,0 +1,198 @@
+"""
+Contain the timing histograms and counters of a scraping session.
+"""
+
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# upper bounds of the buckets, in seconds
+DEFAULT_BOUNDS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+
+class Histogram:
+    """
+    A histogram of durations, with fixed buckets.
+
+    The buckets are not cumulative, the last one counting the durations
+    above the last bound. Histograms with the same bounds can be subtracted,
+    to get the durations observed since an earlier copy.
+    """
+
+    def __init__(self, bounds: tuple[float, ...] = DEFAULT_BOUNDS) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Add a duration, in seconds."""
+
+        index = 0
+        while index < len(self.bounds) and value > self.bounds[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def copy(self) -> "Histogram":
+        """Return a copy of the histogram."""
+
+        histogram = Histogram(self.bounds)
+        histogram.counts = list(self.counts)
+        histogram.count = self.count
+        histogram.sum = self.sum
+        return histogram
+
+    def __sub__(self, other: "Histogram") -> "Histogram":
+        histogram = Histogram(self.bounds)
+        histogram.counts = [a - b for a, b in zip(self.counts, other.counts)]
+        histogram.count = self.count - other.count
+        histogram.sum = self.sum - other.sum
+        return histogram
+
+    def __iadd__(self, other: "Histogram") -> "Histogram":
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        return self
+
+    def quantile(self, q: float) -> float | None:
+        """Estimate a quantile, interpolating within its bucket."""
+
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if index == len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[index - 1] if index else 0.0
+                return lower + (self.bounds[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.bounds[-1]
+
+    def stats(self) -> dict:
+        """Return the count, total, mean and quantiles, and the bucket counts."""
+
+        def rounded(value):
+            return None if value is None else round(value, 4)
+
+        return {
+            "count": self.count,
+            "sum_sec": round(self.sum, 3),
+            "mean_sec": rounded(self.sum / self.count if self.count else None),
+            "p50_sec": rounded(self.quantile(0.5)),
+            "p90_sec": rounded(self.quantile(0.9)),
+            "p99_sec": rounded(self.quantile(0.99)),
+            "buckets": list(self.counts),
+        }
+
+
+class Metrics:
+    """
+    The timings and counters of a scraping session, shared by its threads.
+
+    Timings are histograms by name, e.g. `navigation`, `parse`, `validation`
+    or `db_write`, and counters are totals by name, e.g. `blocks` or
+    `bytes_fetched`.
+    """
+
+    def __init__(self, bounds: tuple[float, ...] = DEFAULT_BOUNDS) -> None:
+        self.bounds = bounds
+        self._timings = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float) -> None:
+        """Add a duration to a timing."""
+
+        with self._lock:
+            if name not in self._timings:
+                self._timings[name] = Histogram(self.bounds)
+            self._timings[name].observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        """Time the block of a `with` statement."""
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def inc(self, name: str, value: int = 1) -> None:
+        """Increment a counter."""
+
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def stats(self) -> dict:
+        """Return the statistics of each timing, and the counters."""
+
+        with self._lock:
+            timings = {name: h.stats() for name, h in self._timings.items()}
+            counters = dict(self._counters)
+        return {
+            "bounds_sec": list(self.bounds),
+            "timings": timings,
+            "counters": counters,
+        }
+
+    def to_prometheus(self, labels: dict[str, str] | None = None) -> str:
+        """Return the timings and counters in the Prometheus text format."""
+
+        base = "".join(
+            f'{key}="{_escape(value)}",' for key, value in (labels or {}).items()
+        )
+        lines = [
+            "# HELP scraping_duration_seconds Time spent per scraping step.",
+            "# TYPE scraping_duration_seconds histogram",
+        ]
+        with self._lock:
+            timings = {name: h.copy() for name, h in self._timings.items()}
+            counters = dict(self._counters)
+        for name, histogram in sorted(timings.items()):
+            step = f'{base}step="{_escape(name)}"'
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float("inf"),), histogram.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(
+                    f'scraping_duration_seconds_bucket{{{step},le="{le}"}} {cumulative}'
+                )
+            lines.append(f"scraping_duration_seconds_sum{{{step}}} {histogram.sum}")
+            lines.append(f"scraping_duration_seconds_count{{{step}}} {histogram.count}")
+        lines += [
+            "# HELP scraping_events_total Events counted while scraping.",
+            "# TYPE scraping_events_total counter",
+        ]
+        for name, value in sorted(counters.items()):
+            event = f'{base}event="{_escape(name)}"'
+            lines.append(f"scraping_events_total{{{event}}} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    """Escape a label value for the Prometheus text format."""
+
+    return re.sub(r'(["\\])', r"\\\1", str(value)).replace("\n", r"\n")
@@ -0,0 +1,166 @@
+"""
+Contain an orchestrator running the search, product and review spiders at once.
+"""
+
+import queue
+import threading
+from contextlib import ExitStack
+from typing import Callable
+
+from .archive import PageArchive
+from .drivers import DriverManager
+from .fetch import BaseFetcher
+from .product_page.spider import ProductPageSpiderWorker
+from .relevance import RelevanceClassifier
+from .review_page.spider import ReviewPageSpiderWorker
+from .search_page.spider import SearchPageSpiderWorker
+from .throttle import Throttle
+
+_CLOSED = object()
+
+
+class StreamQueue:
+    """
+    A queue handing elements over between spiders, iterated until closed.
+
+    It holds up to `maxsize` elements, so that `put` blocks while the
+    downstream spider is behind, instead of piling up a backlog. Once
+    cancelled, e.g. because the downstream spider failed, elements are dropped.
+    """
+
+    def __init__(self, maxsize: int = 64, poll_sec: float = 0.5) -> None:
+        self._queue = queue.Queue(maxsize)
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self.poll_sec = poll_sec
+        self.count = 0
+
+    def _put(self, elem) -> None:
+        while not self._cancelled.is_set():
+            try:
+                self._queue.put(elem, timeout=self.poll_sec)
+                return
+            except queue.Full:
+                continue
+
+    def put(self, elem) -> None:
+        """Hand an element over, waiting while the queue is full."""
+
+        with self._lock:
+            self.count += 1
+        self._put(elem)
+
+    def close(self) -> None:
+        """Tell the consumer that no more element will come."""
+
+        self._put(_CLOSED)
+
+    def cancel(self) -> None:
+        """Stop waiting for the consumer, and drop the elements put from now on."""
+
+        self._cancelled.set()
+
+    def __iter__(self):
+        while True:
+            elem = self._queue.get()
+            if elem is _CLOSED:
+                return
+            yield elem
+
+
+class Orchestrator:
+    """
+    Run the search, product and review spiders at once, as a continuous flow.
+
+    A new ASIN found by the search spider is queued for its product page as
+    soon as it is persisted, and the review url found on a product page is
+    queued for its reviews, so a new product is fully ingested without
+    waiting for the other products of the previous pass.
+    Each spider gets its own fetcher from `get_fetcher`, and they share the
+    DriverManager, the archive and the Throttle. With a RelevanceClassifier,
+    only the new ASINs with an on-topic title are handed over.
+    """
+
+    def __init__(
+        self,
+        get_fetcher: Callable[[], BaseFetcher],
+        num_workers: int = 1,
+        drivers: DriverManager | None = None,
+        archive: PageArchive | None = None,
+        throttle: Throttle | None = None,
+        keywords: list[str] | None = None,
+        relevance: RelevanceClassifier | None = None,
+    ) -> None:
+        self.get_fetcher = get_fetcher
+        self.num_workers = num_workers
+        self.drivers = drivers or DriverManager()
+        self.archive = archive
+        self.throttle = throttle or Throttle()
+        self.keywords = keywords
+        self.relevance = relevance
+
+    def _options(self) -> dict:
+        return {
+            "driver": None,
+            "fetcher": self.get_fetcher(),
+            "num_workers": self.num_workers,
+            "drivers": self.drivers,
+            "archive": self.archive,
+            "throttle": self.throttle,
+        }
+
+    def run(self) -> None:
+        """Run the three spiders until the search spider and its hand-offs are done."""
+
+        products = StreamQueue()
+        reviews = StreamQueue()
+        errors = []
+
+        with ExitStack() as stack:
+            search = stack.enter_context(
+                SearchPageSpiderWorker(
+                    queue=self.keywords, relevance=self.relevance, **self._options()
+                )
+            )
+            product = stack.enter_context(ProductPageSpiderWorker(**self._options()))
+            review = stack.enter_context(ReviewPageSpiderWorker(**self._options()))
+            search.downstream = products
+            product.downstream = reviews
+
+            def run(
+                target: Callable[[], None],
+                downstream: StreamQueue | None,
+                upstream: StreamQueue | None = None,
+            ):
+                try:
+                    target()
+                except BaseException as e:
+                    errors.append(e)
+                    if upstream is not None:
+                        upstream.cancel()
+                finally:
+                    if downstream is not None:
+                        downstream.close()
+
+            threads = [
+                threading.Thread(target=run, args=(search.run, products)),
+                threading.Thread(
+                    target=run,
+                    args=(lambda: product.stream(products), reviews, products),
+                ),
+                threading.Thread(
+                    target=run, args=(lambda: review.stream(reviews), None, reviews)
+                ),
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            print(
+                f"Handed over {products.count} products and {reviews.count} "
+                "review pages."
+            )
+
+        if errors:
+            raise errors[0]
@@ -10,7 +10,7 @@ DEFAULT_PRODUCT_PAGE_PIPELINE = [
             ]
         }
     },
-    {"$project": {"asin": 1, "_id": 0}},
+    {"$project": {"asin": 1, "_id": 0, "title": 1}},
 ]
 
 DEFAULT_REVIEW_PAGE_PIPELINE = [
@@ -21,5 +21,67 @@ DEFAULT_REVIEW_PAGE_PIPELINE = [
             ]
         }
     },
-    {"$project": {"asin": 1, "_id": 0, "review_url": 1}},
+    {"$project": {"asin": 1, "_id": 0, "review_url": 1, "family_id": 1}},
+]
+
+REPLAY_PRODUCT_PAGE_PIPELINE = [
+    {"$match": {"_metadata.scrap_status": {"$in": ["ProductPage", "ReviewPage"]}}},
+    {"$project": {"asin": 1, "_id": 0}},
+]
+
+REPLAY_REVIEW_PAGE_PIPELINE = [
+    {"$match": {"review_url": {"$ne": None}}},
+    {"$project": {"asin": 1, "_id": 0, "review_url": 1, "family_id": 1}},
+]
+
+# projected for the RefreshScheduler only, and not to be written back
+SCHEDULING_FIELDS = ("price_history", "last_scraped_at")
+
+INCREMENTAL_REVIEW_PAGE_PIPELINE = [
+    {"$match": {"_metadata.scrap_status": {"$in": ["ProductPage", "ReviewPage"]}}},
+    {
+        "$project": {
+            "asin": 1,
+            "_id": 0,
+            "review_url": 1,
+            "family_id": 1,
+            "num_reviews": 1,
+            "price_history": 1,
+            "last_scraped_at": "$_scraped_at.ReviewPage",
+            "reviews.title": 1,
+            "reviews.body": 1,
+            "reviews.date": 1,
+            "reviews.rating": 1,
+            "reviews.fingerprint": 1,
+        }
+    },
+]
+
+SCHEDULED_PRODUCT_PAGE_PIPELINE = [
+    {"$match": {"_metadata.scrap_status": {"$exists": True}}},
+    {
+        "$project": {
+            "asin": 1,
+            "_id": 0,
+            "title": 1,
+            "num_reviews": 1,
+            "price_history": 1,
+            "last_scraped_at": "$_scraped_at.ProductPage",
+        }
+    },
+]
+
+SCHEDULED_REVIEW_PAGE_PIPELINE = [
+    {"$match": {"review_url": {"$ne": None}}},
+    {
+        "$project": {
+            "asin": 1,
+            "_id": 0,
+            "review_url": 1,
+            "family_id": 1,
+            "num_reviews": 1,
+            "price_history": 1,
+            "last_scraped_at": "$_scraped_at.ReviewPage",
+        }
+    },
 ]
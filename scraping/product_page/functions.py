@@ -2,12 +2,14 @@
 Contains functions to parse the product page.
 """
 
+import re
 from types import SimpleNamespace
 from urllib.parse import urljoin
 
 from selenium.webdriver.common.by import By
 
 from scraping.common import SeleniumDriver
+from scraping.document import HtmlDocument
 
 PATTERNS = SimpleNamespace(
     price_1="//span[contains(@class, 'apexPriceToPay')]//span[@class='a-offscreen']",
@@ -21,34 +23,45 @@ PATTERNS = SimpleNamespace(
     rating_id="acrPopover",
     num_reviews_id="acrCustomerReviewText",
     category_id="wayfinding-breadcrumbs_feature_div",
+    parent_asin=r'"parentAsin"\s*:\s*"(B0\w{8})"',
+    review_asin=r"/product-reviews/(B0\w{8})",
 )
 
 
-def is_target(driver: SeleniumDriver) -> bool:
+def get_breadcrumbs(driver: SeleniumDriver) -> list[str]:
+    """Get the categories listed in the breadcrumbs, from top to bottom."""
+
+    breadcrumbs = driver.find_elements(By.ID, PATTERNS.category_id)
+    if breadcrumbs:
+        elems = breadcrumbs[0].find_elements(By.XPATH, ".//li//a")
+        return [elem.text for elem in elems]
+
+    return []
+
+
+def is_target(driver: SeleniumDriver, breadcrumbs: list[str] | None = None) -> bool:
     """Check if the product page is a target page according to the breadcrumbs."""
 
     TARGET_TOP_CATEGORY = "Hygiène et Santé"
-    breadcrumbs = driver.find_elements(By.ID, PATTERNS.category_id)
+    if breadcrumbs is None:
+        breadcrumbs = get_breadcrumbs(driver)
     if breadcrumbs:
-        breadcrumbs = breadcrumbs[0]
-        elems = breadcrumbs.find_elements(By.XPATH, ".//li//a")
-        elems = [elem.text for elem in elems]
-        top_category = elems[0]
+        top_category = breadcrumbs[0]
         if top_category == TARGET_TOP_CATEGORY:
             return True
 
     return False
 
 
-def get_category(driver: SeleniumDriver) -> str | None:
+def get_category(
+    driver: SeleniumDriver, breadcrumbs: list[str] | None = None
+) -> str | None:
     """Get the lowest-level category from the breadcrumbs."""
 
-    breadcrumbs = driver.find_elements(By.ID, PATTERNS.category_id)
+    if breadcrumbs is None:
+        breadcrumbs = get_breadcrumbs(driver)
     if breadcrumbs:
-        breadcrumbs = breadcrumbs[0]
-        elems = breadcrumbs.find_elements(By.XPATH, ".//li//a")
-        elems = [elem.text for elem in elems]
-        sub_category = elems[-1]
+        sub_category = breadcrumbs[-1]
         return sub_category
 
     return None
@@ -190,3 +203,38 @@ def get_review_url(driver: SeleniumDriver) -> str | None:
         return review_url
 
     return None
+
+
+def get_family_id(driver: SeleniumDriver, review_url: str | None = None) -> str | None:
+    """
+    Get the id of the variant family of the product, i.e. its parent ASIN.
+
+    Size and pack variants share the parent ASIN, and the same review pool.
+    Without a parent ASIN, the ASIN of the review url is used.
+    """
+
+    match = re.search(PATTERNS.parent_asin, driver.page_source)
+    if match is None and review_url:
+        match = re.search(PATTERNS.review_asin, review_url)
+    if match:
+        return match.group(1)
+    return None
+
+
+def parse_product_page(page: HtmlDocument) -> dict:
+    """Parse all the fields of a product page snapshot in a single pass."""
+
+    breadcrumbs = get_breadcrumbs(page)
+    review_url = get_review_url(page)
+    return {
+        "is_target": is_target(page, breadcrumbs),
+        "price": get_price(page),
+        "brand": get_brand(page),
+        "avg_rating": get_avg_rating(page),
+        "num_reviews": get_num_reviews(page),
+        "feature_bullets": get_feature_bullets(page),
+        "unities": get_unities(page),
+        "review_url": review_url,
+        "category": get_category(page, breadcrumbs),
+        "family_id": get_family_id(page, review_url),
+    }
@@ -3,27 +3,28 @@ Define the ProductItemScraper and ProductPageSpiderWorker class.
 """
 
 from mongodb.interfaces import SessionLogInfo
+from scraping.archive import PageArchive
 from scraping.base import BaseItemScraper, BaseSpiderWorker
+from scraping.batches import PRODUCT_ITEMS, dump_batch, validate_batch
 from scraping.common import (
+    DEFAULT_BROWSER_TYPE,
+    BrowserType,
     SeleniumDriver,
     is_antirobot,
-    is_captcha,
-    solve_captcha,
 )
+from scraping.drivers import DriverManager
+from scraping.fetch import BaseFetcher
 from scraping.interfaces import ItemMetadata, ProductItem
-from scraping.pipelines import DEFAULT_PRODUCT_PAGE_PIPELINE
-
-from .functions import (
-    get_avg_rating,
-    get_brand,
-    get_category,
-    get_feature_bullets,
-    get_num_reviews,
-    get_price,
-    get_review_url,
-    get_unities,
-    is_target,
+from scraping.metrics import Metrics
+from scraping.pipelines import (
+    DEFAULT_PRODUCT_PAGE_PIPELINE,
+    SCHEDULED_PRODUCT_PAGE_PIPELINE,
 )
+from scraping.relevance import RelevanceClassifier
+from scraping.scheduler import RefreshScheduler
+from scraping.throttle import Throttle
+
+from .functions import parse_product_page
 
 
 class ProductItemScraper(BaseItemScraper):
@@ -35,8 +36,10 @@ class ProductItemScraper(BaseItemScraper):
         self,
         driver: SeleniumDriver,
         starting_url: str,
+        fetcher: BaseFetcher | None = None,
+        metrics: Metrics | None = None,
     ) -> None:
-        super().__init__(driver, starting_url)
+        super().__init__(driver, starting_url, fetcher, metrics)
         self._url = starting_url
         self._is_antirobot = False
         self._to_filter = False
@@ -45,28 +48,16 @@ class ProductItemScraper(BaseItemScraper):
     def parse(self, url: str) -> dict:
         """Parse a product page by its url, return data."""
 
-        self.driver.get(url)
+        page = self.load(url)
 
-        if is_antirobot(self.driver):
+        if is_antirobot(page):
             self._is_antirobot = True
 
-        if is_captcha(self.driver):
-            solve_captcha(self.driver)
-
-        if not is_target(self.driver):
+        with self.metrics.timer("parse"):
+            item = parse_product_page(page)
+        if not item["is_target"]:
             self._to_filter = True
 
-        item = {
-            "price": get_price(self.driver),
-            "brand": get_brand(self.driver),
-            "avg_rating": get_avg_rating(self.driver),
-            "num_reviews": get_num_reviews(self.driver),
-            "feature_bullets": get_feature_bullets(self.driver),
-            "unities": get_unities(self.driver),
-            "review_url": get_review_url(self.driver),
-            "category": get_category(self.driver),
-        }
-
         return item
 
     def run(self) -> None:
@@ -90,25 +81,61 @@ class ProductItemScraper(BaseItemScraper):
 class ProductPageSpiderWorker(BaseSpiderWorker):
     """
     A spider worker for scraping the product page for a list of ASINs.
+
+    With a RefreshScheduler, all scraped products are candidates, and the
+    queue holds the stalest and most valuable ones that fit in its budget.
+
+    Products are validated and written in batches of `persist_batch_size`,
+    unless they are handed over to the review spider or to a work queue.
     """
 
     default_pipeline = DEFAULT_PRODUCT_PAGE_PIPELINE
+    persist_batch_size = 20
 
     def __init__(
         self,
-        driver: SeleniumDriver,
+        driver: SeleniumDriver | None,
         action_type: str = "Product Page Scraping",
         pipeline: list[dict] | None = None,
+        fetcher: BaseFetcher | None = None,
+        num_workers: int = 1,
+        driver_type: BrowserType = DEFAULT_BROWSER_TYPE,
+        drivers: DriverManager | None = None,
+        archive: PageArchive | None = None,
+        throttle: Throttle | None = None,
+        relevance: RelevanceClassifier | None = None,
+        scheduler: RefreshScheduler | None = None,
+        db_name: str | None = None,
     ) -> None:
-        super().__init__(driver, action_type)
+        super().__init__(
+            driver,
+            action_type,
+            fetcher,
+            num_workers,
+            driver_type=driver_type,
+            drivers=drivers,
+            archive=archive,
+            throttle=throttle,
+            relevance=relevance,
+            db_name=db_name,
+        )
+        if pipeline is None and scheduler is not None:
+            pipeline = SCHEDULED_PRODUCT_PAGE_PIPELINE
         self._pipeline = pipeline or self.default_pipeline
+        self.scheduler = scheduler
         self._queue = None
 
     def query(self) -> None:
         """Query the database for a list of ASINs to update."""
 
         asins = self.db.collection.aggregate(self._pipeline)
-        self._queue = [asin["asin"] for asin in asins]
+        if self.scheduler is not None:
+            asins = self.scheduler.schedule(list(asins))
+        self._queue = [
+            asin["asin"]
+            for asin in asins
+            if self.is_relevant(asin["asin"], asin.get("title"))
+        ]
 
     def run(self) -> None:
         """Run the scraper that can iterate over a list of ASINs."""
@@ -118,33 +145,61 @@ class ProductPageSpiderWorker(BaseSpiderWorker):
             print("Use default pipeline to query the database.")
         print(f"Found {len(self._queue)} items to update.")
 
-        for asin in self._queue:
-            # random_sleep(message=False)
-            url = f"https://www.amazon.fr/dp/{asin}"
-            scraper = ProductItemScraper(self.driver, url)
-            scraper.run()
-            if not scraper.validate():
-                print("Anti-robot detected, aborting...")
-                break
-            item = scraper.dump()
-            item = ProductItem(**item)
-            # add metadata
-            item.asin = asin
-            metadata = ItemMetadata(
-                last_session_id=self.session_id,
-                last_session_time=self._init_time,
-                scrap_status="ProductPage",
-            )
-            item.metadata = metadata
-
-            # update the database
-            self._data.append(item)
-            self.db.update_product(item.model_dump(by_alias=True))
-
-            print(f"Updated {asin} -- Progress {len(self._data)}/{len(self._queue)}")
+        self.run_queue(self._queue)
 
         print(f"Updated {len(self._data)} items in total.")
 
+    def scrape(self, fetcher: BaseFetcher, asin: str) -> dict | None:
+        """Scrape the product page of an ASIN."""
+
+        url = f"https://www.amazon.fr/dp/{asin}"
+        scraper = ProductItemScraper(self.driver, url, fetcher, self.metrics)
+        scraper.run()
+        if not scraper.validate():
+            return None
+        item = scraper.dump()
+        item["asin"] = asin
+        return item
+
+    def build(self, item: dict) -> dict:
+        """Add the metadata to the product data."""
+
+        item["metadata"] = ItemMetadata(
+            last_session_id=self.session_id,
+            last_session_time=self._init_time,
+            scrap_status="ProductPage",
+        )
+        return item
+
+    def persist_many(self, items: list[dict]) -> list[ProductItem | None]:
+        """Validate a batch of products, and update them in the database at once."""
+
+        with self.metrics.timer("validation"):
+            products, invalid = validate_batch(PRODUCT_ITEMS, items)
+        histories = [
+            {"price_history": {"price": product.price, "time": self._init_time}}
+            for product in products
+        ]
+        self.save_products(dump_batch(PRODUCT_ITEMS, products), histories)
+        for product in products:
+            self.record(product.asin)
+
+        persisted = iter(products)
+        return [None if i in invalid else next(persisted) for i in range(len(items))]
+
+    def handoff(self, item: ProductItem) -> list[dict]:
+        """Hand the review url of a product over to the review spider."""
+
+        if item.review_url is None:
+            return []
+        return [
+            {
+                "asin": item.asin,
+                "review_url": str(item.review_url),
+                "family_id": item.family_id,
+            }
+        ]
+
     def log(self) -> dict:
         """Log the scraping session."""
 
@@ -0,0 +1,183 @@
+"""
+Contain an in-process sampling profiler, writing flame-graph-ready stacks.
+"""
+
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+DEFAULT_PROFILE_DIR = "data/profiles"
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def frame_name(code) -> str:
+    """Return the name of a frame in a stack: function, file and first line."""
+
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+def folded_stack(frame, thread_name: str) -> str:
+    """Return the stack of a frame, from the thread down, in the folded format."""
+
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame.f_code))
+        frame = frame.f_back
+    names.append(thread_name)
+    return ";".join(reversed(names))
+
+
+def write_folded(path: Path, stacks: Counter) -> None:
+    """Write stacks and their weights in the folded format, one stack per line."""
+
+    with path.open("w", encoding="utf-8") as f:
+        for stack, weight in stacks.most_common():
+            f.write(f"{stack} {weight}\n")
+
+
+class Profiler:
+    """
+    A sampling profiler of all the threads of the process.
+
+    Every `interval` seconds, a background thread records the Python stack of
+    every other thread; with `snapshot_interval`, it also takes a tracemalloc
+    snapshot of the allocations still alive every `snapshot_interval` seconds.
+    Once stopped, the samples are written to `output_dir` as `cpu.folded`, and
+    each snapshot as `memory-<n>.folded` weighted by bytes, in the folded
+    format read by flamegraph.pl, speedscope or inferno. Threads are the roots
+    of the stacks, so each thread can be told apart in the flame graph.
+
+    As it samples the whole process and tracemalloc is global, only one
+    Profiler runs at a time: it is started once per entry point, and the
+    running one is returned by `get_profiler`. `session_id` is the session the
+    profile is logged under, and the sessions run meanwhile add their ids to
+    `sessions`, so that each side links to the other.
+    """
+
+    def __init__(
+        self,
+        output_dir: str | Path,
+        interval: float = 0.01,
+        snapshot_interval: float | None = 60.0,
+        max_frames: int = 32,
+        max_tracebacks: int = 500,
+        session_id: int | None = None,
+    ) -> None:
+        self.output_dir = Path(output_dir)
+        self.session_id = session_id
+        self.sessions = []
+        self.interval = interval
+        self.snapshot_interval = snapshot_interval
+        self.max_frames = max_frames
+        self.max_tracebacks = max_tracebacks
+        self.samples = 0
+        self.summary = None
+        self._stacks = Counter()
+        self._snapshots = []
+        self._stop = threading.Event()
+        self._thread = None
+        self._tracing = False
+        self._start_time = None
+
+    def start(self) -> "Profiler":
+        """Start sampling in a background thread."""
+
+        global _profiler
+        with _profiler_lock:
+            if _profiler is not None:
+                raise RuntimeError("A Profiler is already running in this process.")
+            _profiler = self
+        if self.snapshot_interval and not tracemalloc.is_tracing():
+            tracemalloc.start(self.max_frames)
+            self._tracing = True
+        self._start_time = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="Profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        next_snapshot = time.perf_counter() + (self.snapshot_interval or 0)
+        while not self._stop.wait(self.interval):
+            self.sample()
+            if self.snapshot_interval and time.perf_counter() >= next_snapshot:
+                self.snapshot()
+                next_snapshot += self.snapshot_interval
+
+    def sample(self) -> None:
+        """Record the current stack of every thread but the profiler's."""
+
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident != own:
+                self._stacks[folded_stack(frame, names.get(ident, str(ident)))] += 1
+        self.samples += 1
+
+    def snapshot(self) -> None:
+        """Record the allocations alive, by the stack that allocated them."""
+
+        if not tracemalloc.is_tracing():
+            return
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        stacks = Counter()
+        for stat in snapshot.statistics("traceback")[: self.max_tracebacks]:
+            frames = [
+                f"{Path(frame.filename).name}:{frame.lineno}"
+                for frame in stat.traceback
+            ]
+            stacks[";".join(reversed(frames))] += stat.size
+        self._snapshots.append(stacks)
+
+    def stop(self) -> dict:
+        """Stop sampling, write the profiles, and return where they are."""
+
+        global _profiler
+        self._stop.set()
+        self._thread.join()
+        with _profiler_lock:
+            if _profiler is self:
+                _profiler = None
+        if self._tracing:
+            self.snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        else:
+            peak = None
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        write_folded(self.output_dir / "cpu.folded", self._stacks)
+        memory = []
+        for index, stacks in enumerate(self._snapshots, 1):
+            write_folded(self.output_dir / f"memory-{index}.folded", stacks)
+            memory.append(f"memory-{index}.folded")
+        self.summary = {
+            "dir": str(self.output_dir),
+            "sessions": list(self.sessions),
+            "cpu": "cpu.folded",
+            "memory": memory,
+            "samples": self.samples,
+            "interval_sec": self.interval,
+            "elapsed_sec": round(time.perf_counter() - self._start_time, 1),
+            "peak_traced_mb": None if peak is None else round(peak / 2**20, 1),
+        }
+        return self.summary
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def get_profiler() -> Profiler | None:
+    """Get the Profiler running in the process, if any."""
+
+    with _profiler_lock:
+        return _profiler
@@ -0,0 +1,85 @@
+"""
+Contain a text classifier deciding from its title if a product is worth a visit.
+"""
+
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+
+CATEGORIZED_PRODUCTS_PATH = "data/products_categorized.csv"
+PRODUCTS_PATH = "data/products.csv"
+
+
+def load_training_data(
+    products: pd.DataFrame | str = PRODUCTS_PATH,
+    categorized_path: str = CATEGORIZED_PRODUCTS_PATH,
+) -> tuple[list[str], list[int]]:
+    """
+    Load the titles of the exported products, labelled 1 if their page was a target.
+
+    The labels are the `is_target` outcome of the breadcrumbs of the product
+    page, so the negatives are the products whose page was visited and failed
+    it. Products whose page was never visited are left out.
+    Products exported before `is_target` was stored are labelled by their
+    `category` instead: 1 if it is one of the categorized products' categories.
+    """
+
+    if isinstance(products, str):
+        products = pd.read_csv(products)
+    if "is_target" in products:
+        visited = products.dropna(subset=["title", "is_target"])
+        labels = [int(is_target) for is_target in visited["is_target"].astype(bool)]
+        return visited["title"].tolist(), labels
+
+    targets = set(pd.read_csv(categorized_path)["category"].dropna())
+    visited = products.dropna(subset=["title", "category"])
+    labels = [int(category in targets) for category in visited["category"]]
+    return visited["title"].tolist(), labels
+
+
+class RelevanceClassifier:
+    """
+    A classifier of search-card titles, trained on the product pages visited.
+
+    Character n-grams of the title feed a logistic regression. A product is
+    skipped only if its probability of being a target is below `threshold`,
+    so that the classifier stays conservative about what it never fetches.
+    """
+
+    def __init__(self, threshold: float = 0.2) -> None:
+        self.threshold = threshold
+        self.model = make_pipeline(
+            TfidfVectorizer(analyzer="char_wb", ngram_range=(2, 4), lowercase=True),
+            LogisticRegression(class_weight="balanced", max_iter=1000),
+        )
+
+    @classmethod
+    def from_csv(
+        cls, products_path: str = PRODUCTS_PATH, threshold: float = 0.2
+    ) -> "RelevanceClassifier":
+        """Train a classifier on the exported products."""
+
+        classifier = cls(threshold)
+        classifier.fit(*load_training_data(products_path))
+        return classifier
+
+    def fit(self, titles: list[str], labels: list[int]) -> "RelevanceClassifier":
+        """Train the classifier on labelled titles."""
+
+        if len(set(labels)) < 2:
+            raise ValueError("Both target and non-target titles are needed.")
+        self.model.fit(titles, labels)
+        return self
+
+    def score(self, title: str) -> float:
+        """Return the probability that a title is a target product."""
+
+        return float(self.model.predict_proba([title])[0][1])
+
+    def is_relevant(self, title: str | None) -> bool:
+        """Whether a product is worth a product-page visit, from its title."""
+
+        if not title:
+            return True  # nothing to decide on
+        return self.score(title) >= self.threshold
@@ -0,0 +1,102 @@
+"""
+Contain a running estimate of the aspect scores of a product from its reviews.
+"""
+
+import math
+import re
+
+# French stems of the aspects of data/keywords_set.json, as reviews are scraped
+# before translation
+ASPECT_KEYWORDS = {
+    "price": ["prix", "cher", "chère", "coût", "économique", "qualité/prix"],
+    "leak": ["fuite", "fuit", "déborde", "débordement", "tache"],
+    "absorb": ["absorb", "absorption"],
+    "comfort": ["confort", "gêne", "gênant", "irrit"],
+    "material": ["matière", "matériau", "coton", "tissu", "plastique"],
+    "package": ["emballage", "paquet", "boîte", "boite", "colis", "sachet"],
+    "size": ["taille", "trop grand", "trop petit", "format"],
+}
+
+
+def wilson_interval(successes: int, n: int, z: float = 1.96) -> tuple[float, float]:
+    """Get the Wilson score interval of a proportion."""
+
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    denominator = 1 + z**2 / n
+    center = (p + z**2 / (2 * n)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+class AspectEstimator:
+    """
+    A running estimate of the share of positive reviews for each aspect.
+
+    A review mentions an aspect if a word of its title or body starts with one
+    of the aspect keywords, so that stems match their inflections but not the
+    words containing them, and is positive if rated 4 stars or more. An aspect has
+    converged once the Wilson interval of its positive share is narrower than
+    `max_width`, or once the interval of its mention rate is entirely below
+    `min_share`, i.e. too few reviews talk about it to matter.
+    """
+
+    def __init__(
+        self,
+        max_width: float = 0.2,
+        min_share: float = 0.02,
+        keywords: dict[str, list[str]] | None = None,
+    ) -> None:
+        self.max_width = max_width
+        self.min_share = min_share
+        self.keywords = keywords or ASPECT_KEYWORDS
+        self._patterns = {
+            aspect: re.compile(r"\b(?:" + "|".join(map(re.escape, words)) + ")")
+            for aspect, words in self.keywords.items()
+        }
+        self.reviews = 0
+        self.mentions = {aspect: 0 for aspect in self.keywords}
+        self.positives = {aspect: 0 for aspect in self.keywords}
+
+    def update(self, reviews: list[dict]) -> None:
+        """Count the aspects mentioned by new reviews."""
+
+        for review in reviews:
+            if review.get("rating") is None:
+                continue
+            self.reviews += 1
+            text = f"{review.get('title') or ''} {review.get('body') or ''}".lower()
+            for aspect, pattern in self._patterns.items():
+                if pattern.search(text):
+                    self.mentions[aspect] += 1
+                    self.positives[aspect] += review["rating"] >= 4
+
+    def is_converged(self, aspect: str) -> bool:
+        """Whether the estimate of an aspect is precise enough."""
+
+        low, high = wilson_interval(self.positives[aspect], self.mentions[aspect])
+        if high - low <= self.max_width:
+            return True
+        _, high = wilson_interval(self.mentions[aspect], self.reviews)
+        return high < self.min_share
+
+    def converged(self) -> bool:
+        """Whether the estimates of all aspects are precise enough."""
+
+        return all(self.is_converged(aspect) for aspect in self.keywords)
+
+    def estimates(self) -> dict[str, dict]:
+        """Return the positive share and its interval for each aspect."""
+
+        estimates = {}
+        for aspect in self.keywords:
+            mentions = self.mentions[aspect]
+            low, high = wilson_interval(self.positives[aspect], mentions)
+            estimates[aspect] = {
+                "mentions": mentions,
+                "positive": self.positives[aspect] / mentions if mentions else None,
+                "low": round(low, 3),
+                "high": round(high, 3),
+            }
+        return estimates
@@ -2,6 +2,7 @@
 Contains functions to parse the review page.
 """
 
+import hashlib
 import re
 from datetime import datetime
 from types import SimpleNamespace
@@ -11,6 +12,7 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webelement import WebElement
 
 from scraping.common import SeleniumDriver
+from scraping.document import HtmlDocument
 
 PATTERNS = SimpleNamespace(
     review_card="//div[@data-hook='review']",
@@ -20,8 +22,11 @@ PATTERNS = SimpleNamespace(
     metadata=".//span[@data-hook='review-date']",
     body=".//span[@data-hook='review-body']",
     next_page="//li[@class='a-last']//a[@href]",
+    review_count="//div[@data-hook='cr-filter-info-review-rating-count']",
 )
 
+REVIEWS_PER_PAGE = 10
+
 
 def get_review_cards(driver: SeleniumDriver) -> list[WebElement]:
     """Get the review cards from the review page."""
@@ -120,3 +125,55 @@ def get_next_page(driver: SeleniumDriver) -> str | None:
             url = urljoin("https://amazon.fr", next_page)
             return url
     return None
+
+
+def get_page_count(driver: SeleniumDriver) -> int | None:
+    """Get the number of review pages from the count of written reviews."""
+
+    review_count = driver.find_elements(By.XPATH, PATTERNS.review_count)
+    if review_count:
+        review_count = review_count[0].get_attribute("textContent")
+        match = re.search(r"(\d[\d\s.]*)\savec avis", review_count or "")
+        if match:
+            num_reviews = int(re.sub(r"\D", "", match.group(1)))
+            return max(1, -(-num_reviews // REVIEWS_PER_PAGE))
+    return None
+
+
+def review_fingerprint(review: dict) -> str:
+    """Get a fingerprint of a review from its title, body, date and rating."""
+
+    date = review.get("date")
+    if isinstance(date, datetime):
+        date = date.date().isoformat()
+    key = "|".join(
+        str(review.get(field) or "") for field in ("title", "body", "rating")
+    )
+    return hashlib.sha1(f"{key}|{date or ''}".encode()).hexdigest()[:16]
+
+
+def parse_review_card(review_card: WebElement) -> dict:
+    """Parse a review card into a review item."""
+
+    item = {}
+    metadata = get_metadata(review_card)
+    item["rating"] = get_rating(review_card)
+    item["title"] = get_title(review_card)
+    item["country"] = None
+    item["date"] = None
+    item["body"] = get_body(review_card)
+    if metadata:
+        item["country"], item["date"] = metadata
+    item["fingerprint"] = review_fingerprint(item)
+    return item
+
+
+def parse_review_page(page: HtmlDocument) -> dict:
+    """Parse all the review cards of a review page snapshot in a single pass."""
+
+    items = [parse_review_card(card) for card in get_review_cards(page)]
+    return {
+        "next_page": get_next_page(page),
+        "num_pages": get_page_count(page),
+        "items": items,
+    }
@@ -2,87 +2,154 @@
 Define the ReviewItemScraper and ReviewPageSpiderWorker class.
 """
 
+from datetime import timedelta
+from functools import partial
+from typing import Callable
+
 from mongodb.interfaces import SessionLogInfo
+from scraping.archive import PageArchive
 from scraping.base import BaseItemScraper, BaseSpiderWorker
+from scraping.batches import REVIEW_ITEMS, validate_batch
 from scraping.common import (
+    DEFAULT_BROWSER_TYPE,
+    BrowserType,
     SeleniumDriver,
     is_antirobot,
-    is_captcha,
-    random_sleep,
-    solve_captcha,
+    set_query_params,
 )
+from scraping.document import HtmlDocument
+from scraping.drivers import DriverManager
+from scraping.fetch import BaseFetcher
 from scraping.interfaces import ItemMetadata
-from scraping.pipelines import DEFAULT_REVIEW_PAGE_PIPELINE
-
-from .functions import (
-    get_body,
-    get_metadata,
-    get_next_page,
-    get_rating,
-    get_review_cards,
-    get_title,
+from scraping.metrics import Metrics
+from scraping.pipelines import (
+    DEFAULT_REVIEW_PAGE_PIPELINE,
+    INCREMENTAL_REVIEW_PAGE_PIPELINE,
+    SCHEDULED_REVIEW_PAGE_PIPELINE,
+    SCHEDULING_FIELDS,
 )
+from scraping.scheduler import RefreshScheduler
+from scraping.throttle import Throttle
+
+from .aspects import AspectEstimator
+from .functions import REVIEWS_PER_PAGE, parse_review_page, review_fingerprint
 
 
 class ReviewItemScraper(BaseItemScraper):
     """
     A scraper for scraping all review pages for an ASIN.
+
+    Given the fingerprints of the reviews already stored, the scraper crawls
+    the reviews newest first, one page at a time, keeps only the new ones,
+    and stops at the first page made up of known reviews only.
+
+    With `max_ci_width`, the scraper updates the aspect estimates page by
+    page, and stops once they all converged; `max_page` stays the ceiling.
+
+    Given a checkpoint of an interrupted crawl, the scraper starts with its
+    reviews and resumes after its last page. `on_page` is called with the
+    number and the new reviews of every page collected, to save checkpoints.
+    With `stream`, the reviews are only handed to `on_page` and not kept, so
+    that memory does not grow with the number of pages.
     """
 
     def __init__(
-        self, driver: SeleniumDriver, starting_url: str, max_page: int = -1
+        self,
+        driver: SeleniumDriver,
+        starting_url: str,
+        max_page: int = -1,
+        fetcher: BaseFetcher | None = None,
+        known: set[str] | None = None,
+        max_ci_width: float | None = None,
+        resume: dict | None = None,
+        on_page: Callable[[int, list[dict]], None] | None = None,
+        stream: bool = False,
+        metrics: Metrics | None = None,
     ) -> None:
-        super().__init__(driver, starting_url)
+        if known is not None:
+            starting_url = set_query_params(starting_url, sortBy="recent")
+        super().__init__(driver, starting_url, fetcher, metrics)
         self._max_page = max_page
         self._is_anti_robot = False
+        self._seen = set()
+        self._known = known
+        self._stop = False
+        self.aspects = None
+        if max_ci_width is not None:
+            self.aspects = AspectEstimator(max_width=max_ci_width)
+        if known is not None or max_ci_width is not None:
+            self.page_batch_size = 1
+        self._on_page = on_page
+        self._stream = stream
+        self._uncommitted = []
+        self._start_page = 1
+        self.count = 0
+        if resume:
+            self._start_page = resume["page"] + 1
+            self._seen.update(item["fingerprint"] for item in resume["items"])
+            self.count = len(resume["items"])
+            if not stream:
+                self._data.extend(resume["items"])
+            if self.aspects is not None:
+                self.aspects.update(resume["items"])
 
     def parse(self, url: str) -> dict[str, list[str]]:
         """Parse a review page by its url, return data and next page url."""
 
-        self.driver.get(url)
+        return self.parse_page(self.load(url))
+
+    def parse_page(self, page: HtmlDocument) -> dict[str, list[str]]:
+        """Parse a review page already loaded, return data and next page url."""
 
-        if is_antirobot(self.driver):
+        if is_antirobot(page):
             self._is_anti_robot = True
             return {"is_antirobot": True}
 
-        if is_captcha(self.driver):
-            solve_captcha(self.driver)
-
-        review_cards = get_review_cards(self.driver)
-        next_page = get_next_page(self.driver)
-        items = []
-        if review_cards:
-            for review_card in review_cards:
-                item = {}
-                metadata = get_metadata(review_card)
-                item["rating"] = get_rating(review_card)
-                item["title"] = get_title(review_card)
-                item["country"] = None
-                item["date"] = None
-                item["body"] = get_body(review_card)
-                if metadata:
-                    item["country"], item["date"] = metadata
-                items.append(item)
-
-        return {"next_page": next_page, "items": items}
+        with self.metrics.timer("parse"):
+            output = parse_review_page(page)
+        with self.metrics.timer("validation"):
+            output["items"], _ = validate_batch(REVIEW_ITEMS, output["items"])
+        return output
+
+    def collect(self, output: dict) -> None:
+        """Collect the reviews of a page, skipping those already collected."""
+
+        items = output.get("items") or []
+        known = self._known or set()
+        if known and items and all(item["fingerprint"] in known for item in items):
+            self._stop = True
+        new_items = []
+        for item in items:
+            key = item["fingerprint"]
+            if key not in self._seen and key not in known:
+                self._seen.add(key)
+                new_items.append(item)
+        self.count += len(new_items)
+        if not self._stream:
+            self._data.extend(new_items)
+        self._uncommitted.extend(new_items)
+        if self.aspects is not None:
+            self.aspects.update(new_items)
+            if self.aspects.converged():
+                print(f"Aspect scores converged after {self.aspects.reviews} reviews.")
+                self._stop = True
+
+    def done(self) -> bool:
+        """Whether a page of known reviews only was met, or the aspects converged."""
+
+        return self._stop
+
+    def checkpoint(self, page: int) -> None:
+        """Hand the reviews collected since the last checkpoint to `on_page`."""
+
+        if self._on_page is not None:
+            self._on_page(page, self._uncommitted)
+        self._uncommitted = []
 
     def run(self) -> None:
         """Run the scraper that scrapes all review pages for an ASIN."""
 
-        url = self._starting_url
-        page_count = 0
-        while url and (self._max_page == -1 or page_count < self._max_page):
-            output = self.parse(url)
-            if output.get("is_antirobot"):
-                self._is_anti_robot = True
-                break
-            items = output.get("items")
-            if items:
-                self._data.extend(items)
-            url = output.get("next_page")
-            page_count += 1
-            print(f"Scraped Page {page_count}")
-            # random_sleep(0.1, 0.9)
+        self.crawl("pageNumber", self._max_page, self._start_page)
 
     def validate(self) -> bool:
         """Validate the operation, if anti-robot is not detected"""
@@ -95,31 +162,123 @@ class ReviewItemScraper(BaseItemScraper):
         return self._data
 
 
+def group_families(elems: list[dict]) -> list[dict]:
+    """
+    Keep one element per variant family, with the ASINs of the other members.
+
+    The kept element is the one whose ASIN is the family id, else the first one.
+    The reviews queried with the other members, if any, are kept with it under
+    `member_reviews`.
+    """
+
+    families = {}
+    for elem in elems:
+        family_id = elem.get("family_id") or elem["asin"]
+        families.setdefault(family_id, []).append(elem)
+
+    grouped = []
+    for family_id, members in families.items():
+        owner = next((m for m in members if m["asin"] == family_id), members[0])
+        owner["members"] = [m["asin"] for m in members if m is not owner]
+        member_reviews = [
+            review
+            for member in members
+            if member is not owner
+            for review in member.get("reviews") or []
+        ]
+        if member_reviews:
+            owner["member_reviews"] = member_reviews
+        grouped.append(owner)
+    return grouped
+
+
 class ReviewPageSpiderWorker(BaseSpiderWorker):
     """
     A spider worker for scraping all review pages for a list of ASINs.
+
+    In incremental mode, only the reviews newer than the stored ones are
+    scraped, and they are added to the stored reviews instead of replacing them.
+    The reviews still stored on the other members of a family, before they are
+    first linked, are known as well, and moved to the reviews of the family.
+
+    The variants of a product share its review pool, so the reviews of a
+    variant family are scraped and stored once, on one member of the family,
+    and the other members are linked to them by `reviews_asin`.
+
+    With a RefreshScheduler, all products with a review url are candidates,
+    and the queue holds the stalest and most valuable ones that fit in its
+    page budget, counting one page per 10 reviews, or a single page in
+    incremental mode.
+
+    In full mode, the reviews of an ASIN are streamed to a checkpoint in the
+    database after every page, and moved to the product once its crawl is
+    over, so that neither the scraper nor the worker keeps them in memory.
+    A crawl interrupted by a crash or an anti-robot page resumes after its
+    last page, if its checkpoint is no older than `checkpoint_max_age`.
     """
 
     default_pipeline = DEFAULT_REVIEW_PAGE_PIPELINE
+    checkpoint_max_age = timedelta(days=1)
 
     def __init__(
         self,
-        driver: SeleniumDriver,
+        driver: SeleniumDriver | None,
         action_type: str = "Review Page Scraping",
         pipeline: list[dict] | None = None,
+        fetcher: BaseFetcher | None = None,
+        num_workers: int = 1,
+        driver_type: BrowserType = DEFAULT_BROWSER_TYPE,
+        drivers: DriverManager | None = None,
+        archive: PageArchive | None = None,
+        throttle: Throttle | None = None,
+        incremental: bool = False,
+        scheduler: RefreshScheduler | None = None,
+        checkpoints: bool = True,
+        db_name: str | None = None,
         **kwargs,
     ) -> None:
-        super().__init__(driver, action_type)
+        super().__init__(
+            driver,
+            action_type,
+            fetcher,
+            num_workers,
+            driver_type=driver_type,
+            drivers=drivers,
+            archive=archive,
+            throttle=throttle,
+            db_name=db_name,
+        )
+        if pipeline is None and incremental:
+            pipeline = INCREMENTAL_REVIEW_PAGE_PIPELINE
+        elif pipeline is None and scheduler is not None:
+            pipeline = SCHEDULED_REVIEW_PAGE_PIPELINE
         self._pipeline = pipeline or self.default_pipeline
+        self.incremental = incremental
+        self.scheduler = scheduler
+        self.checkpoints = checkpoints and not incremental
         self.__kwargs = kwargs
         self._queue = None
+        self._new_reviews = 0
+        self._stored_reviews = 0
+        self._families = {}
+        self._linked = 0
 
     def query(self) -> None:
-        """Query the database for ASINs to update."""
+        """Query the database for ASINs to update, one per variant family."""
 
         asins = list(self.db.collection.aggregate(self._pipeline))
+        asins = group_families(asins)
+        if self.scheduler is not None:
+            asins = self.scheduler.schedule(asins, self.page_cost)
         self._queue = asins
 
+    def page_cost(self, elem: dict) -> int:
+        """Estimate the number of review pages to fetch for an ASIN."""
+
+        if self.incremental:
+            return 1
+        return max(1, -(-(elem.get("num_reviews") or 0) // REVIEWS_PER_PAGE))
+
     def run(self) -> None:
         """Run the scraper that can iterate over a list of ASINs."""
 
@@ -128,36 +287,135 @@ class ReviewPageSpiderWorker(BaseSpiderWorker):
             print("Use default pipeline to query the database.")
         print(f"Found {len(self._queue)} items to update.")
 
-        for elem in self._queue:
-            asin = elem.get("asin")
-            url = elem.get("review_url")
-            scraper = ReviewItemScraper(self.driver, url, **self.__kwargs)
-            print(f"Scraping reviews for Product: {asin}")
-            scraper.run()
-            if not scraper.validate():
-                print("Anti-robot detected, aborting...")
-                break
-            items = scraper.dump()
-            elem["reviews"] = items
-            # add metadata
-            metadata = ItemMetadata(
-                last_session_id=self.session_id,
-                last_session_time=self._init_time,
-                scrap_status="ReviewPage",
-            )
-            elem["_metadata"] = dict(metadata)
-
-            self._data.append(elem)
-            self.db.update_product(elem)
-            print(f"Updated {asin} -- Progress {len(self._data)}/{len(self._queue)}")
+        queue = self._queue
+        self._queue = [self.queue_key(elem) for elem in queue]
+        self.run_queue(queue)
 
         print(f"Updated {len(self._data)} items in total.")
 
+    def scrape(self, fetcher: BaseFetcher, elem: dict) -> dict | None:
+        """Scrape all review pages of an ASIN."""
+
+        asin = elem.get("asin")
+        url = elem.get("review_url")
+        family_id = elem.get("family_id")
+        for field in SCHEDULING_FIELDS:
+            elem.pop(field, None)
+        with self._lock:
+            owner = self._families.setdefault(family_id, asin) if family_id else asin
+        if owner != asin:
+            # the reviews of the family are scraped for another variant
+            return {"asin": asin, "reviews_asin": owner}
+
+        known = None
+        moved = []
+        member_reviews = elem.pop("member_reviews", None) or []
+        if self.incremental:
+            stored = elem.pop("reviews", None) or []
+            known = {r.get("fingerprint") or review_fingerprint(r) for r in stored}
+            for review in member_reviews:
+                fingerprint = review.get("fingerprint") or review_fingerprint(review)
+                if fingerprint not in known:
+                    known.add(fingerprint)
+                    moved.append({**review, "fingerprint": fingerprint})
+        resume = on_page = None
+        if self.checkpoints:
+            fields = ("fingerprint",)
+            if self.__kwargs.get("max_ci_width") is not None:
+                fields += ("title", "body", "rating")  # for the aspect estimates
+            resume = self.db.load_checkpoint(asin, self.checkpoint_max_age, fields)
+            on_page = partial(self.save_checkpoint, asin)
+            if resume is not None:
+                print(f"Resuming reviews of {asin} after page {resume['page']}.")
+            else:
+                self.db.clear_checkpoint(asin)  # a stale one, if any
+        scraper = ReviewItemScraper(
+            self.driver,
+            url,
+            fetcher=fetcher,
+            known=known or None,
+            resume=resume,
+            on_page=on_page,
+            stream=self.checkpoints,
+            metrics=self.metrics,
+            **self.__kwargs,
+        )
+        print(f"Scraping reviews for Product: {asin}")
+        scraper.run()
+        if not scraper.validate():
+            with self._lock:
+                self._families.pop(family_id, None)
+            return None
+        if not self.checkpoints:
+            elem["reviews"] = scraper.dump() + moved
+        elem["review_count"] = scraper.count + len(moved)
+        if scraper.aspects is not None:
+            if self.incremental:
+                # only the new reviews were crawled, the stored ones count too
+                scraper.aspects.update(stored + moved)
+            elem["aspect_estimates"] = scraper.aspects.estimates()
+        return elem
+
+    def build(self, elem: dict) -> dict:
+        """Add the metadata to the reviews of an ASIN."""
+
+        metadata = ItemMetadata(
+            last_session_id=self.session_id,
+            last_session_time=self._init_time,
+            scrap_status="ReviewPage",
+        )
+        elem["_metadata"] = dict(metadata)
+        return elem
+
+    def persist(self, elem: dict) -> None:
+        """Update the reviews of an ASIN in the database, and link its variants."""
+
+        fields = {"_metadata": elem["_metadata"]}
+        members = [elem["asin"]] if "reviews_asin" in elem else elem.pop("members", [])
+        owner = elem.get("reviews_asin", elem["asin"])
+        for member in members:
+            with self.metrics.timer("db_write"):
+                self.db.link_reviews(member, owner, fields)
+        if members:
+            print(f"Linked {len(members)} variants to the reviews of {owner}.")
+            with self._lock:
+                self._linked += len(members)
+        if "reviews_asin" in elem:
+            return
+
+        count = elem.pop("review_count")
+        if self.incremental:
+            reviews = elem.pop("reviews")
+            with self.metrics.timer("db_write"):
+                self.db.add_reviews(elem["asin"], reviews, elem)
+            print(f"Added {count} new reviews.")
+            with self._lock:
+                self._new_reviews += count
+        elif self.checkpoints:
+            fields = {key: value for key, value in elem.items() if key != "asin"}
+            with self.metrics.timer("db_write"):
+                self.db.commit_checkpoint(elem["asin"], fields)
+        else:
+            self.save_product(elem)
+        with self._lock:
+            self._stored_reviews += count
+        self.record(elem["asin"])
+
+    def save_checkpoint(self, asin: str, page: int, items: list[dict]) -> None:
+        """Save the reviews of a page to the checkpoint of an ASIN."""
+
+        with self.metrics.timer("db_write"):
+            self.db.save_checkpoint(asin, page, items)
+
     def log(self) -> dict:
         """Log the session information."""
 
         self._meta["update_count"] = len(self._data)
         self._meta["updated_asins"] = list(self._queue)
+        if self.incremental:
+            self._meta["new_reviews"] = self._new_reviews
+        self._meta["linked_variants"] = self._linked
+        self._meta["stored_reviews"] = self._stored_reviews
         info = SessionLogInfo(**self._meta)
         self.db.log(info)
         return self._meta
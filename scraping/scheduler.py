@@ -0,0 +1,84 @@
+"""
+Contain a scheduler building the queue of a run from staleness and value.
+"""
+
+import heapq
+import math
+import statistics
+from datetime import datetime
+from typing import Callable
+
+
+def price_volatility(price_history: list[dict] | None) -> float:
+    """Get the coefficient of variation of the recorded prices of a product."""
+
+    prices = [entry["price"] for entry in price_history or [] if entry.get("price")]
+    if len(prices) < 2:
+        return 0.0
+    return statistics.pstdev(prices) / statistics.fmean(prices)
+
+
+class RefreshScheduler:
+    """
+    A scheduler spending a page budget on the items that need a refresh most.
+
+    The priority of an item grows with the time since the spider of the run
+    last scraped it (saturating after a few `half_life_days`), its number of
+    reviews, and the volatility of its price. Items are taken by decreasing
+    priority as long as their cost in pages fits in the `budget` of the run.
+
+    The time of the last scrap is read from `last_scraped_at`, which the
+    scheduled pipeline of each spider projects from its own `_scraped_at`.
+    """
+
+    def __init__(
+        self,
+        budget: int = 1000,
+        half_life_days: float = 7.0,
+        volatility_weight: float = 5.0,
+    ) -> None:
+        self.budget = budget
+        self.half_life_days = half_life_days
+        self.volatility_weight = volatility_weight
+
+    def priority(self, doc: dict, now: datetime | None = None) -> float:
+        """Return the refresh priority of a product document."""
+
+        now = now or datetime.now()
+        last_time = doc.get("last_scraped_at")
+        if last_time is None:
+            staleness = 1.0
+        else:
+            age_days = max(0.0, (now - last_time).total_seconds() / 86400)
+            staleness = 1 - 0.5 ** (age_days / self.half_life_days)
+        value = 1 + math.log1p(doc.get("num_reviews") or 0)
+        volatility = price_volatility(doc.get("price_history"))
+        return staleness * value * (1 + self.volatility_weight * volatility)
+
+    def schedule(
+        self,
+        docs: list[dict],
+        cost: Callable[[dict], int] = lambda doc: 1,
+        now: datetime | None = None,
+    ) -> list[dict]:
+        """Return the documents to refresh in this run, by decreasing priority."""
+
+        heap = [
+            (-self.priority(doc, now), index, doc) for index, doc in enumerate(docs)
+        ]
+        heapq.heapify(heap)
+
+        scheduled = []
+        remaining = self.budget
+        while heap and remaining > 0:
+            _, _, doc = heapq.heappop(heap)
+            pages = cost(doc)
+            if pages > remaining:
+                continue
+            remaining -= pages
+            scheduled.append(doc)
+        print(
+            f"Scheduled {len(scheduled)}/{len(docs)} items "
+            f"for {self.budget - remaining}/{self.budget} pages."
+        )
+        return scheduled
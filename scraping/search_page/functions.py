@@ -10,6 +10,7 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webelement import WebElement
 
 from scraping.common import SeleniumDriver
+from scraping.document import HtmlDocument
 
 PATTERNS = SimpleNamespace(
     main_frame="//span[@data-component-type='s-search-results']",
@@ -17,6 +18,7 @@ PATTERNS = SimpleNamespace(
     asin_title=".//h2/a/span",
     image_url=".//img[@class='s-image']",
     pagination_next=".//a[contains(@class, 's-pagination-next')]",
+    pagination_items="//*[contains(@class, 's-pagination-item')]",
 )
 
 
@@ -73,3 +75,28 @@ def get_nextpage(driver: SeleniumDriver) -> str | None:
         return url
     except NoSuchElementException:
         return None
+
+
+def get_page_count(driver: SeleniumDriver) -> int | None:
+    """Get the number of search pages from the pagination strip."""
+
+    items = driver.find_elements(By.XPATH, PATTERNS.pagination_items)
+    numbers = [int(item.text) for item in items if item.text.isdigit()]
+    if numbers:
+        return max(numbers)
+    return None
+
+
+def parse_search_page(page: HtmlDocument) -> dict:
+    """Parse all the ASIN cards of a search page snapshot in a single pass."""
+
+    main_frame = get_mainframe(page)
+    if main_frame is None:
+        return {"next_page": None, "num_pages": None, "cards": []}
+
+    cards = [parse_asin_card(asin_card) for asin_card in get_asin_cards(main_frame)]
+    return {
+        "next_page": get_nextpage(page),
+        "num_pages": get_page_count(page),
+        "cards": cards,
+    }
@@ -4,27 +4,37 @@ Define the SearchItemScraper and SearchPageSpiderWorker class.
 
 from urllib.parse import urlencode
 
-from pydantic import ValidationError
-
 from mongodb.interfaces import SessionLogInfo
+from scraping.archive import PageArchive
+from scraping.asinset import AsinSet
 from scraping.base import BaseItemScraper, BaseSpiderWorker
+from scraping.batches import SEARCH_ITEMS, dump_batch, validate_batch
 from scraping.common import (
+    DEFAULT_BROWSER_TYPE,
     EXCLUDE_KEYWORDS,
     QUERY_KEYWORDS,
+    BrowserType,
     SeleniumDriver,
     is_antirobot,
-    is_captcha,
     is_filtered,
-    solve_captcha,
 )
+from scraping.document import HtmlDocument
+from scraping.drivers import DriverManager
+from scraping.fetch import BaseFetcher
 from scraping.interfaces import BaseItem, ItemMetadata
+from scraping.metrics import Metrics
+from scraping.relevance import RelevanceClassifier
+from scraping.throttle import Throttle
 
-from .functions import get_asin_cards, get_mainframe, get_nextpage, parse_asin_card
+from .functions import parse_search_page
 
 
 class SearchItemScraper(BaseItemScraper):
     """
     A scraper for scraping all search pages for a keyword.
+
+    The ASINs already known, e.g. an AsinSet shared by the scrapers of a
+    run, are skipped; only the new ones are kept in `asins`.
     """
 
     def __init__(
@@ -32,65 +42,61 @@ class SearchItemScraper(BaseItemScraper):
         driver: SeleniumDriver,
         starting_url: str,
         max_page: int = -1,
-        asin_queue: list[str] | None = None,
+        asin_queue: AsinSet | list[str] | None = None,
+        fetcher: BaseFetcher | None = None,
+        metrics: Metrics | None = None,
     ) -> None:
-        super().__init__(driver, starting_url)
-        self._asins = set(asin_queue) if asin_queue else set()
+        super().__init__(driver, starting_url, fetcher, metrics)
+        if not isinstance(asin_queue, AsinSet):
+            asin_queue = AsinSet(asin_queue or ())
+        self._known = asin_queue
+        self._asins = set()
         self._max_page = max_page
         self._is_antirobot = False
 
     def parse(self, url: str) -> dict[str, list[dict]]:
         """Parse a search page by its url, return data and next page url."""
 
-        self.driver.get(url)
+        return self.parse_page(self.load(url))
 
-        if is_antirobot(self.driver):
+    def parse_page(self, page: HtmlDocument) -> dict[str, list[dict]]:
+        """Parse a search page already loaded, return data and next page url."""
+
+        if is_antirobot(page):
             print("Anti-robot check is triggered.")
+            self._is_antirobot = True
             return {"is_antirobot": True}
 
-        if is_captcha(self.driver):
-            solve_captcha(self.driver)
-
-        items = []
-        main_frame = get_mainframe(self.driver)
-        if main_frame == [] or main_frame is None:
-            return {}
-
-        asin_cards = get_asin_cards(main_frame)
-        for asin_card in asin_cards:
-            item = parse_asin_card(asin_card)
-            if item["asin"] != "" and item["asin"] not in self._asins:
-                if item["title"] and is_filtered(item["title"], EXCLUDE_KEYWORDS):
-                    continue
-                try:
-                    item = BaseItem(**item)
-                    self._asins.add(item.asin)
-                    items.append(item)
-                except ValidationError:
+        with self.metrics.timer("parse"):
+            output = parse_search_page(page)
+        cards = {}
+        for card in output["cards"]:
+            asin = card["asin"]
+            if asin != "" and asin not in self._asins and asin not in self._known:
+                if card["title"] and is_filtered(card["title"], EXCLUDE_KEYWORDS):
                     continue
+                cards.setdefault(asin, card)
+        with self.metrics.timer("validation"):
+            items, _ = validate_batch(SEARCH_ITEMS, list(cards.values()))
+        self._asins.update(item.asin for item in items)
+
+        return {
+            "next_page": output["next_page"],
+            "num_pages": output["num_pages"],
+            "items": items,
+        }
 
-        next_page = get_nextpage(self.driver)
+    def collect(self, output: dict) -> None:
+        """Collect the items of a page."""
 
-        return {"next_page": next_page, "items": items}
+        items = output.get("items")
+        if items:
+            self._data.extend(items)
 
     def run(self) -> None:
         """Run the scraper that can iterate over multiple pages."""
 
-        url = self._starting_url
-        page_count = 0
-        while url:
-            if self._max_page != -1 and page_count >= self._max_page:
-                break
-            output = self.parse(url=url)
-            if output.get("is_antirobot"):
-                break
-            items = output.get("items")
-            if items:
-                self._data.extend(items)
-            url = output.get("next_page")
-            # random_sleep(message=False)
-            page_count += 1
-            print(f"Scraped Page {page_count}")
+        self.crawl("page", self._max_page)
 
     def validate(self) -> bool:
         """Validate the operation, if anti-robot is not detected"""
@@ -99,7 +105,7 @@ class SearchItemScraper(BaseItemScraper):
 
     @property
     def asins(self) -> set[str]:
-        """Return the asins seen by the scraper."""
+        """Return the new asins found by the scraper."""
 
         return self._asins
 
@@ -112,18 +118,40 @@ class SearchItemScraper(BaseItemScraper):
 class SearchPageSpiderWorker(BaseSpiderWorker):
     """
     A SpiderWorker for scraping all search pages for a list of keywords.
+
+    The known ASINs are loaded in an AsinSet with a Bloom filter, sized for
+    the products in the database and as many new ones.
     """
 
     def __init__(
         self,
-        driver: SeleniumDriver,
+        driver: SeleniumDriver | None,
         action_type: str = "Search Page Scraping",
         queue: list[str] | None = None,
+        fetcher: BaseFetcher | None = None,
+        num_workers: int = 1,
+        driver_type: BrowserType = DEFAULT_BROWSER_TYPE,
+        drivers: DriverManager | None = None,
+        archive: PageArchive | None = None,
+        throttle: Throttle | None = None,
+        relevance: RelevanceClassifier | None = None,
+        db_name: str | None = None,
         **kwargs,
     ) -> None:
-        super().__init__(driver, action_type)
+        super().__init__(
+            driver,
+            action_type,
+            fetcher,
+            num_workers,
+            driver_type=driver_type,
+            drivers=drivers,
+            archive=archive,
+            throttle=throttle,
+            relevance=relevance,
+            db_name=db_name,
+        )
         self._query = queue
-        self._asins = set()
+        self._asins = None
         self._updated_asins = set()
         self.__kwargs = kwargs
         if self._query is None:
@@ -135,46 +163,63 @@ class SearchPageSpiderWorker(BaseSpiderWorker):
     def run(self) -> None:
         """Call the ItemScraper iteratively to scrape a list of keywords."""
 
-        existing_asins = self.db.get_asins()
-        self._asins.update(existing_asins)
-
-        for keyword in self._query:
-            url = "https://www.amazon.fr/s?" + urlencode({"k": keyword})
-            print(f"Scraping Pages for Keyword: {keyword}")
-            scraper = SearchItemScraper(
-                driver=self.driver,
-                starting_url=url,
-                asin_queue=existing_asins,
-                **self.__kwargs,
-            )
-            scraper.run()
-            if not scraper.validate():
-                print("Anti-robot detected, aborting...")
-                break
-            scaper_asins = scraper.asins
-            data = scraper.dump()
+        known = self.db.collection.estimated_document_count()
+        self._asins = AsinSet(bloom_capacity=2 * known + 1000)
+        self._asins.load(self.db)
+        print(f"Loaded {len(self._asins)} known ASINs in {self._asins.nbytes()} bytes.")
+
+        self.run_queue(list(self._query))
+
+        print(f"Total Updated: {len(self._data)}")
+
+    def scrape(self, fetcher: BaseFetcher, keyword: str) -> list[BaseItem] | None:
+        """Scrape all search pages of a keyword, and return the new items."""
+
+        url = "https://www.amazon.fr/s?" + urlencode({"k": keyword})
+        print(f"Scraping Pages for Keyword: {keyword}")
+        scraper = SearchItemScraper(
+            driver=self.driver,
+            starting_url=url,
+            asin_queue=self._asins,
+            fetcher=fetcher,
+            metrics=self.metrics,
+            **self.__kwargs,
+        )
+        scraper.run()
+        if not scraper.validate():
+            return None
+        with self._lock:
             # filter only asins that are not in the asin set
-            scaper_asins = [asin for asin in scaper_asins if asin not in self._asins]
+            scaper_asins = {asin for asin in scraper.asins if asin not in self._asins}
             self._updated_asins.update(scaper_asins)
             self._asins.update(scaper_asins)
-            # filter the data to only include the asins that are not in the asin set
-            data = [item for item in data if item.asin in scaper_asins]
-            self._data.extend(data)
-            # update the database
-            for item in data:
-                # add metadata
-                metadata = ItemMetadata(
-                    last_session_id=self.session_id,
-                    last_session_time=self._init_time,
-                    scrap_status="SearchPage",
-                )
-                item.metadata = metadata
-
-                self.db.update_product(item.model_dump(by_alias=True))
-
-            print(f"Updated {len(data)} items.")
+        # filter the data to only include the asins that are not in the asin set
+        return [item for item in scraper.dump() if item.asin in scaper_asins]
 
-        print(f"Total Updated: {len(self._data)}")
+    def build(self, data: list[BaseItem]) -> list[BaseItem]:
+        """Add the metadata to the items of a keyword."""
+
+        for item in data:
+            metadata = ItemMetadata(
+                last_session_id=self.session_id,
+                last_session_time=self._init_time,
+                scrap_status="SearchPage",
+            )
+            item.metadata = metadata
+        return data
+
+    def persist(self, data: list[BaseItem]) -> None:
+        """Update the items of a keyword in the database at once."""
+
+        self.save_products(dump_batch(SEARCH_ITEMS, data))
+        with self._lock:
+            self._data.extend(item.asin for item in data)
+        print(f"Updated {len(data)} items.")
+
+    def handoff(self, data: list[BaseItem]) -> list[str]:
+        """Hand the new ASINs with a relevant title over to the product spider."""
+
+        return [item.asin for item in data if self.is_relevant(item.asin, item.title)]
 
     def log(self) -> dict:
         """Log the scraping session."""
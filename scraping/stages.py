@@ -0,0 +1,156 @@
+"""
+Contain a pipeline of stages connected by bounded queues.
+"""
+
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    """
+    A step of a StagedPipeline, run by several worker threads.
+
+    `func` takes an element from the previous stage and returns the element
+    handed to the next stage, or None to drop it. A list of functions runs
+    one worker per function, e.g. to give each worker its own fetcher.
+    """
+
+    name: str
+    func: Callable[[Any], Any] | list[Callable[[Any], Any]]
+    num_workers: int = 1
+
+    def handlers(self) -> list[Callable[[Any], Any]]:
+        """Return the function run by each worker."""
+
+        if isinstance(self.func, list):
+            return self.func
+        return [self.func] * self.num_workers
+
+
+@dataclass
+class StageStats:
+    """The activity of a stage."""
+
+    processed: int = 0
+    dropped: int = 0
+    busy_sec: float = 0.0
+    max_depth: int = 0
+    full_waits: int = 0
+
+
+class StagedPipeline:
+    """
+    Run elements through stages that overlap, e.g. fetch, parse and persist.
+
+    Each stage reads from a bounded input queue of `maxsize` elements, so a
+    slow stage blocks the stages before it instead of letting elements pile
+    up in memory. `depths()` gives the number of elements waiting for each
+    stage; the stage with a full queue is the bottleneck. The first error
+    raised by a stage stops the pipeline and is raised again by `run()`.
+    """
+
+    def __init__(self, stages: list[Stage], maxsize: int = 16) -> None:
+        self.stages = stages
+        self.maxsize = maxsize
+        self._queues = []
+        self._stats = {stage.name: StageStats() for stage in stages}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._error = None
+
+    def depths(self) -> dict[str, int]:
+        """Return the number of elements waiting in the queue of each stage."""
+
+        return {stage.name: q.qsize() for stage, q in zip(self.stages, self._queues)}
+
+    def stats(self) -> dict[str, dict]:
+        """Return the activity of each stage, over all the runs."""
+
+        with self._lock:
+            return {name: dict(vars(stats)) for name, stats in self._stats.items()}
+
+    def _put(self, index: int, elem: Any) -> bool:
+        """Put an element in the queue of a stage, waiting while it is full."""
+
+        q = self._queues[index]
+        stats = self._stats[self.stages[index].name]
+        if q.full():
+            with self._lock:
+                stats.full_waits += 1
+        while not self._stop.is_set():
+            try:
+                q.put(elem, timeout=0.1)
+            except queue.Full:
+                continue
+            with self._lock:
+                stats.max_depth = max(stats.max_depth, q.qsize())
+            return True
+        return False
+
+    def _work(self, index: int, func: Callable[[Any], Any]) -> None:
+        stage = self.stages[index]
+        stats = self._stats[stage.name]
+        q = self._queues[index]
+        last = index == len(self.stages) - 1
+        while True:
+            try:
+                elem = q.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            if elem is _DONE:
+                return
+            if self._stop.is_set():
+                continue  # drain the queue so that producers are not blocked
+            start = time.perf_counter()
+            try:
+                result = func(elem)
+            except BaseException as e:
+                with self._lock:
+                    self._error = self._error or e
+                self._stop.set()
+                continue
+            with self._lock:
+                stats.busy_sec += time.perf_counter() - start
+                stats.processed += 1
+                if result is None and not last:
+                    stats.dropped += 1
+            if result is not None and not last:
+                self._put(index + 1, result)
+
+    def run(self, elems: list) -> None:
+        """Run the elements through all the stages, and wait for the last one."""
+
+        self._queues = [queue.Queue(maxsize=self.maxsize) for _ in self.stages]
+        self._stop.clear()
+        self._error = None
+
+        threads = []
+        for index, stage in enumerate(self.stages):
+            threads.append(
+                [
+                    threading.Thread(target=self._work, args=(index, func), daemon=True)
+                    for func in stage.handlers()
+                ]
+            )
+            for thread in threads[-1]:
+                thread.start()
+
+        for elem in elems:
+            if not self._put(0, elem):
+                break
+        for index, stage_threads in enumerate(threads):
+            for _ in stage_threads:
+                self._put(index, _DONE)
+            for thread in stage_threads:
+                thread.join()
+
+        if self._error is not None:
+            raise self._error
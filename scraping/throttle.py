@@ -0,0 +1,246 @@
+"""
+Contain an adaptive rate limiter and a circuit breaker for fetching pages.
+"""
+
+import threading
+import time
+
+from .common import is_antirobot, is_captcha
+from .document import HtmlDocument
+from .fetch import BaseFetcher, PageUnavailable
+
+
+class RateController:
+    """
+    A token bucket whose rate adapts to the blocks met (AIMD).
+
+    Each page fetched without a block adds `increase` pages/sec to the rate,
+    each block multiplies it by `decrease`. A captcha multiplies it by
+    `captcha_decrease`, as it is a warning rather than a block.
+    """
+
+    def __init__(
+        self,
+        rate: float = 2.0,
+        min_rate: float = 0.05,
+        max_rate: float = 10.0,
+        increase: float = 0.05,
+        decrease: float = 0.5,
+        captcha_decrease: float = 0.8,
+        burst: int = 1,
+    ) -> None:
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.captcha_decrease = captcha_decrease
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """Wait for a token, and return the time waited in seconds."""
+
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def success(self) -> None:
+        """Increase the rate after a page fetched without block."""
+
+        with self._lock:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def blocked(self, captcha: bool = False) -> None:
+        """Decrease the rate after a block or a captcha."""
+
+        factor = self.captcha_decrease if captcha else self.decrease
+        with self._lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate * factor)
+
+
+class CircuitBreaker:
+    """
+    A circuit breaker that pauses all fetches after consecutive blocks.
+
+    After `threshold` consecutive blocks, the circuit opens for `cooldown`
+    seconds. Once the cooldown is over, a single block opens it again, with
+    a cooldown twice as long, up to `max_cooldown`. A success closes it.
+    """
+
+    def __init__(
+        self, threshold: int = 3, cooldown: float = 300.0, max_cooldown: float = 3600.0
+    ) -> None:
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.trips = 0
+        self._failures = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """Whether fetches are paused."""
+
+        return time.monotonic() < self._open_until
+
+    def wait(self) -> float:
+        """Wait until the circuit is closed, and return the time waited in seconds."""
+
+        with self._lock:
+            delay = self._open_until - time.monotonic()
+        if delay <= 0:
+            return 0.0
+        time.sleep(delay)
+        return delay
+
+    def success(self) -> None:
+        """Close the circuit after a page fetched without block."""
+
+        with self._lock:
+            self._failures = 0
+            self.cooldown = self.base_cooldown
+
+    def blocked(self) -> None:
+        """Count a block, and open the circuit past the threshold."""
+
+        with self._lock:
+            if time.monotonic() < self._open_until:
+                return  # fetches started before the circuit opened
+            self._failures += 1
+            if self._failures < self.threshold:
+                return
+            self.trips += 1
+            self._open_until = time.monotonic() + self.cooldown
+            print(f"Circuit open, cooling down for {self.cooldown:.0f} seconds.")
+            # half-open: a single block after the cooldown opens it again
+            self._failures = self.threshold - 1
+            self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+
+
+class Throttle:
+    """The rate controller and circuit breaker shared by the fetchers of a run."""
+
+    def __init__(
+        self,
+        controller: RateController | None = None,
+        breaker: CircuitBreaker | None = None,
+    ) -> None:
+        self.controller = controller or RateController()
+        self.breaker = breaker or CircuitBreaker()
+        self._counts = {"pages": 0, "blocks": 0, "captchas": 0}
+        self._waited = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        """Wait for the circuit to close and for a token."""
+
+        waited = self.breaker.wait() + self.controller.acquire()
+        with self._lock:
+            self._waited += waited
+
+    def success(self) -> None:
+        """Report a page fetched without block."""
+
+        self.controller.success()
+        self.breaker.success()
+        with self._lock:
+            self._counts["pages"] += 1
+
+    def blocked(self, captcha: bool = False) -> None:
+        """Report a blocked page, or a captcha if `captcha` is set."""
+
+        self.controller.blocked(captcha)
+        if captcha:
+            with self._lock:
+                self._counts["captchas"] += 1
+            return
+        with self._lock:
+            self._counts["pages"] += 1
+            self._counts["blocks"] += 1
+        self.breaker.blocked()
+
+    def stats(self) -> dict:
+        """Return the counters, the current rate and the time spent waiting."""
+
+        with self._lock:
+            stats = dict(self._counts)
+            stats["waited_sec"] = round(self._waited, 1)
+        stats["rate"] = round(self.controller.rate, 3)
+        stats["circuit_trips"] = self.breaker.trips
+        return stats
+
+
+class ThrottledFetcher(BaseFetcher):
+    """
+    A fetcher that paces another fetcher with a Throttle.
+
+    Anti-robot pages and unavailable pages count as blocks. Captchas count as
+    warnings. Pages the wrapped fetcher got again from a fallback count as what
+    was served before the fallback. Batches are split into chunks of the burst
+    of the bucket, so that urls are released as the tokens arrive: a chunk is
+    fetched concurrently by the wrapped fetcher, e.g. up to the
+    `max_concurrency` of a HttpFetcher, but the next chunk waits for it. The
+    burst should thus be at least the size of the batches, e.g.
+    `page_batch_size`, for them to be fetched at once.
+    """
+
+    def __init__(self, fetcher: BaseFetcher, throttle: Throttle) -> None:
+        self.fetcher = fetcher
+        self.throttle = throttle
+
+    def _report(self, page: HtmlDocument) -> None:
+        reason = getattr(page, "fallback_reason", None)
+        if reason in ("antirobot", "unavailable") or is_antirobot(page):
+            self.throttle.blocked()
+        elif reason == "captcha" or is_captcha(page):
+            self.throttle.blocked(captcha=True)
+        else:
+            self.throttle.success()
+
+    def fetch(self, url: str) -> HtmlDocument:
+        """Fetch a page once the throttle allows it."""
+
+        return self.fetch_many([url])[0]
+
+    def fetch_many(self, urls: list[str]) -> list[HtmlDocument]:
+        """Fetch several pages once the throttle allows each of them."""
+
+        burst = max(1, self.throttle.controller.burst)
+        pages = []
+        for start in range(0, len(urls), burst):
+            chunk = urls[start : start + burst]
+            for _ in chunk:
+                self.throttle.wait()
+            try:
+                fetched = self.fetcher.fetch_many(chunk)
+            except PageUnavailable:
+                self.throttle.blocked()
+                raise
+            for page in fetched:
+                self._report(page)
+            pages.extend(fetched)
+        return pages
+
+    def close(self) -> None:
+        """Close the wrapped fetcher."""
+
+        self.fetcher.close()
@@ -0,0 +1,16 @@
+"""
+Test the offline benchmark runner.
+"""
+
+import pytest
+
+from benchmarks.run import bench_spiders, main
+
+
+def test_refuses_other_database():
+    """Test if a database not named as a benchmark one is never dropped."""
+
+    with pytest.raises(ValueError):
+        bench_spiders(None, "mongodb://localhost:1", "amazon", [], 1)
+    with pytest.raises(SystemExit):
+        main(["--database", "amazon"])
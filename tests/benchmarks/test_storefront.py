@@ -0,0 +1,46 @@
+"""
+Test the local storefront used by the offline benchmark.
+"""
+
+from benchmarks.storefront import Storefront, keyword_tag
+from scraping.common import is_antirobot
+from scraping.fetch import HttpFetcher
+from scraping.product_page.functions import parse_product_page
+from scraping.search_page.functions import parse_search_page
+
+
+def test_storefront():
+    """Test if search results get ASINs of their own, and product pages follow them."""
+
+    with Storefront() as storefront:
+        fetcher = HttpFetcher(base_url=storefront.url)
+        try:
+            page = fetcher.fetch("https://www.amazon.fr/s?k=tampon")
+            cards = parse_search_page(page)["cards"]
+            asins = [card["asin"] for card in cards if card["asin"]]
+            assert asins and all(
+                asin.startswith(f"B0{keyword_tag('tampon')}") for asin in asins
+            ), "Search results are not rewritten"
+
+            page = fetcher.fetch(f"https://www.amazon.fr/dp/{asins[0]}")
+            assert asins[0] in parse_product_page(page)["review_url"]
+            assert storefront.counts["pages"] == 2
+        finally:
+            fetcher.close()
+
+
+def test_storefront_blocks():
+    """Test if the anti-robot page is served at the block rate."""
+
+    with Storefront(block_rate=1.0) as storefront:
+        fetcher = HttpFetcher(base_url=storefront.url)
+        try:
+            assert is_antirobot(fetcher.fetch("https://www.amazon.fr/dp/B0TEST0002"))
+            assert storefront.counts == {
+                "pages": 0,
+                "blocks": 1,
+                "captchas": 0,
+                "missing": 0,
+            }
+        finally:
+            fetcher.close()
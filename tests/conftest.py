@@ -2,12 +2,17 @@
 Contains fixtures for the tests.
 """
 
-from urllib.parse import urlencode
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlencode, urlsplit
 
 import pytest
 
 from mongodb.client import DatabaseClient
 from scraping.common import SeleniumDriver, get_driver
+from scraping.fetch import HttpFetcher
 
 ASIN_LIST = [
     "B08BX8TTVS",
@@ -21,6 +26,8 @@ REVIEW_URLS = [
     "https://www.amazon.fr/Vania-Kotydia-Protege-slips-Protect-Large/product-reviews/B07YQFYH3V/ref=cm_cr_dp_d_show_all_btm?ie=UTF8&reviewerType=all_reviews",  # pylint: disable=line-too-long
 ]
 
+FIXTURE_PAGES_DIR = Path(__file__).parent / "fixtures" / "pages"
+
 ### Selenium-related fixtures
 
 
@@ -59,6 +66,61 @@ def search_page(test_driver) -> SeleniumDriver:  # pylint: disable=redefined-out
     return test_driver
 
 
+### Local fixture server
+
+
+class FixturePageHandler(BaseHTTPRequestHandler):
+    """
+    Serve the recorded pages in `fixtures/pages` as if they were amazon.fr.
+
+    `/dp/B0TEST0001` is served from `dp/B0TEST0001.html`, and the n-th page of
+    a paginated url (`page` or `pageNumber` query parameter) from `<path>-<n>.html`.
+    """
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Serve a recorded page, or a 404."""
+
+        parts = urlsplit(self.path)
+        name = re.sub(r"/ref=.*$", "", parts.path.strip("/"))
+        query = parse_qs(parts.query)
+        page = query.get("page") or query.get("pageNumber")
+        if page and page[0] != "1":
+            name = f"{name}-{page[0]}"
+        path = FIXTURE_PAGES_DIR / f"{name}.html"
+
+        if not path.is_file():
+            self.send_error(404)
+            return
+        content = path.read_bytes()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+@pytest.fixture(scope="session")
+def fixture_server() -> str:
+    """Run a local HTTP server standing in for amazon.fr, return its base url."""
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FixturePageHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+@pytest.fixture(scope="module")
+def http_fetcher(fixture_server) -> HttpFetcher:  # pylint: disable=redefined-outer-name
+    """Create a HttpFetcher pointed at the local fixture server."""
+
+    with HttpFetcher(base_url=fixture_server, max_concurrency=4) as fetcher:
+        yield fetcher
+
+
 ### MongoDB-related fixtures
 
 
@@ -1,7 +1,7 @@
 """
 For testing the MongoDB pipeline.
 """
-from mongodb.client import load_env_uri
+from mongodb.client import content_hash, load_env_uri, scraped_at
 from mongodb.interfaces import SessionLogInfo
 
 
@@ -12,6 +12,23 @@ def test_load_env_uri():
     assert uri, "Default MongoDB URI is not loaded from .env file"
 
 
+def test_content_hash():
+    """Test if the content hash ignores the metadata."""
+
+    product = {"asin": "B07YQFH15Y", "price": 4.5}
+    digest = content_hash(product)
+    assert digest == content_hash({**product, "_metadata": {"last_session_id": 1}})
+    assert digest != content_hash({**product, "price": 4.0})
+
+
+def test_scraped_at():
+    """Test if the time of a scrap is kept by scrap status."""
+
+    metadata = {"scrap_status": "ReviewPage", "last_session_time": 1}
+    assert scraped_at({"_metadata": metadata}) == {"_scraped_at.ReviewPage": 1}
+    assert scraped_at({"asin": "B07YQFH15Y"}) == {}, "Time is set without metadata"
+
+
 class TestDatabaseClient:
     """Test the DatabaseClient."""
 
@@ -33,8 +50,39 @@ class TestDatabaseClient:
         logid = db_client.log(info)
         assert logid, "Log is not created"
 
+    def test_reserve_session_id(self, db_client):
+        """Test if clients created at the same time get distinct session ids."""
+
+        first = db_client.reserve_session_id()
+        second = db_client.reserve_session_id()
+        assert second == first + 1, "Session ids are not reserved atomically"
+
     def test_update_product(self, db_client, product):
         """Test if the product is updated."""
 
         updated = db_client.update_product(product)
         assert updated, "Product is not updated"
+
+    def test_save_product(self, db_client, product):
+        """Test if an unchanged product is not written again."""
+
+        product = {**product, "_metadata": {"scrap_status": "SearchPage"}}
+        db_client.save_product(product)
+        changed = db_client.save_product(product)
+        assert not changed, "Unchanged product is written again"
+
+    def test_checkpoint(self, db_client, product):
+        """Test if a checkpoint loads the fingerprints only, and is committed."""
+
+        asin = product["asin"]
+        db_client.clear_checkpoint(asin)
+        db_client.save_checkpoint(asin, 1, [{"fingerprint": "a", "body": "Bien"}])
+        db_client.save_checkpoint(asin, 2, [{"fingerprint": "b", "body": "Bof"}])
+        checkpoint = db_client.load_checkpoint(asin)
+        assert checkpoint["page"] == 2, "Last page is not loaded"
+        assert checkpoint["items"] == [{"fingerprint": "a"}, {"fingerprint": "b"}]
+
+        db_client.commit_checkpoint(asin)
+        assert db_client.load_checkpoint(asin) is None, "Checkpoint is not deleted"
+        reviews = db_client.find_product(asin)["reviews"]
+        assert [review["fingerprint"] for review in reviews] == ["a", "b"]
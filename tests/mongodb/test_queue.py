@@ -0,0 +1,91 @@
+"""
+For testing the work queue shared by scraping nodes.
+"""
+
+import threading
+
+import pytest
+
+from mongodb.queue import WorkQueue
+
+QUEUE_NAME = "test"
+
+
+@pytest.fixture
+def work_queues(db_client):
+    """Create two workers of an empty test queue."""
+
+    first = WorkQueue(db_client, QUEUE_NAME, lease_sec=60, owner="first")
+    second = WorkQueue(db_client, QUEUE_NAME, lease_sec=60, owner="second")
+    first.collection.delete_many({})
+    yield first, second
+    first.collection.drop()
+
+
+def identity(payload):
+    return payload
+
+
+class TestWorkQueue:
+    """Test the WorkQueue."""
+
+    def test_put_many(self, work_queues):
+        """Test if items are only added once."""
+
+        first, second = work_queues
+        assert first.put_many(["A", "B"], identity) == 2
+        assert second.put_many(["B", "C"], identity) == 1
+        assert first.counts()["pending"] == 3
+
+    def test_claim(self, work_queues):
+        """Test if an item is leased to a single worker."""
+
+        first, second = work_queues
+        first.put_many(["A", "B"], identity)
+        claimed = [first.claim()["key"], second.claim()["key"]]
+        assert sorted(claimed) == ["A", "B"]
+        assert first.claim() is None
+        assert first.complete(claimed[0])
+        assert not second.complete(claimed[0]), "Completed another worker's item"
+        assert first.counts() == {"pending": 0, "leased": 1, "done": 1, "dead": 0}
+
+    def test_expired_lease(self, work_queues):
+        """Test if the item of a crashed worker is claimed again."""
+
+        first, second = work_queues
+        first.lease = first.lease * 0
+        first.put_many(["A"], identity)
+        assert first.claim()["key"] == "A"
+        item = second.claim()
+        assert item["key"] == "A" and item["attempts"] == 2
+        assert not first.complete("A")
+        assert second.complete("A")
+
+    def test_dead_letter(self, work_queues):
+        """Test if an item failing too often is dead."""
+
+        first, _ = work_queues
+        first.put_many([{"asin": "A"}], lambda elem: elem["asin"])
+        for _ in range(first.max_attempts):
+            assert first.claim()["payload"] == {"asin": "A"}
+            first.fail("A", "Anti-robot page")
+        assert first.claim() is None
+        assert first.counts()["dead"] == 1
+
+    def test_drain_waits_for_leases(self, work_queues):
+        """Test if draining waits for the items leased by another worker."""
+
+        first, second = work_queues
+        first.put_many(["A"], identity)
+        assert first.claim()["key"] == "A"
+        drained = []
+        thread = threading.Thread(
+            target=lambda: drained.extend(second.drain(poll_sec=0.05))
+        )
+        thread.start()
+        thread.join(0.2)
+        assert thread.is_alive(), "Drain exits while an item is leased"
+        first.complete("A")
+        thread.join(5)
+        assert not thread.is_alive(), "Drain does not exit once the queue is done"
+        assert drained == []
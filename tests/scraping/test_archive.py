@@ -0,0 +1,56 @@
+"""
+Test the PageArchive and the replay of archived pages.
+"""
+
+import pytest
+
+from scraping.archive import ArchivingFetcher, PageArchive, ReplayFetcher
+from scraping.fetch import PageUnavailable
+from scraping.review_page.spider import ReviewItemScraper
+
+PRODUCT_URL = "https://www.amazon.fr/dp/B0TEST0001"
+REVIEW_URL = "https://www.amazon.fr/product-reviews/B0TEST0001"
+ANTIROBOT_URL = "https://www.amazon.fr/errors/antirobot"
+CAPTCHA_URL = "https://www.amazon.fr/errors/captcha"
+
+
+def test_archive_put_get(tmp_path):
+    """Test if pages are stored once per content and found by url and session."""
+
+    archive = PageArchive(tmp_path)
+    digest = archive.put(PRODUCT_URL, "<html>v1</html>", session_id=1)
+    assert archive.put(PRODUCT_URL + "?th=1", "<html>v1</html>", 1) == digest
+    archive.put(PRODUCT_URL, "<html>v2</html>", session_id=2)
+
+    assert len(list((tmp_path / "objects").rglob("*.gz"))) == 2, "Pages are duplicated"
+    assert archive.sessions() == [1, 2], "Sessions are not indexed"
+    assert archive.get(PRODUCT_URL, session_id=1) == "<html>v1</html>"
+    assert archive.get(PRODUCT_URL) == "<html>v2</html>", "Newest page is not used"
+    assert archive.get(REVIEW_URL) is None, "Missing page is found"
+
+
+def test_replay_review_pages(tmp_path, http_fetcher):
+    """Test if review pages are parsed again from the archive."""
+
+    archive = PageArchive(tmp_path)
+    recorder = ArchivingFetcher(http_fetcher, archive, session_id=7)
+    scraper = ReviewItemScraper(None, REVIEW_URL, fetcher=recorder)
+    scraper.run()
+    fetched = scraper.dump()
+
+    replayer = ReviewItemScraper(None, REVIEW_URL, fetcher=ReplayFetcher(archive))
+    replayer.run()
+    assert len(fetched) == 12, "Review pages are not fetched"
+    assert replayer.dump() == fetched, "Replayed reviews differ"
+
+    with pytest.raises(PageUnavailable):
+        ReplayFetcher(archive, session_id=7).fetch(PRODUCT_URL)
+
+
+def test_archive_skips_blocks(tmp_path, http_fetcher):
+    """Test if anti-robot and captcha pages are not archived."""
+
+    archive = PageArchive(tmp_path)
+    recorder = ArchivingFetcher(http_fetcher, archive, session_id=3)
+    recorder.fetch_many([PRODUCT_URL, ANTIROBOT_URL, CAPTCHA_URL])
+    assert list(archive.index(3)) == [PRODUCT_URL], "Block pages are archived"
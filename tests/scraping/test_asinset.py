@@ -0,0 +1,48 @@
+"""
+Test the compact ASIN set.
+"""
+
+import pytest
+
+from scraping.asinset import AsinSet, BloomFilter, decode_asin, encode_asin
+
+
+def test_encode_asin():
+    """Test if ASINs are packed into integers and back."""
+
+    for asin in ["B07YQFH15Y", "2035953148", "ZZZZZZZZZZ"]:
+        assert decode_asin(encode_asin(asin)) == asin
+    assert encode_asin("ZZZZZZZZZZ") < 2**52
+    with pytest.raises(ValueError):
+        encode_asin("B07YQFH15")
+    with pytest.raises(ValueError):
+        encode_asin("b07yqfh15y")
+
+
+def test_AsinSet():
+    """Test if ASINs are found, whether added in bulk or one by one."""
+
+    asins = AsinSet(["B0TEST0002", "B0TEST0001", "B0TEST0001"])
+    asins.merge_size = 2
+    asins.add("B0TEST0003")
+    assert "B0TEST0003" in asins and "B0TEST0001" in asins
+    asins.add("B0TEST0004")  # merged into the array
+    asins.add("not an asin")
+    assert "B0TEST0004" in asins and "not an asin" in asins
+    assert "B0TEST0005" not in asins and "" not in asins
+    assert "b0test0001" not in asins, "Lowercase ASIN is packed"
+    assert len(asins) == 5
+    assert list(asins)[:4] == [f"B0TEST000{i}" for i in range(1, 5)]
+    assert asins.nbytes() == 4 * 8
+
+
+def test_BloomFilter():
+    """Test if the Bloom filter has no false negative, and few false positives."""
+
+    asins = AsinSet((f"B0{i:08d}" for i in range(1000)), bloom_capacity=1000)
+    assert all(f"B0{i:08d}" in asins for i in range(1000))
+
+    bloom = BloomFilter.from_bytes(asins.bloom.to_bytes())
+    values = [encode_asin(f"B1{i:08d}") for i in range(1000)]
+    false_positives = sum(value in bloom for value in values)
+    assert false_positives < 50, "Too many false positives"
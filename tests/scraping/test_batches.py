@@ -0,0 +1,68 @@
+"""
+Test the validation of scraped items in batches.
+"""
+
+from datetime import datetime
+
+from scraping.batches import (
+    PRODUCT_ITEMS,
+    REVIEW_ITEMS,
+    SEARCH_ITEMS,
+    dump_batch,
+    validate_batch,
+)
+from scraping.interfaces import ItemMetadata
+
+
+def test_validate_batch():
+    """Test if the invalid rows of a batch are dropped, and the others kept in order."""
+
+    rows = [
+        {"asin": "B0TEST0001", "title": "Serviettes", "thumbnail": None},
+        {"asin": "2035953148", "title": "Livre", "thumbnail": None},
+        {"asin": "B0TEST0002", "title": None, "thumbnail": "https://example.com/a.jpg"},
+    ]
+    items, invalid = validate_batch(SEARCH_ITEMS, rows)
+    assert invalid == {1}, "Invalid ASIN is not dropped"
+    assert [item.asin for item in items] == ["B0TEST0001", "B0TEST0002"]
+
+    reviews, invalid = validate_batch(
+        REVIEW_ITEMS,
+        [
+            {
+                "title": "Très bien",
+                "body": "Aucune fuite",
+                "rating": 5,
+                "country": "France",
+                "date": datetime(2023, 3, 12),
+                "fingerprint": "0123456789abcdef",
+            }
+        ],
+    )
+    assert not invalid and isinstance(reviews[0], dict)
+
+
+def test_dump_batch():
+    """Test if products are dumped without the fields the product page does not set."""
+
+    metadata = ItemMetadata(
+        last_session_id=1, last_session_time=datetime.now(), scrap_status="ProductPage"
+    )
+    row = {
+        "asin": "B0TEST0001",
+        "price": 4.5,
+        "brand": "Nana",
+        "avg_rating": 4.6,
+        "num_reviews": 120,
+        "feature_bullets": None,
+        "unities": 12.0,
+        "review_url": None,
+        "category": None,
+        "family_id": None,
+        "metadata": metadata,
+    }
+    products, _ = validate_batch(PRODUCT_ITEMS, [row])
+    [doc] = dump_batch(PRODUCT_ITEMS, products)
+    assert "title" not in doc, "Search title would be overwritten"
+    assert doc["_metadata"]["scrap_status"] == "ProductPage"
+    assert doc["price"] == 4.5
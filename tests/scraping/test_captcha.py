@@ -0,0 +1,64 @@
+"""
+Test the CaptchaSolver and its cache.
+"""
+
+from io import BytesIO
+
+from PIL import Image, ImageDraw
+
+from scraping.captcha import CaptchaSolver, image_hash
+
+
+def make_image(text: str, shift: int = 0) -> bytes:
+    """Draw a captcha-like image."""
+
+    image = Image.new("RGB", (200, 70), "white")
+    ImageDraw.Draw(image).text((20 + shift, 25), text, fill="black")
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def test_image_hash():
+    """Test if the hash is stable for an image and differs between images."""
+
+    assert image_hash(make_image("ABCDEF")) == image_hash(make_image("ABCDEF"))
+    assert image_hash(make_image("ABCDEF")) != image_hash(make_image("ABCDEG"))
+
+
+def test_solver_cache(tmp_path):
+    """Test if accepted solutions are cached and reused without OCR."""
+
+    cache_path = tmp_path / "captcha_cache.json"
+    image = make_image("ABCDEF")
+    solver = CaptchaSolver(cache_path)
+    key, solution = solver.solve(image)
+    assert isinstance(solution, str), "Captcha is not solved in the pool"
+    solver.confirm(key, accepted=True)
+    solver.close()
+
+    solver = CaptchaSolver(cache_path)
+    snapshot = solver.stats()
+    assert solver.solve(image) == (key, solution), "Solution is not cached"
+    solver.confirm(key, accepted=False)
+    stats = solver.stats(snapshot)
+    assert stats["cache_hits"] == 1 and stats["failures"] == 1
+    assert stats["success_rate"] == 0.0, "Success rate is not recorded"
+
+    solver = CaptchaSolver(cache_path)
+    assert solver.stats()["cache_hits"] == 0
+    solver.solve(image)
+    assert solver.stats()["cache_hits"] == 0, "Rejected solution is still cached"
+    solver.close()
+
+
+def test_solver_cache_miss(tmp_path):
+    """Test if a cached solution is not reused for a different captcha."""
+
+    solver = CaptchaSolver(tmp_path / "captcha_cache.json")
+    key, _ = solver.solve(make_image("ABCDEF"))
+    solver.confirm(key, accepted=True)
+    other_key, _ = solver.solve(make_image("ABCDEG"))
+    assert other_key != key, "Different captchas share a cache key"
+    assert solver.stats()["cache_hits"] == 0, "Different captcha hits the cache"
+    solver.close()
@@ -0,0 +1,132 @@
+"""
+Test the fetch backends against the local fixture server.
+"""
+
+from selenium.webdriver.common.by import By
+
+from scraping.common import is_antirobot, is_captcha
+from scraping.document import HtmlDocument
+from scraping.fetch import BaseFetcher, HttpFetcher, SeleniumFetcher
+from scraping.product_page.functions import get_price, get_title, is_target
+from scraping.product_page.spider import ProductItemScraper
+
+PRODUCT_URL = "https://www.amazon.fr/dp/B0TEST0001"
+
+
+class RecordingFetcher(BaseFetcher):
+    """A fallback fetcher that serves the product page and records its calls."""
+
+    def __init__(self, page_source: str) -> None:
+        self.page_source = page_source
+        self.urls = []
+
+    def fetch(self, url: str) -> HtmlDocument:
+        self.urls.append(url)
+        return HtmlDocument(self.page_source, url)
+
+
+class FakeDriver:
+    """A driver serving an empty page."""
+
+    page_source = "<html></html>"
+    current_url = ""
+
+    def get(self, url: str) -> None:
+        self.current_url = url
+
+
+class FakeManager:
+    """A DriverManager that records the drivers acquired and released."""
+
+    def __init__(self) -> None:
+        self.acquired = []
+        self.released = []
+
+    def acquire(self) -> FakeDriver:
+        self.acquired.append(FakeDriver())
+        return self.acquired[-1]
+
+    def served(self, driver: FakeDriver) -> FakeDriver:
+        return driver
+
+    def release(self, driver: FakeDriver) -> None:
+        self.released.append(driver)
+
+
+def test_HtmlElement_find_elements():
+    """Test if the elements are searched within an element, as in Selenium."""
+
+    page = HtmlDocument(
+        "<html><body>"
+        "<div id='a'><span class='price'>1</span></div>"
+        "<div id='b'><span class='price'>2</span></div>"
+        "</body></html>"
+    )
+    assert len(page.find_elements(By.CLASS_NAME, "price")) == 2
+    for div, price in zip(page.find_elements(By.TAG_NAME, "div"), ["1", "2"]):
+        assert [e.text for e in div.find_elements(By.CLASS_NAME, "price")] == [price]
+        assert [e.text for e in div.find_elements(By.TAG_NAME, "span")] == [price]
+        assert not div.find_elements(By.ID, "b"), "Search is not scoped"
+
+
+def test_SeleniumFetcher_lazy_driver():
+    """Test if the driver is only acquired when a page is fetched."""
+
+    manager = FakeManager()
+    SeleniumFetcher(manager=manager).close()
+    assert manager.acquired == [] and manager.released == [], "Driver is started"
+
+    fetcher = SeleniumFetcher(manager=manager)
+    assert fetcher.fetch(PRODUCT_URL).current_url == PRODUCT_URL
+    fetcher.close()
+    assert manager.released == manager.acquired and len(manager.acquired) == 1
+
+
+def test_http_fetch(http_fetcher):
+    """Test if a page is fetched and can be parsed without a browser."""
+
+    page = http_fetcher.fetch(PRODUCT_URL)
+    assert isinstance(page, HtmlDocument), "Page is not a HtmlDocument"
+    assert page.current_url == PRODUCT_URL, "Url is not kept"
+    assert not is_antirobot(page), "Anti-robot page is detected"
+    assert is_target(page), "Product page is not a target"
+    assert get_title(page).startswith("Nett ProComfort"), "Title is not parsed"
+    assert get_price(page) == 3.79, "Price is not parsed"
+
+
+def test_http_fetch_many(http_fetcher):
+    """Test if pages fetched concurrently keep the order of the urls."""
+
+    urls = [PRODUCT_URL, "https://www.amazon.fr/errors/antirobot", PRODUCT_URL]
+    pages = http_fetcher.fetch_many(urls)
+    assert [page.current_url for page in pages] == urls, "Order is not kept"
+    assert is_antirobot(pages[1]), "Anti-robot page is not detected"
+
+
+def test_http_fallback(fixture_server, http_fetcher):
+    """Test if captcha pages are handed over to the fallback fetcher."""
+
+    product = http_fetcher.fetch(PRODUCT_URL)
+    fallback = RecordingFetcher(product.page_source)
+    with HttpFetcher(fallback=fallback, base_url=fixture_server) as fetcher:
+        captcha_url = "https://www.amazon.fr/errors/captcha"
+        assert is_captcha(http_fetcher.fetch(captcha_url)), "Captcha is not served"
+        page = fetcher.fetch(captcha_url)
+        assert fallback.urls == [captcha_url], "Fallback is not called"
+        assert not is_captcha(page), "Captcha page is returned"
+
+
+def test_ProductItemScraper_http(http_fetcher):
+    """Test the ProductItemScraper with a browserless fetcher."""
+
+    scraper = ProductItemScraper(None, PRODUCT_URL, fetcher=http_fetcher)
+    scraper.run()
+    data = scraper.dump()
+    assert scraper.validate(), "Anti-robot is detected"
+    assert data["brand"] == "Nett", "Brand is not parsed"
+    assert data["num_reviews"] == 1303, "Number of reviews is not parsed"
+    assert data["unities"] == 24, "Unities are not parsed"
+    assert data["category"] == "Tampons", "Category is not parsed"
+    assert data["review_url"].startswith(
+        "https://www.amazon.fr/product-reviews/B0TEST0001"
+    ), "Review url is not parsed"
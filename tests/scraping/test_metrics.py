@@ -0,0 +1,90 @@
+"""
+Test the timing histograms and counters of a scraping session.
+"""
+
+import time
+
+from scraping.document import HtmlDocument
+from scraping.fetch import BaseFetcher, MeteredFetcher
+from scraping.metrics import Histogram, Metrics
+
+PRODUCT_URL = "https://www.amazon.fr/dp/B0TEST0001"
+ANTIROBOT_URL = "https://www.amazon.fr/errors/antirobot"
+
+
+class CaptchaFetcher(BaseFetcher):
+    """A fetcher that solves a captcha on each page it loads."""
+
+    def fetch(self, url: str) -> HtmlDocument:
+        page = HtmlDocument("<html></html>", url)
+        page.captcha_sec = 0.5
+        return page
+
+
+def test_Histogram():
+    """Test if durations land in their bucket, and histograms can be subtracted."""
+
+    histogram = Histogram((0.1, 1.0))
+    for value in [0.05, 0.5, 0.5, 2.0]:
+        histogram.observe(value)
+    assert histogram.counts == [1, 2, 1]
+    assert histogram.quantile(0.5) == 0.55, "Median is not interpolated"
+    assert histogram.quantile(1.0) == 1.0, "Overflow is not capped at the last bound"
+
+    earlier = histogram.copy()
+    histogram.observe(0.01)
+    since = histogram - earlier
+    assert since.counts == [1, 0, 0] and since.count == 1
+
+
+def test_Metrics():
+    """Test if timings and counters are aggregated, and exported as Prometheus text."""
+
+    metrics = Metrics((0.1, 1.0))
+    with metrics.timer("parse"):
+        pass
+    metrics.observe("navigation", 0.5)
+    metrics.inc("blocks")
+    metrics.inc("blocks", 2)
+
+    stats = metrics.stats()
+    assert stats["timings"]["parse"]["count"] == 1
+    assert stats["timings"]["navigation"]["buckets"] == [0, 1, 0]
+    assert stats["counters"] == {"blocks": 3}
+
+    text = metrics.to_prometheus({"session_id": 7})
+    assert (
+        'scraping_duration_seconds_bucket{session_id="7",step="navigation",le="+Inf"} 1'
+        in text
+    )
+    assert 'scraping_events_total{session_id="7",event="blocks"} 3' in text
+
+
+def test_MeteredFetcher(http_fetcher):
+    """Test if the pages, blocks and bytes fetched are counted."""
+
+    metrics = Metrics()
+    fetcher = MeteredFetcher(http_fetcher, metrics)
+    fetcher.fetch_many([PRODUCT_URL, ANTIROBOT_URL])
+
+    stats = metrics.stats()
+    assert stats["timings"]["navigation"]["count"] == 2
+    assert stats["counters"]["pages"] == 2
+    assert stats["counters"]["blocks"] == 1
+    assert stats["counters"]["bytes_fetched"] > 0
+
+
+def test_MeteredFetcher_captcha():
+    """Test if a batch is timed once, and the captchas of its pages are timed."""
+
+    metrics = Metrics()
+    fetcher = MeteredFetcher(CaptchaFetcher(), metrics)
+    start = time.perf_counter()
+    fetcher.fetch_many([PRODUCT_URL, PRODUCT_URL])
+    elapsed = time.perf_counter() - start
+
+    timings = metrics.stats()["timings"]
+    assert timings["navigation"]["count"] == 2
+    assert timings["navigation"]["sum_sec"] <= round(elapsed, 3) + 0.001
+    assert timings["captcha"]["count"] == 2
+    assert timings["captcha"]["sum_sec"] == 1.0
@@ -4,16 +4,19 @@ Test the ProductPageSpider.
 
 
 from scraping import ProductPageSpiderWorker
+from scraping.document import HtmlDocument
 from scraping.product_page.functions import (
     get_avg_rating,
     get_brand,
     get_category,
+    get_family_id,
     get_feature_bullets,
     get_num_reviews,
     get_price,
     get_review_url,
     get_title,
     get_unities,
+    parse_product_page,
 )
 from scraping.product_page.spider import ProductItemScraper
 
@@ -111,3 +114,25 @@ def test_ProductPageSpiderWorker(test_driver):
         pipeline=pipeline,
     ) as worker:
         worker.run()
+
+
+def test_parse_product_page(http_fetcher):
+    """Test if all fields of a product page snapshot are parsed in one pass."""
+
+    page = http_fetcher.fetch("https://www.amazon.fr/dp/B0TEST0001")
+    item = parse_product_page(page)
+    assert item["is_target"], "Product page is not a target"
+    assert item["price"] == 3.79, "Price is not parsed"
+    assert item["avg_rating"] == 4.6, "Average rating is not parsed"
+    assert len(item["feature_bullets"]) == 2, "Feature bullets are not parsed"
+    assert item["category"] == "Tampons", "Category is not parsed"
+    assert item["family_id"] == "B0TESTFAM1", "Parent ASIN is not parsed"
+
+
+def test_get_family_id():
+    """Test if the ASIN of the review url is used without parent ASIN."""
+
+    page = HtmlDocument("<html></html>", "https://www.amazon.fr/dp/B0TEST0002")
+    review_url = "https://www.amazon.fr/product-reviews/B0TEST0003/ref=cm_cr"
+    assert get_family_id(page, review_url) == "B0TEST0003"
+    assert get_family_id(page) is None
@@ -0,0 +1,57 @@
+"""
+Test the sampling profiler.
+"""
+
+import threading
+import time
+
+import pytest
+
+from scraping.profiling import Profiler, get_profiler
+
+
+def busy_loop(stop: threading.Event) -> list[bytes]:
+    """Allocate memory until stopped."""
+
+    chunks = []
+    while not stop.is_set():
+        chunks.append(bytes(1024))
+        time.sleep(0.001)
+    return chunks
+
+
+def test_Profiler(tmp_path):
+    """Test if the stacks of the threads and the allocations are written as folded files."""
+
+    stop = threading.Event()
+    thread = threading.Thread(target=busy_loop, args=(stop,), name="Busy")
+    with Profiler(tmp_path, interval=0.005, snapshot_interval=0.1) as profiler:
+        thread.start()
+        time.sleep(0.3)
+        stop.set()
+        thread.join()
+
+    summary = profiler.summary
+    assert summary["samples"] > 0 and len(summary["memory"]) >= 2
+    stacks = (tmp_path / "cpu.folded").read_text().splitlines()
+    assert any(
+        line.startswith("Busy;") and "busy_loop (test_profiling.py" in line
+        for line in stacks
+    ), "Busy thread is not sampled"
+    _, weight = stacks[0].rsplit(" ", 1)
+    assert int(weight) > 0
+
+    memory = (tmp_path / summary["memory"][0]).read_text()
+    assert "test_profiling.py" in memory, "Allocations are not traced"
+
+
+def test_single_Profiler(tmp_path):
+    """Test if a single Profiler runs at a time in the process."""
+
+    with Profiler(tmp_path / "first", snapshot_interval=None, session_id=7) as profiler:
+        assert get_profiler() is profiler
+        profiler.sessions.append(8)
+        with pytest.raises(RuntimeError):
+            Profiler(tmp_path / "second").start()
+    assert get_profiler() is None, "Stopped Profiler is still running"
+    assert profiler.summary["sessions"] == [8], "Profiled sessions are not linked"
@@ -0,0 +1,55 @@
+"""
+Test the RelevanceClassifier.
+"""
+
+import pandas as pd
+import pytest
+
+from scraping.relevance import RelevanceClassifier, load_training_data
+
+PRODUCTS_PATH = "tests/fixtures/products.csv"
+
+
+def test_load_training_data():
+    """Test if the products are labelled by the outcome of their product page."""
+
+    titles, labels = load_training_data(PRODUCTS_PATH)
+    assert len(titles) == len(labels)
+    assert 0 < sum(labels) < len(labels), "Both classes are not present"
+
+
+def test_load_training_data_category():
+    """Test if products exported without is_target are labelled by their category."""
+
+    products = pd.read_csv(PRODUCTS_PATH).drop(columns="is_target")
+    titles, labels = load_training_data(products)
+    targets = pd.read_csv(PRODUCTS_PATH).dropna(subset=["title", "category"])
+    assert len(titles) == len(targets)
+    assert labels == [int(label) for label in targets["is_target"]]
+
+
+def test_relevance_classifier():
+    """Test if unseen target titles score above unseen off-topic titles."""
+
+    classifier = RelevanceClassifier.from_csv(PRODUCTS_PATH)
+    targets = [
+        "Tampax Compak Pearl Tampons Regular, 18 tampons",
+        "Coupe menstruelle réutilisable en silicone, taille L",
+        "Serviettes hygiéniques bio Ultra Nuit, 10 pièces",
+    ]
+    others = [
+        "Tampon encreur bleu pour tampons de bureau",
+        "Serviette de bain en coton bio, 70 x 140 cm",
+        "Coupe-bordures électrique pour jardin, 450 W",
+        "Lot de 3 tampons à récurer en cuivre",
+    ]
+    lowest = min(classifier.score(title) for title in targets)
+    assert all(classifier.score(title) < lowest for title in others)
+
+    classifier.threshold = lowest
+    assert all(classifier.is_relevant(title) for title in targets)
+    assert not any(classifier.is_relevant(title) for title in others)
+    assert classifier.is_relevant(None), "Missing title is skipped"
+
+    with pytest.raises(ValueError):
+        RelevanceClassifier().fit(["Tampons"], [1])
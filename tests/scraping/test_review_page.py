@@ -6,6 +6,7 @@ Test the ReviewPageSpider.
 from datetime import datetime
 
 from scraping import ReviewPageSpiderWorker
+from scraping.review_page.aspects import AspectEstimator, wilson_interval
 from scraping.review_page.functions import (
     get_body,
     get_metadata,
@@ -13,8 +14,10 @@ from scraping.review_page.functions import (
     get_rating,
     get_review_cards,
     get_title,
+    parse_review_page,
 )
-from scraping.review_page.spider import ReviewItemScraper
+from scraping.review_page.spider import ReviewItemScraper, group_families
+from scraping.scheduler import RefreshScheduler
 
 
 class TestReviewPageFunctions:
@@ -105,3 +108,189 @@ def test_ReviewPageSpiderWorker(test_driver):
         max_page=1,
     ) as worker:
         worker.run()
+
+
+def test_ReviewPageSpiderWorker_refresh(http_fetcher):
+    """Test if the incremental refresh of main.py queries what the scheduler ranks by."""
+
+    with ReviewPageSpiderWorker(
+        driver=None,
+        action_type="Testing - pytest test_ReviewPageSpiderWorker_refresh",
+        fetcher=http_fetcher,
+        incremental=True,
+        scheduler=RefreshScheduler(budget=10),
+    ) as worker:
+        projection = worker._pipeline[-1]["$project"]
+        assert projection["last_scraped_at"] == "$_scraped_at.ReviewPage"
+        assert projection["price_history"] == 1, "Price history is not queried"
+
+
+def test_ReviewPageSpiderWorker_unchanged(http_fetcher):
+    """Test if reviews scraped again unchanged are not rewritten."""
+
+    elem = {
+        "asin": "B0TEST0001",
+        "review_url": "https://www.amazon.fr/product-reviews/B0TEST0001",
+        "price_history": [{"price": 3.79, "time": datetime(2024, 1, 1)}],
+        "last_scraped_at": datetime(2024, 1, 1),
+    }
+    with ReviewPageSpiderWorker(
+        driver=None,
+        action_type="Testing - pytest test_ReviewPageSpiderWorker_unchanged",
+        fetcher=http_fetcher,
+        checkpoints=False,
+    ) as worker:
+        for _ in range(2):
+            scraped = worker.scrape(worker.fetcher, dict(elem))
+            worker.persist(worker.build(scraped))
+        assert worker._writes["unchanged"] >= 1, "Unchanged reviews are rewritten"
+        stored = worker.db.find_product(elem["asin"])
+        assert "last_scraped_at" not in stored, "Scheduling field is written"
+
+
+def test_parse_review_page(http_fetcher):
+    """Test if all review cards of a review page snapshot are parsed in one pass."""
+
+    page = http_fetcher.fetch("https://www.amazon.fr/product-reviews/B0TEST0001")
+    output = parse_review_page(page)
+    items = output["items"]
+    assert len(items) == 10, "Review cards are not parsed"
+    assert items[0]["rating"] == 5, "Rating is not parsed"
+    assert items[0]["title"] == "Très bien", "Title is not parsed"
+    assert items[0]["country"] == "France", "Country is not parsed"
+    assert items[0]["date"] == datetime(2023, 3, 12), "Date is not parsed"
+    assert "pageNumber=2" in output["next_page"], "Next page is not found"
+
+
+def test_ReviewItemScraper_pagination(http_fetcher):
+    """Test if the review pages are built from the review count and fetched."""
+
+    scraper = ReviewItemScraper(
+        driver=None,
+        starting_url="https://www.amazon.fr/product-reviews/B0TEST0001",
+        fetcher=http_fetcher,
+    )
+    scraper.run()
+    data = scraper.dump()
+    assert len(data) == 12, "Review pages are not all scraped"
+    assert data[-1]["title"] == "Bof", "Reviews are not in page order"
+
+
+def test_ReviewItemScraper_incremental(http_fetcher):
+    """Test if only new reviews are scraped, stopping at known ones."""
+
+    url = "https://www.amazon.fr/product-reviews/B0TEST0001"
+    scraper = ReviewItemScraper(driver=None, starting_url=url, fetcher=http_fetcher)
+    scraper.run()
+    reviews = scraper.dump()
+    known = {review["fingerprint"] for review in reviews[10:]}
+
+    scraper = ReviewItemScraper(None, url, fetcher=http_fetcher, known=known)
+    scraper.run()
+    assert scraper.dump() == reviews[:10], "New reviews are not all scraped"
+
+    known = {review["fingerprint"] for review in reviews[:10]}
+    scraper = ReviewItemScraper(None, url, fetcher=http_fetcher, known=known)
+    scraper.run()
+    assert scraper.dump() == [] and scraper.done(), "Crawl does not stop"
+
+
+def test_ReviewItemScraper_checkpoint(http_fetcher):
+    """Test if a crawl is checkpointed after every page, and resumed after it."""
+
+    url = "https://www.amazon.fr/product-reviews/B0TEST0001"
+    checkpoints = []
+    scraper = ReviewItemScraper(
+        None,
+        url,
+        fetcher=http_fetcher,
+        on_page=lambda page, items: checkpoints.append((page, list(items))),
+    )
+    scraper.run()
+    reviews = scraper.dump()
+    assert [(page, len(items)) for page, items in checkpoints] == [(1, 10), (2, 2)]
+
+    resume = {"page": 1, "items": checkpoints[0][1]}
+    pages = []
+    scraper = ReviewItemScraper(
+        None,
+        url,
+        fetcher=http_fetcher,
+        resume=resume,
+        on_page=lambda page, items: pages.append(page),
+    )
+    scraper.run()
+    assert scraper.dump() == reviews, "Resumed crawl misses reviews"
+    assert pages == [2], "Resumed crawl does not start after the checkpoint"
+
+
+def test_ReviewItemScraper_stream(http_fetcher):
+    """Test if streamed reviews are handed over page by page, and not kept."""
+
+    url = "https://www.amazon.fr/product-reviews/B0TEST0001"
+    streamed = []
+    scraper = ReviewItemScraper(
+        None,
+        url,
+        fetcher=http_fetcher,
+        on_page=lambda page, items: streamed.extend(items),
+        stream=True,
+    )
+    scraper.run()
+    assert scraper.dump() == [], "Streamed reviews are kept"
+    assert scraper.count == len(streamed) == 12, "Reviews are not all streamed"
+
+
+def test_AspectEstimator():
+    """Test if aspect estimates converge with enough reviews."""
+
+    assert wilson_interval(0, 0) == (0.0, 1.0)
+    low, high = wilson_interval(50, 100)
+    assert low < 0.5 < high and high - low < 0.2
+
+    estimator = AspectEstimator(max_width=0.2)
+    estimator.update([{"title": "Bon prix", "body": "Aucune fuite", "rating": 5}])
+    assert not estimator.converged(), "Estimates converge on one review"
+    reviews = [
+        {"title": "Prix", "body": "fuite", "rating": 5 - i % 2} for i in range(300)
+    ]
+    estimator.update(reviews)
+    assert estimator.is_converged("price") and estimator.is_converged("size")
+    assert estimator.estimates()["price"]["mentions"] == 301
+
+    estimator = AspectEstimator()
+    estimator.update([{"title": "Une attache solide", "body": "", "rating": 5}])
+    assert estimator.mentions["leak"] == 0, "Keyword matches inside a word"
+    estimator.update([{"title": "Des taches", "body": "", "rating": 2}])
+    assert estimator.mentions["leak"] == 1, "Keyword stem does not match"
+
+
+def test_ReviewItemScraper_sampling(http_fetcher):
+    """Test if the crawl stops once the aspect estimates converged."""
+
+    url = "https://www.amazon.fr/product-reviews/B0TEST0001"
+    scraper = ReviewItemScraper(None, url, fetcher=http_fetcher, max_ci_width=1.0)
+    scraper.run()
+    assert len(scraper.dump()) == 10, "Crawl does not stop after convergence"
+    assert scraper.aspects.reviews == 10
+
+
+def test_group_families():
+    """Test if a single element is kept per variant family."""
+
+    elems = [
+        {"asin": "B0TEST0001", "family_id": "B0TEST0002"},
+        {"asin": "B0TEST0002", "family_id": "B0TEST0002"},
+        {"asin": "B0TEST0003", "family_id": "B0TEST0002"},
+        {"asin": "B0TEST0004", "family_id": None},
+    ]
+    grouped = group_families(elems)
+    assert [elem["asin"] for elem in grouped] == ["B0TEST0002", "B0TEST0004"]
+    assert grouped[0]["members"] == ["B0TEST0001", "B0TEST0003"]
+    assert grouped[1]["members"] == []
+
+    elems[0]["reviews"] = [{"fingerprint": "a"}]
+    elems[2]["reviews"] = [{"fingerprint": "b"}]
+    grouped = group_families(elems)
+    assert grouped[0]["member_reviews"] == [{"fingerprint": "a"}, {"fingerprint": "b"}]
+    assert "member_reviews" not in grouped[1], "Reviews of members are invented"
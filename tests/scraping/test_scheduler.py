@@ -0,0 +1,60 @@
+"""
+Test the RefreshScheduler.
+"""
+
+from datetime import datetime, timedelta
+
+from scraping.scheduler import RefreshScheduler, price_volatility
+
+NOW = datetime(2024, 1, 31)
+
+
+def make_doc(asin: str, age_days: float | None, num_reviews: int = 0, prices=()):
+    """Build a product document as queried by the scheduled pipelines."""
+
+    doc = {"asin": asin, "num_reviews": num_reviews}
+    if age_days is not None:
+        doc["last_scraped_at"] = NOW - timedelta(days=age_days)
+    doc["price_history"] = [{"price": price} for price in prices]
+    return doc
+
+
+def test_price_volatility():
+    """Test if price volatility is the coefficient of variation of prices."""
+
+    assert price_volatility(None) == 0.0
+    assert price_volatility([{"price": 5.0}, {"price": None}]) == 0.0
+    assert round(price_volatility([{"price": 4.0}, {"price": 6.0}]), 3) == 0.2
+
+
+def test_scheduler_priority():
+    """Test if stale, reviewed and volatile products come first."""
+
+    scheduler = RefreshScheduler(budget=3)
+    docs = [
+        make_doc("B0FRESH001", age_days=0.1, num_reviews=1000),
+        make_doc("B0STALE001", age_days=30),
+        make_doc("B0STALE002", age_days=30, num_reviews=1000),
+        make_doc("B0VOLAT001", age_days=30, prices=(4.0, 6.0)),
+        make_doc("B0NEVER001", age_days=None),
+    ]
+    scheduled = scheduler.schedule(docs, now=NOW)
+    assert [doc["asin"] for doc in scheduled] == [
+        "B0STALE002",
+        "B0VOLAT001",
+        "B0NEVER001",
+    ]
+
+
+def test_scheduler_budget():
+    """Test if items are scheduled as long as their cost fits in the budget."""
+
+    scheduler = RefreshScheduler(budget=10)
+    docs = [
+        make_doc("B0BIGGEST1", age_days=30, num_reviews=5000),
+        make_doc("B0SMALL001", age_days=30, num_reviews=20),
+        make_doc("B0SMALL002", age_days=10, num_reviews=20),
+    ]
+    cost = lambda doc: max(1, doc["num_reviews"] // 10)  # noqa: E731
+    scheduled = scheduler.schedule(docs, cost, now=NOW)
+    assert [doc["asin"] for doc in scheduled] == ["B0SMALL001", "B0SMALL002"]
@@ -12,6 +12,7 @@ from scraping.search_page.functions import (
     get_mainframe,
     get_nextpage,
     parse_asin_card,
+    parse_search_page,
 )
 from scraping.search_page.spider import SearchItemScraper
 
@@ -90,3 +91,29 @@ def test_SearchPageSpiderWorker(test_driver):
         max_page=1,
     ) as worker:
         worker.run()
+
+
+def test_parse_search_page(http_fetcher):
+    """Test if all ASIN cards of a search page snapshot are parsed in one pass."""
+
+    page = http_fetcher.fetch("https://www.amazon.fr/s?k=tampon+femme")
+    output = parse_search_page(page)
+    asins = [card["asin"] for card in output["cards"]]
+    expected = ["B0TEST0001", "", "B0TEST0002", "B0TEST0003"]
+    assert asins == expected, "Cards are not parsed"
+    assert output["cards"][0]["thumbnail"], "Thumbnail is not parsed"
+    assert "page=2" in output["next_page"], "Next page is not found"
+
+
+def test_SearchItemScraper_pagination(http_fetcher):
+    """Test if the following search pages are fetched and deduplicated in order."""
+
+    scraper = SearchItemScraper(
+        driver=None,
+        starting_url="https://www.amazon.fr/s?" + urlencode({"k": "tampon femme"}),
+        fetcher=http_fetcher,
+    )
+    scraper.run()
+    asins = [item.asin for item in scraper.dump()]
+    expected = ["B0TEST0001", "B0TEST0002", "B0TEST0004", "B0TEST0005"]
+    assert asins == expected, "Pages are not merged in order"
@@ -0,0 +1,99 @@
+"""
+Test the StagedPipeline.
+"""
+
+import threading
+import time
+
+import pytest
+
+from scraping.orchestrator import StreamQueue
+from scraping.stages import Stage, StagedPipeline
+
+
+def test_pipeline_stages():
+    """Test if elements go through every stage, and dropped ones stop early."""
+
+    results = []
+    lock = threading.Lock()
+
+    def persist(elem):
+        with lock:
+            results.append(elem)
+
+    pipeline = StagedPipeline(
+        [
+            Stage("double", lambda x: x * 2, num_workers=3),
+            Stage("filter", lambda x: x if x % 4 else None),
+            Stage("persist", persist, num_workers=2),
+        ]
+    )
+    pipeline.run(range(20))
+
+    assert sorted(results) == [x * 2 for x in range(20) if x % 2], "Elements lost"
+    stats = pipeline.stats()
+    assert stats["double"]["processed"] == 20
+    assert stats["filter"]["dropped"] == 10, "Dropped elements are not counted"
+
+
+def test_pipeline_backpressure():
+    """Test if a slow stage keeps the queues bounded."""
+
+    pipeline = StagedPipeline(
+        [Stage("fast", lambda x: x), Stage("slow", lambda x: time.sleep(0.01))],
+        maxsize=2,
+    )
+    pipeline.run(range(30))
+
+    stats = pipeline.stats()
+    assert stats["slow"]["max_depth"] <= 2, "Queue is not bounded"
+    assert stats["slow"]["full_waits"] > 0, "Slow stage is not the bottleneck"
+
+
+def test_pipeline_error():
+    """Test if an error in a stage stops the pipeline and is raised."""
+
+    def fail(x):
+        if x == 3:
+            raise ValueError("bad element")
+        return x
+
+    pipeline = StagedPipeline([Stage("fail", fail), Stage("sink", lambda x: None)])
+    with pytest.raises(ValueError):
+        pipeline.run(range(1000))
+
+
+def test_pipeline_stream():
+    """Test if a pipeline processes a StreamQueue while it is being filled."""
+
+    stream = StreamQueue()
+    results = []
+
+    def produce():
+        for x in range(5):
+            stream.put(x)
+            time.sleep(0.01)
+        stream.close()
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    StagedPipeline([Stage("sink", results.append)]).run(stream)
+    producer.join()
+    assert results == list(range(5)) and stream.count == 5, "Stream is not consumed"
+
+
+def test_stream_backpressure():
+    """Test if a full StreamQueue blocks the producer until it is consumed."""
+
+    stream = StreamQueue(maxsize=2, poll_sec=0.01)
+    producer = threading.Thread(target=lambda: [stream.put(x) for x in range(3)])
+    producer.start()
+    producer.join(0.2)
+    assert producer.is_alive(), "Put does not block on a full queue"
+    assert next(iter(stream)) == 0
+    producer.join(5)
+    assert not producer.is_alive(), "Put is not released once consumed"
+
+    stream.cancel()
+    stream.put(3)
+    assert stream._queue.qsize() == 2, "Cancelled queue keeps elements"
@@ -0,0 +1,116 @@
+"""
+Test the adaptive rate limiter and the circuit breaker.
+"""
+
+import time
+
+from scraping.document import HtmlDocument
+from scraping.fetch import BaseFetcher, HttpFetcher
+from scraping.throttle import CircuitBreaker, RateController, Throttle, ThrottledFetcher
+
+PRODUCT_URL = "https://www.amazon.fr/dp/B0TEST0001"
+ANTIROBOT_URL = "https://www.amazon.fr/errors/antirobot"
+
+
+class PageFetcher(BaseFetcher):
+    """A fallback fetcher that always serves the same page."""
+
+    def __init__(self, page_source: str) -> None:
+        self.page_source = page_source
+
+    def fetch(self, url: str) -> HtmlDocument:
+        return HtmlDocument(self.page_source, url)
+
+
+def test_rate_controller_aimd():
+    """Test if the rate grows additively and shrinks multiplicatively."""
+
+    controller = RateController(rate=1.0, increase=0.5, decrease=0.5, max_rate=2.0)
+    controller.success()
+    assert controller.rate == 1.5, "Rate is not increased additively"
+    controller.success()
+    controller.success()
+    assert controller.rate == 2.0, "Rate is not capped"
+    controller.blocked()
+    assert controller.rate == 1.0, "Rate is not decreased multiplicatively"
+
+    start = time.monotonic()
+    controller.acquire()
+    controller.acquire()
+    assert time.monotonic() - start >= 0.9, "Token bucket does not pace requests"
+
+
+def test_circuit_breaker_cooldown():
+    """Test if the circuit opens after consecutive blocks and cools down."""
+
+    breaker = CircuitBreaker(threshold=2, cooldown=0.1)
+    breaker.blocked()
+    breaker.success()
+    breaker.blocked()
+    assert not breaker.is_open, "Circuit opens on non-consecutive blocks"
+    breaker.blocked()
+    assert breaker.is_open, "Circuit does not open past the threshold"
+    assert breaker.wait() > 0, "Circuit does not pause fetches"
+    assert not breaker.is_open, "Circuit does not close after the cooldown"
+
+    breaker.blocked()
+    assert breaker.trips == 2, "Circuit is not half-open after the cooldown"
+    assert breaker.cooldown == 0.4, "Cooldown is not backed off"
+
+
+def test_throttled_fetcher(http_fetcher):
+    """Test if anti-robot pages slow down the throttled fetcher."""
+
+    throttle = Throttle(RateController(rate=50.0), CircuitBreaker(threshold=2))
+    fetcher = ThrottledFetcher(http_fetcher, throttle)
+    fetcher.fetch_many([PRODUCT_URL, PRODUCT_URL])
+    fetcher.fetch(ANTIROBOT_URL)
+
+    stats = throttle.stats()
+    assert stats["pages"] == 3 and stats["blocks"] == 1, "Pages are not counted"
+    assert stats["rate"] < 50.0, "Rate is not decreased on anti-robot page"
+    assert stats["circuit_trips"] == 0, "Circuit opens on a single block"
+
+
+def test_throttled_fetcher_burst(http_fetcher):
+    """Test if a batch is released as the tokens arrive, not all at once."""
+
+    throttle = Throttle(RateController(rate=10.0, burst=2), CircuitBreaker())
+    fetcher = ThrottledFetcher(http_fetcher, throttle)
+    sizes = []
+    fetch_many = http_fetcher.fetch_many
+    http_fetcher.fetch_many = lambda urls: sizes.append(len(urls)) or fetch_many(urls)
+    try:
+        pages = fetcher.fetch_many([PRODUCT_URL] * 5)
+    finally:
+        del http_fetcher.fetch_many
+    assert len(pages) == 5, "Pages are lost"
+    assert sizes == [2, 2, 1], "Batch is not split by the burst"
+
+
+def test_throttled_fetcher_batch(http_fetcher):
+    """Test if a batch fitting in the burst is fetched at once."""
+
+    throttle = Throttle(RateController(rate=10.0, burst=5), CircuitBreaker())
+    fetcher = ThrottledFetcher(http_fetcher, throttle)
+    sizes = []
+    fetch_many = http_fetcher.fetch_many
+    http_fetcher.fetch_many = lambda urls: sizes.append(len(urls)) or fetch_many(urls)
+    try:
+        pages = fetcher.fetch_many([PRODUCT_URL] * 5)
+    finally:
+        del http_fetcher.fetch_many
+    assert len(pages) == 5, "Pages are lost"
+    assert sizes == [5], "Batch is not fetched at once"
+
+
+def test_throttled_fallback_block(fixture_server, http_fetcher):
+    """Test if an anti-robot page recovered by the fallback counts as a block."""
+
+    fallback = PageFetcher(http_fetcher.fetch(PRODUCT_URL).page_source)
+    throttle = Throttle(RateController(rate=50.0), CircuitBreaker(threshold=2))
+    with HttpFetcher(fallback=fallback, base_url=fixture_server) as http:
+        page = ThrottledFetcher(http, throttle).fetch(ANTIROBOT_URL)
+    assert page.fallback_reason == "antirobot", "Fallback reason is not kept"
+    stats = throttle.stats()
+    assert stats["blocks"] == 1 and stats["captchas"] == 0, "Block is not reported"